@@ -0,0 +1,147 @@
+"""
+Замер скорости поиска свободных номеров разными способами:
+- cte - прежний запрос rooms_ids_for_booking_query (CTE по всей таблице
+  bookings, пересекающиеся с периодом брони просто суммируются);
+- inventory - rooms_ids_free_by_inventory_query (таблица room_inventory);
+- sweep - rooms_ids_free_by_sweep_query (пиковая занятость по bookings).
+
+Данные (отели, номера, бронирования) создаются в транзакции, которая
+в конце откатывается. Таблица room_inventory на время заполнения
+заполняется одним запросом, а не триггером (иначе заполнение 1 млн.
+бронирований занимает слишком много времени).
+
+Запуск:
+    python -m benchmarks.bench_availability --bookings 1000000
+"""
+import argparse
+import asyncio
+import random
+from datetime import date, timedelta
+
+from sqlalchemy import func, select, text
+
+from benchmarks.common import report, stopwatch
+from src.database import engine
+from src.repositories.utils import (rooms_ids_for_booking_query,
+                                    rooms_ids_free_by_inventory_query,
+                                    rooms_ids_free_by_sweep_query)
+
+ENGINES = {"cte": rooms_ids_for_booking_query,
+           "inventory": rooms_ids_free_by_inventory_query,
+           "sweep": rooms_ids_free_by_sweep_query,
+           }
+
+FIRST_DAY = date(2025, 1, 1)
+DAYS = 365
+
+SEED_SQL = [
+    # Пользователь, от имени которого сделаны бронирования
+    """
+    INSERT INTO users (email, hashed_password)
+    VALUES ('bench-availability@example.com', 'x')
+    """,
+    """
+    INSERT INTO hotels (title, location)
+    SELECT 'bench hotel ' || n, 'bench location ' || n
+    FROM generate_series(1, CAST(:hotels AS int)) AS n
+    """,
+    """
+    INSERT INTO rooms (hotel_id, title, description, price, quantity)
+    SELECT hotels.id, 'bench room ' || n, NULL, 1000 + n, 1 + (random() * 9)::int
+    FROM hotels
+    CROSS JOIN generate_series(1, CAST(:rooms_per_hotel AS int)) AS n
+    WHERE hotels.title LIKE 'bench hotel %'
+    """,
+    "ALTER TABLE bookings DISABLE TRIGGER bookings_room_inventory",
+    """
+    INSERT INTO bookings (room_id, user_id, date_from, date_to, price)
+    SELECT bench_rooms.ids[1 + (random() * (array_length(bench_rooms.ids, 1) - 1))::int],
+           bench_user.id,
+           bookings_dates.date_from,
+           bookings_dates.date_from + (1 + (random() * 13)::int),
+           1000
+    FROM (SELECT n, CAST(:first_day AS date) + (random() * CAST(:days AS int))::int AS date_from
+          FROM generate_series(1, CAST(:bookings AS int)) AS n) AS bookings_dates
+    CROSS JOIN (SELECT array_agg(id) AS ids
+                FROM rooms WHERE title LIKE 'bench room %') AS bench_rooms
+    CROSS JOIN (SELECT id FROM users
+                WHERE email = 'bench-availability@example.com') AS bench_user
+    """,
+    "ALTER TABLE bookings ENABLE TRIGGER bookings_room_inventory",
+    "TRUNCATE room_inventory",
+    """
+    INSERT INTO room_inventory (room_id, night, booked)
+    SELECT bookings.room_id, nights.night::date, count(*)
+    FROM bookings
+    CROSS JOIN LATERAL generate_series(bookings.date_from,
+                                       bookings.date_to - 1,
+                                       interval '1 day') AS nights(night)
+    GROUP BY bookings.room_id, nights.night::date
+    """,
+    "ANALYZE bookings",
+    "ANALYZE room_inventory",
+    "ANALYZE rooms",
+]
+
+
+async def main(bookings: int, hotels: int, rooms_per_hotel: int, runs: int) -> None:
+    params = {"hotels": hotels,
+              "rooms_per_hotel": rooms_per_hotel,
+              "bookings": bookings,
+              "first_day": FIRST_DAY,
+              "days": DAYS,
+              }
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            print(f"Заполнение: {hotels} отелей, {hotels * rooms_per_hotel} номеров, "
+                  f"{bookings} бронирований...")
+            for sql in SEED_SQL:
+                statement = text(sql)
+                await conn.execute(statement,
+                                   {key: value for key, value in params.items()
+                                    if f":{key}" in sql})
+
+            hotels_ids = (await conn.execute(
+                text("SELECT id FROM hotels WHERE title LIKE 'bench hotel %'"))).scalars().all()
+
+            windows = []
+            for _ in range(runs):
+                date_from = FIRST_DAY + timedelta(days=random.randrange(DAYS))
+                windows.append((date_from,
+                                date_from + timedelta(days=random.randint(1, 14)),
+                                random.choice(hotels_ids)))
+
+            for engine_name, engine_func in ENGINES.items():
+                samples_all, samples_hotel = [], []
+                free_rooms = 0
+                for date_from, date_to, hotel_id in windows:
+                    query = engine_func(date_from=date_from, date_to=date_to)
+                    with stopwatch(samples_all):
+                        free_rooms += (await conn.execute(
+                            select(func.count()).select_from(query.subquery()))).scalar_one()
+                    query = engine_func(date_from=date_from, date_to=date_to,
+                                        hotel_id=hotel_id)
+                    with stopwatch(samples_hotel):
+                        (await conn.execute(query)).all()
+                report(f"{engine_name}: все отели", samples_all)
+                report(f"{engine_name}: один отель", samples_hotel)
+                print(f"{engine_name}: найдено свободных номеров (сумма по "
+                      f"{runs} запросам): {free_rooms}")
+        finally:
+            await transaction.rollback()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bookings", type=int, default=1_000_000)
+    parser.add_argument("--hotels", type=int, default=1_000)
+    parser.add_argument("--rooms-per-hotel", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(bookings=args.bookings,
+                     hotels=args.hotels,
+                     rooms_per_hotel=args.rooms_per_hotel,
+                     runs=args.runs))
@@ -0,0 +1,121 @@
+"""
+Нагрузочный замер добавления бронирований (BookingsRepository.add_checked):
+много одновременных клиентов бронируют один и тот же номер.
+
+Скрипт создаёт пользователя, отель и номер (quantity номеров), затем
+clients клиентов в течение duration секунд бронируют номер на случайные
+даты. Выводится количество бронирований в секунду (успешных и отказов
+с кодом 409), задержки и проверка, что ни в одну ночь количество броней
+не превысило quantity. Созданные данные в конце удаляются.
+
+Запуск:
+    python -m benchmarks.bench_booking_contention --clients 200 --duration 10
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import date, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from benchmarks.common import report, stopwatch
+from src.config import settings
+from src.schemas.bookings import BookingsInfoRecURL
+from src.utils.db_manager import DBManager
+
+FIRST_DAY = date(2025, 6, 1)
+DAYS = 30
+
+
+async def client(session_factory, room_id: int, user_id: int, deadline: float,
+                 samples: list[float], counters: dict[str, int]) -> None:
+    while time.perf_counter() < deadline:
+        date_from = FIRST_DAY + timedelta(days=random.randrange(DAYS))
+        booking_data = BookingsInfoRecURL(room_id=room_id,
+                                          date_from=date_from,
+                                          date_to=date_from + timedelta(days=random.randint(1, 3)))
+        with stopwatch(samples):
+            async with DBManager(session_factory=session_factory) as db:
+                try:
+                    await db.bookings.add_checked(booking_data, user_id=user_id)
+                    await db.commit()
+                    counters["booked"] += 1
+                except HTTPException as exc:
+                    counters[f"http_{exc.status_code}"] = counters.get(f"http_{exc.status_code}", 0) + 1
+
+
+async def main(clients: int, duration: float, quantity: int) -> None:
+    engine = create_async_engine(settings.DB_URL,
+                                 pool_size=min(clients, 100),
+                                 max_overflow=max(0, clients - 100),
+                                 pool_timeout=60)
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        user_id = (await conn.execute(text(
+            "INSERT INTO users (email, hashed_password) "
+            "VALUES ('bench-contention@example.com', 'x') RETURNING id"))).scalar_one()
+        hotel_id = (await conn.execute(text(
+            "INSERT INTO hotels (title, location) "
+            "VALUES ('bench contention hotel', 'bench') RETURNING id"))).scalar_one()
+        room_id = (await conn.execute(text(
+            "INSERT INTO rooms (hotel_id, title, price, quantity) "
+            "VALUES (:hotel_id, 'bench contention room', 1000, :quantity) RETURNING id"),
+            {"hotel_id": hotel_id, "quantity": quantity})).scalar_one()
+
+    try:
+        samples: list[float] = []
+        counters = {"booked": 0}
+        start = time.perf_counter()
+        await asyncio.gather(*(client(session_factory, room_id, user_id,
+                                      start + duration, samples, counters)
+                               for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+        total = sum(counters.values())
+        print(f"Клиентов: {clients}, номеров: {quantity}, время: {elapsed:.1f} с")
+        print(f"Запросов в секунду: {total / elapsed:.1f}, "
+              f"бронирований в секунду: {counters['booked'] / elapsed:.1f}")
+        print(f"Результаты: {counters}")
+        report("add_checked (вместе с commit)", samples)
+
+        async with engine.connect() as conn:
+            overbooked = (await conn.execute(text(
+                "SELECT count(*) FROM ("
+                "  SELECT nights.night, count(*) AS booked"
+                "  FROM bookings"
+                "  CROSS JOIN LATERAL generate_series(bookings.date_from, bookings.date_to - 1,"
+                "                                     interval '1 day') AS nights(night)"
+                "  WHERE bookings.room_id = :room_id"
+                "  GROUP BY nights.night"
+                "  HAVING count(*) > :quantity) AS overbooked_nights"),
+                {"room_id": room_id, "quantity": quantity})).scalar_one()
+        print(f"Ночей с превышением количества номеров: {overbooked}")
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text("DELETE FROM bookings WHERE room_id = :room_id"),
+                               {"room_id": room_id})
+            await conn.execute(text("DELETE FROM room_inventory WHERE room_id = :room_id"),
+                               {"room_id": room_id})
+            await conn.execute(text("DELETE FROM rooms WHERE id = :room_id"),
+                               {"room_id": room_id})
+            await conn.execute(text("DELETE FROM hotels WHERE id = :hotel_id"),
+                               {"hotel_id": hotel_id})
+            await conn.execute(text("DELETE FROM users WHERE id = :user_id"),
+                               {"user_id": user_id})
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--quantity", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(clients=args.clients,
+                     duration=args.duration,
+                     quantity=args.quantity))
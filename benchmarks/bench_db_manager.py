@@ -0,0 +1,87 @@
+"""
+Замер накладных расходов DBManager на один HTTP-запрос (зависимость DBDep):
+- before - прежний DBManager: в __aenter__ создаются сессия и все шесть
+  репозиториев, в __aexit__ всегда вызывается rollback;
+- after - текущий DBManager: сессия и репозитории создаются при первом
+  обращении, rollback выполняется, только если транзакция начата.
+
+Сценарии:
+- "без обращений" - запрос, которому база данных не понадобилась;
+- "один репозиторий" - обращение к db.hotels без запросов к базе;
+- "SELECT 1" - один запрос к базе данных (только с параметром --with-query,
+  нужна база данных, указанная в файле .env).
+
+Запуск:
+    python -m benchmarks.bench_db_manager --runs 100000
+    python -m benchmarks.bench_db_manager --runs 5000 --with-query
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import text
+
+from benchmarks.common import report, stopwatch
+from src.database import async_session_maker, engine
+from src.repositories.base import CACHE_KEYS_INFO
+from src.utils.db_manager import DBManager
+
+
+class EagerDBManager(DBManager):
+    """
+    Прежняя реализация DBManager (для сравнения).
+    """
+
+    async def __aenter__(self):
+        self._session = self.session_factory()
+        for name, repository in self.repositories.items():
+            setattr(self, name, repository(self._session))
+        return self
+
+    async def __aexit__(self, *args):
+        await self._session.rollback()
+        await self._session.close()
+        self._session.info.pop(CACHE_KEYS_INFO, None)
+
+
+async def nothing(db: DBManager) -> None:
+    pass
+
+
+async def one_repository(db: DBManager) -> None:
+    db.hotels
+
+
+async def select_one(db: DBManager) -> None:
+    await db.session.execute(text("SELECT 1"))
+    db.hotels
+
+
+async def measure(manager_class, scenario, runs: int) -> list[float]:
+    samples = []
+    for _ in range(runs):
+        with stopwatch(samples):
+            async with manager_class(session_factory=async_session_maker) as db:
+                await scenario(db)
+    return samples
+
+
+async def main(runs: int, with_query: bool) -> None:
+    scenarios = [("без обращений", nothing), ("один репозиторий", one_repository)]
+    if with_query:
+        scenarios.append(("SELECT 1", select_one))
+    for title, scenario in scenarios:
+        for variant, manager_class in (("before", EagerDBManager), ("after", DBManager)):
+            # Прогрев (создание соединений в пуле, кэши SQLAlchemy)
+            await measure(manager_class, scenario, min(runs, 100))
+            report(f"{title}: {variant}", await measure(manager_class, scenario, runs),
+                   unit="мкс", scale=1_000_000)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=100_000)
+    parser.add_argument("--with-query", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(runs=args.runs, with_query=args.with_query))
@@ -0,0 +1,96 @@
+"""
+Замер выборки большого списка методом BaseRepository.get_rows:
+- orm - выбираются сущности HotelsORM (identity map, состояние объектов),
+  каждая строка проверяется HotelPydanticSchema.model_validate;
+- core - get_rows(..., core=True): выбираются только столбцы схемы
+  кортежами, список проверяется одним вызовом TypeAdapter(list[схема]).
+
+С параметром --without-db база данных не нужна: замеряется только
+преобразование строк в схемы Pydantic (без запроса и без создания
+сущностей ORM при чтении результата):
+- model_validate - model_validate для каждой сущности HotelsORM;
+- model_construct - model_construct(**строка) без проверки;
+- type_adapter - TypeAdapter(list[схема]) по списку словарей (как в core).
+
+Данные создаются в транзакции, которая в конце откатывается.
+
+Запуск:
+    python -m benchmarks.bench_get_rows --rows 100000
+    python -m benchmarks.bench_get_rows --rows 100000 --without-db
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.common import report, stopwatch
+from src.database import engine
+from src.models.hotels import HotelsORM
+from src.repositories.hotels import HotelsRepository
+from src.repositories.utils import schema_list_adapter
+from src.schemas.hotels import HotelPydanticSchema
+
+SEED_SQL = """
+INSERT INTO hotels (title, location)
+SELECT 'bench hotel ' || md5(n::text), 'bench location ' || md5((-n)::text)
+FROM generate_series(1, CAST(:rows AS int)) AS n
+"""
+
+
+async def with_db(rows: int, runs: int) -> None:
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            print(f"Заполнение: {rows} отелей...")
+            await conn.execute(text(SEED_SQL), {"rows": rows})
+            bench_filter = HotelsORM.title.startswith("bench hotel ")
+            for variant, core in (("orm", False), ("core", True)):
+                samples = []
+                for _ in range(runs + 1):
+                    # Новая сессия для каждого замера: identity map пустой
+                    session = AsyncSession(bind=conn)
+                    with stopwatch(samples):
+                        result = await HotelsRepository(session).get_rows(bench_filter,
+                                                                          show_all=True,
+                                                                          core=core)
+                    await session.close()
+                    assert len(result) == rows
+                # Первый замер - прогрев (кэш запросов SQLAlchemy)
+                report(f"{rows} строк: {variant}", samples[1:])
+        finally:
+            await transaction.rollback()
+    await engine.dispose()
+
+
+def without_db(rows: int, runs: int) -> None:
+    schema = HotelPydanticSchema
+    keys = ("id", "title", "location")
+    tuples = [(n, f"bench hotel {n}", f"bench location {n}") for n in range(1, rows + 1)]
+    models = [HotelsORM(**dict(zip(keys, row))) for row in tuples]
+    variants = {
+        "model_validate": lambda: [schema.model_validate(model) for model in models],
+        "model_construct": lambda: [schema.model_construct(**dict(zip(keys, row))) for row in tuples],
+        "type_adapter": lambda: schema_list_adapter(schema).validate_python(
+            [dict(zip(keys, row)) for row in tuples]
+        ),
+    }
+    for variant, convert in variants.items():
+        samples = []
+        for _ in range(runs + 1):
+            with stopwatch(samples):
+                convert()
+        report(f"{rows} строк: {variant}", samples[1:])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--without-db", action="store_true")
+    args = parser.parse_args()
+    if args.without_db:
+        without_db(rows=args.rows, runs=args.runs)
+    else:
+        asyncio.run(with_db(rows=args.rows, runs=args.runs))
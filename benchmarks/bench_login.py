@@ -0,0 +1,117 @@
+"""
+Нагрузочный замер входа пользователей (post("/auth/login")): задержка
+посторонних запросов get("/health/live"), пока выполняются входы.
+- before - пароль проверяется прямо в цикле событий (прежний вариант
+  AuthService.verify_password в ручке login_user_post);
+- after - пароль проверяется в пуле потоков (AuthService.verify_password_async,
+  src/utils/password_pool.py).
+
+Приложение запускается в том же процессе (httpx.ASGITransport), logins
+клиентов входят в систему, а ещё один клиент всё это время выполняет
+запросы get("/health/live") и замеряет их задержку. Скрипт создаёт
+пользователя и в конце удаляет его.
+
+С параметром --without-db база данных не нужна: вместо запросов на вход
+клиенты только проверяют пароль (как в ручке login_user_post).
+
+Запуск:
+    python -m benchmarks.bench_login --logins 200 --clients 20
+    python -m benchmarks.bench_login --logins 200 --clients 20 --without-db
+"""
+import argparse
+import asyncio
+
+import httpx
+from sqlalchemy import text
+
+from benchmarks.common import report, stopwatch
+from src.database import engine
+from src.main import app
+from src.services.auth import AuthService
+from src.utils.password_pool import password_pool_status
+
+EMAIL = "bench-login@example.com"
+PASSWORD = "bench-password"
+
+
+async def inline_verify_password(self, plain_password, hashed_password) -> bool:
+    # Прежний вариант: проверка пароля останавливает цикл событий
+    return self.verify_password(plain_password, hashed_password)
+
+
+async def login_client(client: httpx.AsyncClient, queue: asyncio.Queue, samples: list[float]) -> None:
+    while not queue.empty():
+        queue.get_nowait()
+        with stopwatch(samples):
+            response = await client.post("/auth/login", json={"email": EMAIL, "password": PASSWORD})
+        response.raise_for_status()
+
+
+async def verify_client(hashed_password: str, queue: asyncio.Queue, samples: list[float]) -> None:
+    while not queue.empty():
+        queue.get_nowait()
+        with stopwatch(samples):
+            assert await AuthService().verify_password_async(PASSWORD, hashed_password)
+
+
+async def probe(client: httpx.AsyncClient, done: asyncio.Event, samples: list[float]) -> None:
+    while not done.is_set():
+        with stopwatch(samples):
+            (await client.get("/health/live")).raise_for_status()
+        await asyncio.sleep(0.005)
+
+
+async def measure(client: httpx.AsyncClient, logins: int, clients: int,
+                  hashed_password: str | None) -> tuple[list[float], list[float]]:
+    queue = asyncio.Queue()
+    for _ in range(logins):
+        queue.put_nowait(None)
+    login_samples, probe_samples = [], []
+    done = asyncio.Event()
+    probe_task = asyncio.create_task(probe(client, done, probe_samples))
+    if hashed_password is None:
+        workers = [login_client(client, queue, login_samples) for _ in range(clients)]
+    else:
+        workers = [verify_client(hashed_password, queue, login_samples) for _ in range(clients)]
+    await asyncio.gather(*workers)
+    done.set()
+    await probe_task
+    return login_samples, probe_samples
+
+
+async def main(logins: int, clients: int, without_db: bool) -> None:
+    hashed_password = AuthService().hashed_password(PASSWORD)
+    if not without_db:
+        async with engine.begin() as conn:
+            await conn.execute(text("DELETE FROM users WHERE email = :email"), {"email": EMAIL})
+            await conn.execute(text("INSERT INTO users (email, hashed_password) "
+                                    "VALUES (:email, :hashed_password)"),
+                               {"email": EMAIL, "hashed_password": hashed_password})
+    transport = httpx.ASGITransport(app=app)
+    verify_password_async = AuthService.verify_password_async
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for variant in ("before", "after"):
+                AuthService.verify_password_async = (inline_verify_password if variant == "before"
+                                                     else verify_password_async)
+                login_samples, probe_samples = await measure(client, logins, clients,
+                                                             None if not without_db else hashed_password)
+                report(f"{variant}: вход", login_samples)
+                report(f"{variant}: /health/live", probe_samples)
+        print("Пул хеширования паролей:", password_pool_status())
+    finally:
+        AuthService.verify_password_async = verify_password_async
+        if not without_db:
+            async with engine.begin() as conn:
+                await conn.execute(text("DELETE FROM users WHERE email = :email"), {"email": EMAIL})
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--without-db", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(logins=args.logins, clients=args.clients, without_db=args.without_db))
@@ -0,0 +1,124 @@
+"""
+Замер поиска подстроки в наименованиях (отели, номера, удобства) и
+вывод планов запросов:
+- before - прежнее условие lower(столбец) LIKE '%строка%' (триграммный
+  индекс по столбцу не используется, выполняется Seq Scan);
+- after - условие столбец ILIKE '%строка%' (используется GIN-индекс
+  gin_trgm_ops из миграции 009 Add trigram indexes).
+
+Данные создаются в транзакции, которая в конце откатывается.
+
+Запуск:
+    python -m benchmarks.bench_text_search --hotels 200000
+"""
+import argparse
+import asyncio
+import random
+
+from sqlalchemy import func, select, text
+
+from benchmarks.common import report, stopwatch
+from src.database import engine
+from src.models.facilities import FacilitiesORM
+from src.models.hotels import HotelsORM
+from src.models.rooms import RoomsORM
+
+# (наименование, столбец)
+TARGETS = [("hotels.title", HotelsORM.title),
+           ("hotels.location", HotelsORM.location),
+           ("rooms.title", RoomsORM.title),
+           ("rooms.description", RoomsORM.description),
+           ("facilities.title", FacilitiesORM.title),
+           ]
+
+SEED_SQL = [
+    """
+    INSERT INTO hotels (title, location)
+    SELECT 'bench hotel ' || md5(n::text), 'bench location ' || md5((-n)::text)
+    FROM generate_series(1, CAST(:hotels AS int)) AS n
+    """,
+    """
+    INSERT INTO rooms (hotel_id, title, description, price, quantity)
+    SELECT hotels.id, 'bench room ' || md5(hotels.id::text || '-' || n),
+           'bench description ' || md5(n::text || '-' || hotels.id), 1000, 1
+    FROM hotels
+    CROSS JOIN generate_series(1, CAST(:rooms_per_hotel AS int)) AS n
+    WHERE hotels.title LIKE 'bench hotel %'
+    """,
+    """
+    INSERT INTO facilities (title)
+    SELECT 'bench facility ' || md5(n::text)
+    FROM generate_series(1, CAST(:hotels AS int)) AS n
+    """,
+    "ANALYZE hotels",
+    "ANALYZE rooms",
+    "ANALYZE facilities",
+]
+
+
+def predicates(column, search_string: str) -> dict:
+    """
+    Возвращает условия поиска подстроки: прежнее и текущее.
+    """
+    return {"before": func.lower(column).contains(search_string.lower()),
+            "after": column.icontains(search_string, autoescape=True),
+            }
+
+
+async def explain(conn, query) -> str:
+    """
+    Возвращает план выполнения запроса (EXPLAIN ANALYZE).
+    """
+    sql = str(query.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    rows = (await conn.exec_driver_sql(f"EXPLAIN (ANALYZE, COSTS OFF) {sql}")).scalars().all()
+    return "\n".join(f"    {row}" for row in rows)
+
+
+async def main(hotels: int, rooms_per_hotel: int, runs: int) -> None:
+    params = {"hotels": hotels, "rooms_per_hotel": rooms_per_hotel}
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            print(f"Заполнение: {hotels} отелей, {hotels * rooms_per_hotel} номеров, "
+                  f"{hotels} удобств...")
+            for sql in SEED_SQL:
+                await conn.execute(text(sql),
+                                   {key: value for key, value in params.items()
+                                    if f":{key}" in sql})
+
+            for target_name, column in TARGETS:
+                # Строка для поиска - 6 символов из md5 (в верхнем регистре,
+                # чтобы проверить поиск без учёта регистра)
+                search_strings = ["".join(random.choices("0123456789abcdef", k=6)).upper()
+                                  for _ in range(runs)]
+                print(f"\n=== {target_name} ===")
+                for variant in ("before", "after"):
+                    query = (select(func.count())
+                             .select_from(column.class_)
+                             .filter(predicates(column, search_strings[0])[variant]))
+                    print(f"  План ({variant}):")
+                    print(await explain(conn, query))
+
+                    samples = []
+                    for search_string in search_strings:
+                        query = (select(func.count())
+                                 .select_from(column.class_)
+                                 .filter(predicates(column, search_string)[variant]))
+                        with stopwatch(samples):
+                            (await conn.execute(query)).scalar_one()
+                    report(f"{target_name}: {variant}", samples)
+        finally:
+            await transaction.rollback()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hotels", type=int, default=200_000)
+    parser.add_argument("--rooms-per-hotel", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(hotels=args.hotels,
+                     rooms_per_hotel=args.rooms_per_hotel,
+                     runs=args.runs))
@@ -0,0 +1,61 @@
+"""
+Общие функции для скриптов замеров производительности (benchmarks).
+
+Скрипты запускаются из корня проекта, например:
+    python -m benchmarks.bench_availability
+
+Для работы скриптов нужна база данных, указанная в файле .env, с
+применёнными миграциями (alembic upgrade head). Данные, которые
+скрипты создают для замеров, удаляются (откатом транзакции или явно).
+"""
+import statistics
+import time
+from contextlib import contextmanager
+
+
+def percentile(samples: list[float], percent: float) -> float:
+    """
+    Возвращает перцентиль (0..100) для списка замеров.
+
+    :param samples: Список замеров.
+    :param percent: Перцентиль, например 50, 95 или 99.
+
+    :return: Значение перцентиля или 0.0 для пустого списка.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def report(title: str, samples: list[float], unit: str = "мс", scale: float = 1000.0) -> None:
+    """
+    Выводит строку со статистикой по замерам (в секундах).
+
+    :param title: Наименование замера.
+    :param samples: Список замеров в секундах.
+    :param unit: Единица измерения для вывода.
+    :param scale: Множитель для перевода секунд в единицу вывода.
+    """
+    if not samples:
+        print(f"{title:<40} нет замеров")
+        return
+    print(f"{title:<40} n={len(samples):<6} "
+          f"mean={statistics.fmean(samples) * scale:9.3f} {unit}  "
+          f"p50={percentile(samples, 50) * scale:9.3f} {unit}  "
+          f"p95={percentile(samples, 95) * scale:9.3f} {unit}  "
+          f"p99={percentile(samples, 99) * scale:9.3f} {unit}")
+
+
+@contextmanager
+def stopwatch(samples: list[float]):
+    """
+    Контекстный менеджер: добавляет в samples время выполнения блока
+    в секундах.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        samples.append(time.perf_counter() - start)
@@ -6,8 +6,13 @@ from pydantic import BaseModel, Field
 
 from src.api.dependencies.dependencies_consts import pagination_pages
 from src.database import async_session_maker
+from src.repositories.utils import decode_cursor
+from src.schemas.users import UserPydanticSchema
 from src.services.auth import AuthService
+from src.utils.cache import MISSING
 from src.utils.db_manager import DBManager
+from src.utils.revocation import revoked_tokens
+from src.utils.token_cache import TokenEntry, token_cache
 
 # src\api\dependencies\dependencies-consts.py
 # alias="per-page" - позволяет в адресной строке можно указать варианты:
@@ -97,6 +102,122 @@ class PaginationPagesAllParams(PaginationPagesParams):
                                            )
                                      )
 
+
+# Класс определяет пагинацию по страницам, дополненную выводом по ключу (keyset pagination).
+# Ответ на запрос страницы содержит курсор next_cursor. Если передать его в параметре
+# cursor, то будет выведена следующая страница: выбираются записи с id больше, чем у
+# последней записи предыдущей страницы (WHERE id > :last_id ORDER BY id LIMIT :per_page).
+# Пропущенные записи при этом не читаются из базы, поэтому любая страница выбирается
+# так же быстро, как первая (в отличие от LIMIT/OFFSET).
+class PaginationCursorParams(PaginationPagesParams):
+    cursor: str | None = Field(Query(default=None,
+                                     description="Курсор следующей страницы (значение "
+                                                 "next_cursor из предыдущего ответа).<br>"
+                                                 "Если указан, то параметр page не используется.<br>"
+                                                 "<b><i>Может отсутствовать.</i></b>",
+                                     )
+                               )
+
+    @property
+    def after(self) -> dict | None:
+        """
+        Ключ последней записи предыдущей страницы, сохранённый в курсоре.
+
+        :return: Возвращает словарь, например {"id": 198} или
+            {"rank": 0.0607927, "id": 198} (для поиска по релевантности),
+            или None, если курсор не указан.
+            Если курсор повреждён, то поднимается исключение HTTPException
+            с кодом 422.
+        """
+        if self.cursor is None:
+            return None
+        try:
+            after = decode_cursor(self.cursor)
+        except ValueError:
+            after = {}
+        if not isinstance(after.get("id"), int):
+            # status_code=422: Запрос сформирован правильно, но его невозможно
+            #                  выполнить из-за семантических ошибок
+            raise HTTPException(status_code=422,
+                                detail={"description": "Некорректный курсор",
+                                        "cursor": self.cursor,
+                                        })
+        return after
+
+    @property
+    def after_id(self) -> int | None:
+        """
+        Идентификатор последней записи предыдущей страницы, сохранённый в курсоре.
+
+        :return: Возвращает идентификатор или None, если курсор не указан.
+            Если курсор повреждён, то поднимается исключение HTTPException
+            с кодом 422.
+        """
+        after = self.after
+        return None if after is None else after["id"]
+
+
+# Класс определяет пагинацию по страницам, по ключу или вывод всего списка сразу
+class PaginationAllCursorParams(PaginationCursorParams, PaginationPagesAllParams):
+    pass
+
+
+# Класс определяет потоковую выгрузку списка: если stream=True, то весь список
+# выводится в формате NDJSON (по одному объекту JSON в строке) по мере чтения из
+# базы данных, параметры пагинации при этом не используются.
+class StreamParams(BaseModel):
+    stream: bool | None = Field(Query(default=None,
+                                      description="Выгрузить весь список потоком в формате "
+                                                  "NDJSON (True), игнорируя параметры "
+                                                  "пагинации,<br>"
+                                                  "или делать обычный вывод (False или None).<br>"
+                                                  "<b><i>Может отсутствовать.</i></b>",
+                                      )
+                                )
+
+
+# Класс определяет выборочный вывод полей (sparse fieldsets): в параметре fields
+# перечисляются через запятую поля, которые нужны клиенту, например fields=id,title,price.
+# Из базы данных выбираются только соответствующие столбцы. Поле id выводится всегда
+# (по нему формируется курсор следующей страницы).
+class FieldsParams(BaseModel):
+    fields: str | None = Field(Query(default=None,
+                                     description="Список выводимых полей через запятую, "
+                                                 "например: id,title,price.<br>"
+                                                 "Если не задан, то выводятся все поля.<br>"
+                                                 "<b><i>Может отсутствовать.</i></b>",
+                                     )
+                               )
+
+    def names(self, schema) -> tuple[str, ...] | None:
+        """
+        Проверяет поля из параметра fields по схеме Pydantic.
+
+        :param schema: Схема Pydantic выводимых записей, например
+            HotelPydanticSchema.
+
+        :return: Возвращает кортеж имён полей в порядке полей схемы (поле id
+            добавляется, если его нет), например ("title", "id"), или None,
+            если параметр fields не задан.
+            Если указаны поля, которых нет в схеме, то поднимается
+            исключение HTTPException с кодом 422.
+        """
+        if not self.fields:
+            return None
+        names = {name.strip() for name in self.fields.split(",") if name.strip()}
+        unknown = sorted(names - set(schema.model_fields))
+        if unknown:
+            # status_code=422: Запрос сформирован правильно, но его невозможно
+            #                  выполнить из-за семантических ошибок
+            raise HTTPException(status_code=422,
+                                detail={"description": "Неизвестные поля в параметре fields",
+                                        "fields": unknown,
+                                        "allowed": list(schema.model_fields),
+                                        })
+        names.add("id")
+        return tuple(name for name in schema.model_fields if name in names)
+
+
 # Set description for query parameter in swagger doc using Pydantic model (FastAPI)
 # https://stackoverflow.com/questions/64364499/set-description-for-query-parameter-in-swagger-doc-using-pydantic-model-fastapi
 # How to define query parameters using Pydantic model in FastAPI?
@@ -123,6 +244,18 @@ PaginationAllDep = Annotated[PaginationPagesAllParams, Depends()]
 # (тогда будут отображаться все описания description):
 # PaginationAllDep = Annotated[PaginationPagesAllParams, Query()]
 
+# Пагинация по страницам или по ключу (курсору)
+PaginationCursorDep = Annotated[PaginationCursorParams, Depends()]
+
+# Пагинация по страницам, по ключу (курсору) или вывод всего списка сразу
+PaginationAllCursorDep = Annotated[PaginationAllCursorParams, Depends()]
+
+# Потоковая выгрузка списка в формате NDJSON
+StreamDep = Annotated[StreamParams, Depends()]
+
+# Выборочный вывод полей (fields=id,title,price)
+FieldsDep = Annotated[FieldsParams, Depends()]
+
 
 def get_token(request: Request) -> str:
     token = request.cookies.get('access_token', None)
@@ -132,24 +265,75 @@ def get_token(request: Request) -> str:
     return token
 
 
-def get_current_user_id(token: str = Depends(get_token)) -> Union[int, None]:
-    data = AuthService().decode_token(token)
-    user_id = data.get("user_id", None)
-    return user_id
-
-
-UserIdDep = Annotated[int, Depends(get_current_user_id)]
+# Заголовок запроса, который закрепляет все запросы к базе данных за основной
+# базой данных (реплики не используются), например, чтобы сразу после
+# изменения прочитать изменённые данные: X-DB-Read-Primary: 1
+READ_PRIMARY_HEADER = "x-db-read-primary"
 
 
-def get_db_manager():
-    return DBManager(session_factory=async_session_maker)
+def get_db_manager(read_primary: bool = False):
+    return DBManager(session_factory=async_session_maker, read_primary=read_primary)
 
 
-async def get_db():
+async def get_db(request: Request):
     # Можно не использовать функцию get_db_manager(), а сразу написать:
     # async with DBManager(session_factory=async_session_maker) as db:
-    async with get_db_manager() as db:
+    read_primary = request.headers.get(READ_PRIMARY_HEADER, "").lower() in ("1", "true")
+    async with get_db_manager(read_primary=read_primary) as db:
         yield db
 
 
 DBDep = Annotated[DBManager, Depends(get_db)]
+
+
+# Зависимости get_verified_token, get_current_user_id и get_current_user
+# асинхронные: они выполняются в цикле событий, а не в пуле потоков, поэтому
+# кэш проверенных токенов (src/utils/token_cache.py) не требует блокировок.
+async def get_verified_token(db: DBDep, token: str = Depends(get_token)) -> TokenEntry:
+    # Подпись токена проверяется только при первом запросе с этим токеном,
+    # далее результат берётся из кэша (до истечения срока действия токена)
+    entry = token_cache.get(token)
+    if entry is None:
+        entry = token_cache.set(token, AuthService().decode_token(token))
+    # Отозванный токен (выход пользователя) не принимается. Обычно ответ даёт
+    # фильтр Блума в памяти процесса, база данных проверяется, только если
+    # фильтр не может ответить точно (src/utils/revocation.py).
+    if entry.jti is not None:
+        revoked = revoked_tokens.check(entry.jti)
+        if revoked is None:
+            revoked = await db.revoked_tokens.is_revoked(entry.jti)
+            revoked_tokens.remember(entry.jti, revoked)
+        if revoked:
+            # status_code=401: не аутентифицирован
+            raise HTTPException(status_code=401,
+                                detail="Токен отозван. Перелогиньтесь")
+    return entry
+
+
+async def get_current_user_id(entry: TokenEntry = Depends(get_verified_token)) -> Union[int, None]:
+    return entry.user_id
+
+
+UserIdDep = Annotated[int, Depends(get_current_user_id)]
+
+
+async def get_current_user(db: DBDep,
+                           entry: TokenEntry = Depends(get_verified_token)):
+    """
+    Запись текущего авторизованного пользователя. Запись сохраняется в кэше
+    проверенных токенов, повторные запросы с тем же токеном не выбирают
+    пользователя из базы данных.
+
+    :return: Возвращает None (в токене нет идентификатора пользователя или
+        пользователь не найден) или UserPydanticSchema.
+    """
+    if not entry.user_id:
+        return None
+    user = token_cache.get_user(entry)
+    if user is MISSING:
+        user = await db.users.get_by_id(object_id=entry.user_id)
+        token_cache.set_user(entry, user)
+    return user
+
+
+CurrentUserDep = Annotated[UserPydanticSchema | None, Depends(get_current_user)]
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, HTTPException, Response
+from datetime import datetime, timezone
+
+import jwt
+from fastapi import APIRouter, HTTPException, Request, Response
 
 from sqlalchemy.exc import IntegrityError
 
-from src.api.dependencies.dependencies import UserIdDep, DBDep
+from src.api.dependencies.dependencies import UserIdDep, DBDep, CurrentUserDep
 from src.schemas.users import UserDescriptionRecURL, UserBase, UserWithHashedPasswordPydSchm
 from src.services.auth import AuthService
+from src.utils.revocation import revoked_tokens
 
 # Устанавливаем библиотеки: pip install pyjwt "passlib[bcrypt]"
 # https://fastapi.qubitpi.org/tutorial/security/oauth2-jwt/
@@ -45,7 +49,7 @@ async def register_user_post(user_info: UserDescriptionRecURL, db: DBDep):
 
     В текущей реализации статус завершения операции всегда один и тот же: OK
     """
-    hashed_password = AuthService().hashed_password(user_info.password)
+    hashed_password = await AuthService().hashed_password_async(user_info.password)
     new_user_info = UserBase(email=user_info.email,
                              hashed_password=hashed_password)
 
@@ -125,7 +129,7 @@ async def login_user_post(user_info: UserDescriptionRecURL,
         raise HTTPException(status_code=401,
                             detail="Пользователь с таким email не зарегистрирован")
 
-    if not AuthService().verify_password(user_info.password, user.hashed_password):
+    if not await AuthService().verify_password_async(user_info.password, user.hashed_password):
         raise HTTPException(status_code=401,
                             detail="Пароль не верный")
 
@@ -147,7 +151,7 @@ async def login_user_post(user_info: UserDescriptionRecURL,
             summary="Получение информации о текущем авторизованном пользователе",
             description="Тут будет описание параметров метода",
             )
-async def get_me_get(user_id: UserIdDep, db: DBDep):
+async def get_me_get(user_id: UserIdDep, user: CurrentUserDep):
     # Определяем идентификатор пользователя
     if not user_id:
         # Пользователь не авторизовался
@@ -155,7 +159,7 @@ async def get_me_get(user_id: UserIdDep, db: DBDep):
         raise HTTPException(status_code=401,
                             detail="Пользователь не авторизовался")
 
-    user = await db.users.get_by_id(object_id=user_id)
+    # Запись пользователя передаётся из CurrentUserDep (кэш проверенных токенов)
     return {"user_id": user_id, "user": user}
 
 
@@ -163,6 +167,20 @@ async def get_me_get(user_id: UserIdDep, db: DBDep):
                summary="Выход авторизованного пользователя",
                description="Тут будет описание параметров метода",
                )
-async def get_me_delete(response: Response):
+async def get_me_delete(request: Request, response: Response, db: DBDep):
+    # Токен отзывается (таблица revoked_tokens): даже если его скопировали, с
+    # ним больше нельзя войти до истечения срока его действия. Недействительный
+    # токен и токен без jti отзывать не нужно - просто удаляем куки.
+    token = request.cookies.get("access_token", None)
+    if token:
+        try:
+            data = AuthService().decode_token(token)
+        except (HTTPException, IndexError, jwt.PyJWTError):
+            data = {}
+        if data.get("jti"):
+            await db.revoked_tokens.revoke(jti=data["jti"],
+                                           exp=datetime.fromtimestamp(data["exp"], tz=timezone.utc))
+            await db.commit()
+            revoked_tokens.add(data["jti"])
     response.delete_cookie("access_token")
     return {"status": "OK"}
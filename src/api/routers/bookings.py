@@ -1,8 +1,9 @@
 from fastapi import Body, Path, APIRouter, HTTPException
 from typing import Annotated
 
-from src.api.dependencies.dependencies import DBDep, UserIdDep
+from src.api.dependencies.dependencies import CurrentUserDep, DBDep, StreamDep, UserIdDep
 from src.schemas.bookings import BookingsRoomPath, BookingsInfoRecRequest, BookingsInfoRecURL, BookingsInfoRecFull
+from src.utils.streaming import ndjson_response
 
 """
 - Полное именование URL:
@@ -81,28 +82,12 @@ async def create_booking_room_id_post(room_path: Annotated[BookingsRoomPath, Pat
         raise HTTPException(status_code=401,
                             detail="Пользователь не авторизовался")
 
-    # Получаем цену номера - смотрим таблицу rooms
-    room = await db.rooms.get_one_or_none(id=room_path.room_id)
-
-    if not room:
-        # status_code=404: Сервер понял запрос, но не нашёл
-        #                  соответствующего ресурса по указанному URL
-        raise HTTPException(status_code=404,
-                            detail={"description": "Нет номера с идентификатором "
-                                                   f"{room_path.room_id}",
-                                    })
-    price = room.price
-
-    # Теоретически, сейчас надо проверить, что номера в доступе имеются и
-    # что по указанным датам они свободны. Практически, мы это не проверяем.
-
-    # Создаем схему данных с ценой и пользователем - все поля, кроме id
-    _booking_params = BookingsInfoRecFull(room_id=room_path.room_id,
-                                          user_id=user_id,
-                                          price=price,
-                                          **booking_params.model_dump())
-    # Добавляем бронирование пользователю
-    booking = await db.bookings.add(_booking_params)
+    # Проверяем, что на указанные даты имеется свободный номер, и добавляем
+    # бронирование пользователю. Цена номера берётся из таблицы rooms.
+    # Если номера нет - исключение с кодом 404, если номер занят - с кодом 409.
+    _booking_params = BookingsInfoRecURL(room_id=room_path.room_id,
+                                         **booking_params.model_dump())
+    booking = await db.bookings.add_checked(_booking_params, user_id=user_id)
     await db.commit()
     return {"booking": booking}
 
@@ -112,7 +97,10 @@ async def create_booking_room_id_post(room_path: Annotated[BookingsRoomPath, Pat
                     "всех забронированных номеров по всем отелям",
             description="Тут будет описание параметров метода",
             )
-async def show_bookings_all_get(db: DBDep):
+async def show_bookings_all_get(export: StreamDep, db: DBDep):
+    if export.stream:
+        return ndjson_response(db.stream("bookings"))
+
     return await db.bookings.get_all()
 
 
@@ -122,6 +110,7 @@ async def show_bookings_all_get(db: DBDep):
             description="Тут будет описание параметров метода",
             )
 async def show_bookings_my_get(user_id: UserIdDep,
+                               user: CurrentUserDep,
                                db: DBDep):
     # Определяем идентификатор пользователя - user_id передаётся из UserIdDep
     if not user_id:
@@ -129,5 +118,5 @@ async def show_bookings_my_get(user_id: UserIdDep,
         # status_code=401: не аутентифицирован
         raise HTTPException(status_code=401,
                             detail="Пользователь не авторизовался")
-    user = await db.users.get_by_id(object_id=user_id)
+    # Запись пользователя передаётся из CurrentUserDep (кэш проверенных токенов)
     return await db.bookings.get_all(user=user)
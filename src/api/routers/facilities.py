@@ -6,8 +6,10 @@ from typing import Annotated
 from sqlalchemy import select as sa_select  # Для реализации SQL команды SELECT
 from sqlalchemy import delete as sa_delete  # Для реализации SQL команды DELETE
 
-from src.api.dependencies.dependencies import DBDep, PaginationAllDep, PaginationPagesAllParams
+from src.api.dependencies.dependencies import DBDep, PaginationAllCursorDep, StreamDep
 from src.schemas.facilities import FacilityDescriptionRecRequest
+from src.utils.responses import ORJSONResponse
+from src.utils.streaming import ndjson_response
 
 # from src.schemas.facilities import
 
@@ -28,15 +30,20 @@ router = APIRouter(prefix="/facilities", tags=["Удобства"])
 # async def show_facilities_in_rooms_get(pagination: PaginationPagesAllParams,
 # async def show_facilities_in_rooms_get(pagination: Annotated[PaginationPagesAllParams, Query()],
 async def show_facilities_in_rooms_get(db: DBDep,
-                                       pagination: PaginationAllDep,
+                                       pagination: PaginationAllCursorDep,
+                                       export: StreamDep,
                                        # pagination: PaginationPagesAllParams = Query(),
                                        # pagination: Annotated[PaginationPagesAllParams, Query()],
 
                                        ):
-    return await db.facilities.get_limit(per_page=pagination.per_page,
-                                         page=pagination.page,
-                                         show_all=pagination.all_objects,
-                                         )
+    if export.stream:
+        return ndjson_response(db.stream("facilities"))
+
+    return ORJSONResponse(await db.facilities.get_limit(per_page=pagination.per_page,
+                                                        page=pagination.page,
+                                                        after_id=pagination.after_id,
+                                                        show_all=pagination.all_objects,
+                                                        ))
 
 
 openapi_examples_dict = {"1": {"summary": "Кабельный интернет",
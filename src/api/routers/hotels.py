@@ -1,15 +1,18 @@
 from datetime import date
 
-from fastapi import Query, Body, Path, APIRouter
+from fastapi import Query, Body, Path, APIRouter, Request, Response
 from typing import Annotated
 
 from sqlalchemy import select as sa_select  # Для реализации SQL команды SELECT
 from sqlalchemy import delete as sa_delete  # Для реализации SQL команды DELETE
 
 from src.schemas.hotels import HotelPath, HotelDescriptionRecURL, HotelDescriptionOptURL
+from src.schemas.hotels import HotelWithRooms, HotelPydanticSchema
 
-from src.api.dependencies.dependencies import PaginationPagesDep, PaginationAllDep
-from src.api.dependencies.dependencies import DBDep
+from src.api.dependencies.dependencies import PaginationCursorDep, PaginationAllCursorDep, StreamDep
+from src.api.dependencies.dependencies import DBDep, FieldsDep
+from src.utils.responses import ORJSONResponse
+from src.utils.streaming import ndjson_response, read_batches, bulk_openapi_extra
 
 """
 Рабочие ссылки (список методов, параметры в подробном перечне):
@@ -21,6 +24,14 @@ get("/hotels/{hotel_id}") - Получение из базы данных выб
         идентификатору отеля.
         Выборка реализована через метод select.
         Функция: get_hotel_id_get
+get("/hotels/{hotel_id}/full") - Получение отеля вместе со всеми номерами и
+        удобствами номеров.
+        Документ JSON собирается одним запросом в PostgreSQL
+        (json_build_object, json_agg) и передаётся клиенту без изменений.
+        Функция: get_hotel_full_get
+post("/hotels/bulk") - Массовое добавление отелей (массив JSON или NDJSON).
+        Добавление реализовано командой COPY (пакетами).
+        Функция: create_hotels_bulk_post
 get("/hotels/find") - Поиск отелей по заданным параметрам и вывод итогового 
         списка с разбивкой по страницам.
         Выборка реализована через метод select.
@@ -70,7 +81,10 @@ router = APIRouter(prefix="/hotels", tags=["Отели"])
                     "разбивкой по страницам или весь список полностью",
             description="Тут будет описание параметров метода",
             )
-async def show_hotels_all_get(pagination: PaginationAllDep, db: DBDep):
+async def show_hotels_all_get(pagination: PaginationAllCursorDep,
+                              fields: FieldsDep,
+                              export: StreamDep,
+                              db: DBDep):
     """
     ## Функция выводит список всех отелей с разбивкой по страницам или весь список полностью.
 
@@ -81,8 +95,17 @@ async def show_hotels_all_get(pagination: PaginationAllDep, db: DBDep):
     - ***:param** per_page:* Количество элементов на странице (должно быть
                 >=1 и <=30, по умолчанию значение 3).
                 Не используется, если параметр all_objects равен True.
+    - ***:param** fields:* Список выводимых полей через запятую, например
+                id,title (поле id выводится всегда). Из базы данных
+                выбираются только эти столбцы. Может отсутствовать.
     - ***:param** all_objects:* отображать все отели сразу (True) или делать
                 вывод постранично (False или None). Может отсутствовать.
+    - ***:param** cursor:* курсор следующей страницы (значение next_cursor
+                из предыдущего ответа). Если указан, то параметр page
+                не используется. Может отсутствовать.
+    - ***:param** stream:* выгрузить весь список потоком в формате NDJSON
+                (True) или делать обычный вывод (False или None).
+                Может отсутствовать.
 
     Параметры:
     - ***:param** db:* Контекстный менеджер.
@@ -90,6 +113,13 @@ async def show_hotels_all_get(pagination: PaginationAllDep, db: DBDep):
     Если параметр `all_objects` имеет значение `True`, то остальные
     параметры игнорируются и сразу выводится полный список.
 
+    Если параметр `stream` имеет значение `True`, то параметры пагинации
+    игнорируются, а отели выводятся по одному объекту JSON в строке по мере
+    чтения из базы данных (ответ с типом `application/x-ndjson`).
+
+    Ответ содержит курсор `next_cursor` для вывода следующей страницы по
+    ключу (или null, если следующей страницы нет).
+
     ***:return:*** Список отелей или строка с уведомлением, если список отель пуст.
 
     Список отелей выводится в виде:
@@ -134,10 +164,15 @@ async def show_hotels_all_get(pagination: PaginationAllDep, db: DBDep):
     # else:
     #     return await db.hotels.get_limit(per_page=pagination.per_page,
     #                                      page=pagination.page)
-    return await db.hotels.get_limit(per_page=pagination.per_page,
-                                     page=pagination.page,
-                                     show_all=pagination.all_objects,
-                                     )
+    if export.stream:
+        return ndjson_response(db.stream("hotels"))
+
+    return ORJSONResponse(await db.hotels.get_limit(per_page=pagination.per_page,
+                                                    page=pagination.page,
+                                                    after_id=pagination.after_id,
+                                                    fields=fields.names(HotelPydanticSchema),
+                                                    show_all=pagination.all_objects,
+                                                    ))
 
 
 @router.get("/free",
@@ -145,7 +180,8 @@ async def show_hotels_all_get(pagination: PaginationAllDep, db: DBDep):
                     "разбивкой по страницам или весь список полностью",
             description="Тут будет описание параметров метода",
             )
-async def show_hotels_free_get(pagination: PaginationAllDep,
+async def show_hotels_free_get(pagination: PaginationAllCursorDep,
+                               fields: FieldsDep,
                                db: DBDep,
                                # check_dates: BookingDateDep,
                                # date_from: date = Query(example='2025-01-20',
@@ -174,12 +210,14 @@ async def show_hotels_free_get(pagination: PaginationAllDep,
     #                                      per_page=pagination.per_page,
     #                                      page=pagination.page,
     #                                      )
-    return await db.hotels.get_limit(date_from=date_from,
-                                     date_to=date_to,
-                                     per_page=pagination.per_page,
-                                     page=pagination.page,
-                                     show_all=pagination.all_objects,
-                                     )
+    return ORJSONResponse(await db.hotels.get_limit(date_from=date_from,
+                                                    date_to=date_to,
+                                                    per_page=pagination.per_page,
+                                                    page=pagination.page,
+                                                    after_id=pagination.after_id,
+                                                    fields=fields.names(HotelPydanticSchema),
+                                                    show_all=pagination.all_objects,
+                                                    ))
     # return await db.hotels.get_filtered_by_time(date_from=date_from,
     #                                             date_to=date_to)
 
@@ -189,7 +227,8 @@ async def show_hotels_free_get(pagination: PaginationAllDep,
                     "вывод итогового списка с разбивкой по страницам",
             description="Тут будет описание параметров метода",
             )
-async def find_hotels_get(pagination: PaginationPagesDep,
+async def find_hotels_get(pagination: PaginationCursorDep,
+                          fields: FieldsDep,
                           db: DBDep,
                           hotel_location: Annotated[str | None, Query(min_length=3,
                                                                       description="Адрес отеля",
@@ -197,6 +236,16 @@ async def find_hotels_get(pagination: PaginationPagesDep,
                           hotel_title: Annotated[str | None, Query(min_length=3,
                                                                    description="Название отеля"
                                                                    )] = None,
+                          q: Annotated[str | None, Query(min_length=2,
+                                                         description="Полнотекстовый поиск по "
+                                                                     "названию и адресу отеля, "
+                                                                     "результаты упорядочены по "
+                                                                     "релевантности.<br>"
+                                                                     "Если указан, то параметры "
+                                                                     "hotel_location, hotel_title, "
+                                                                     "case-sensitivity и starts-with "
+                                                                     "не используются.",
+                                                         )] = None,
                           case_sensitivity: Annotated[bool | None,
                                                       Query(alias="case-sensitivity",
                                                             description="Поиск с учётом регистра "
@@ -243,6 +292,9 @@ async def find_hotels_get(pagination: PaginationPagesDep,
     Параметры (передаются методом Query):
     - ***:param** hotel_location:* Адрес отеля (может отсутствовать).
     - ***:param** hotel_title:* Название отеля (может отсутствовать).
+    - ***:param** q:* Строка полнотекстового поиска по названию и адресу
+                отеля (может отсутствовать). Поддерживается синтаксис:
+                слова через пробел, "фраза в кавычках", or, -слово.
     - ***:param** case_sensitivity:* Поиск с учётом регистра (True) или
                 регистронезависимый (False или None). Может отсутствовать.
     - ***:param** starts_with:* Поиск строк, начинающихся с заданного
@@ -252,6 +304,9 @@ async def find_hotels_get(pagination: PaginationPagesDep,
                 по умолчанию значение 1).
     - ***:param** per_page:* Количество элементов на странице (должно быть
                 >=1 и <=30, по умолчанию значение 3).
+    - ***:param** fields:* Список выводимых полей через запятую, например
+                id,title (поле id выводится всегда). Из базы данных
+                выбираются только эти столбцы. Может отсутствовать.
     - ***:param** hotels_with_free_rooms:* Выбирать отели со свободными
                 номерами в указанные даты (True) или выбирать полный список отелей
                 не учитывая указанные даты (False или None).
@@ -263,7 +318,13 @@ async def find_hotels_get(pagination: PaginationPagesDep,
 
     ***:return:*** Список отелей или строка с уведомлением, если список отель пуст.
 
-    Один из двух параметров `hotel_location` или `hotel_title` обязан быть задан.
+    Один из параметров `q`, `hotel_location` или `hotel_title` обязан быть задан.
+
+    Если задан параметр `q`, то отели выводятся по убыванию релевантности
+    (совпадение в названии важнее совпадения в адресе), параметры
+    `hotel_location`, `hotel_title`, `case_sensitivity`, `starts_with` и
+    `page` не используются. Следующая страница выводится по курсору
+    `next_cursor`.
 
     Значения `case_sensitivity` и `starts_with` влияют на поиск по обоим
     параметрам `hotel_location` и `hotel_title`.
@@ -278,6 +339,16 @@ async def find_hotels_get(pagination: PaginationPagesDep,
     что "Данные отсутствуют".
     """
 
+    if q:
+        return ORJSONResponse(await db.hotels.search(q=q,
+                                                     per_page=pagination.per_page,
+                                                     after=pagination.after,
+                                                     fields=fields.names(HotelPydanticSchema),
+                                                     hotels_with_free_rooms=hotels_with_free_rooms,
+                                                     date_from=date_from,
+                                                     date_to=date_to,
+                                                     ))
+
     query = await db.hotels.create_stmt_for_selection(sql_func=sa_select,
                                                       location={"search_string": hotel_location,
                                                                 "case_sensitivity": case_sensitivity,
@@ -301,13 +372,15 @@ async def find_hotels_get(pagination: PaginationPagesDep,
     #     date_from = None,
     #     date_to = None
 
-    return await db.hotels.get_limit(query=query,
-                                     per_page=pagination.per_page,
-                                     page=pagination.page,
-                                     hotels_with_free_rooms=hotels_with_free_rooms,
-                                     date_from=date_from,
-                                     date_to=date_to,
-                                     )
+    return ORJSONResponse(await db.hotels.get_limit(query=query,
+                                                    per_page=pagination.per_page,
+                                                    page=pagination.page,
+                                                    after_id=pagination.after_id,
+                                                    fields=fields.names(HotelPydanticSchema),
+                                                    hotels_with_free_rooms=hotels_with_free_rooms,
+                                                    date_from=date_from,
+                                                    date_to=date_to,
+                                                    ))
 
 
 @router.get("/{hotel_id}",
@@ -339,6 +412,40 @@ async def get_hotel_id_get(hotel_path: Annotated[HotelPath, Path()], db: DBDep):
     return result
 
 
+@router.get("/{hotel_id}/full",
+            summary="Получение отеля вместе со всеми номерами и удобствами номеров",
+            description="Тут будет описание параметров метода",
+            response_class=Response,
+            responses={200: {"model": HotelWithRooms,
+                             "content": {"application/json": {}},
+                             },
+                       },
+            )
+async def get_hotel_full_get(hotel_path: Annotated[HotelPath, Path()], db: DBDep):
+    """
+    ## Функция получает из базы данных отель вместе со всеми его номерами и удобствами номеров.
+
+    Документ JSON собирается одним SQL-запросом в PostgreSQL и передаётся клиенту
+    без повторной валидации и сериализации.
+
+    Параметры (передаются в URL):
+    - ***:param** id:* Идентификатор отеля (обязательно).
+
+    Параметры:
+    - ***:param** db:* Контекстный менеджер.
+
+    ***:return:*** Возвращает объект отеля (схема HotelWithRooms):
+        {"id": 16, "title": "...", "location": "...",
+         "rooms": [{"id": 5, "hotel_id": 16, ..., "facilities": [{"id": 1, "title": "..."}]}]}
+
+        Если элемент, соответствующий hotel_id отсутствует, возбуждается исключение
+        HTTPException с кодом 404.
+    """
+
+    result = await db.hotels.get_full(hotel_id=hotel_path.hotel_id)
+    return Response(content=result, media_type="application/json")
+
+
 @router.delete("/{hotel_id}",
                summary="Удаление выбранной записи по идентификатору отеля",
                description="Тут будет описание параметров метода",
@@ -504,6 +611,41 @@ async def create_hotel_post(db: DBDep,
     return {"added data": result}
 
 
+@router.post("/bulk",
+             summary="Массовое добавление отелей (массив JSON или NDJSON)",
+             description="Тут будет описание параметров метода",
+             openapi_extra=bulk_openapi_extra(HotelDescriptionRecURL),
+             )
+async def create_hotels_bulk_post(request: Request, db: DBDep):
+    """
+    ## Функция добавляет много отелей за один запрос.
+
+    Тело запроса - массив объектов JSON (Content-Type: application/json) или
+    NDJSON (Content-Type: application/x-ndjson), по одному отелю в строке:
+    {"title": "title Сочи", "location": "location Сочи"}
+
+    Отели записываются в базу данных пакетами командой COPY, все пакеты - в
+    одной транзакции.
+
+    Параметры:
+    - ***:param** request:* Запрос (тело читается по мере получения).
+    - ***:param** db:* Контекстный менеджер.
+
+    ***:return:*** Словарь: `dict("added hotels": count, "ids": ids)`, где
+        - *count*: int. Количество добавленных отелей.
+        - *ids*: list[int]. Идентификаторы добавленных отелей в том же порядке,
+          что и в запросе.
+
+    Если какой-либо объект не проходит проверку, возбуждается исключение
+    HTTPException с кодом 422, ничего не добавляется.
+    """
+    ids = []
+    async for batch in read_batches(request, HotelDescriptionRecURL):
+        ids.extend(await db.hotels.add_copy(batch))
+    await db.commit()
+    return {"added hotels": len(ids), "ids": ids}
+
+
 @router.put("/{hotel_id}",
             summary="Обновление ВСЕХ данных одновременно для выбранной "
                     "записи, выборка происходит по идентификатору отеля",
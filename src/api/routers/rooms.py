@@ -1,17 +1,19 @@
 from datetime import date
 
-from fastapi import Body, Path, APIRouter, Query
+from fastapi import Body, Path, APIRouter, Query, Request
 from typing import Annotated
 
 from sqlalchemy import select as sa_select  # Для реализации SQL команды SELECT
 from sqlalchemy import delete as sa_delete  # Для реализации SQL команды DELETE
 
-from src.api.dependencies.dependencies import DBDep, PaginationAllDep, PaginationPagesDep
+from src.api.dependencies.dependencies import DBDep, PaginationAllCursorDep, PaginationCursorDep, StreamDep, FieldsDep
 from src.schemas.facilities import RoomsFacilityBase
 
 from src.schemas.rooms import RoomPath, HotelRoomPath, HotelPath, RoomPydanticSchema, RoomBase, RoomWithRels
 from src.schemas.rooms import RoomDescriptionRecURL, RoomDescrRecRequest
 from src.schemas.rooms import RoomDescriptionOptURL, RoomDescrOptRequest
+from src.utils.responses import ORJSONResponse
+from src.utils.streaming import ndjson_response, read_batches, bulk_openapi_extra
 
 
 """
@@ -48,6 +50,10 @@ get("/hotels/rooms/{room_id}") - Получение из базы данных 
 post("/hotels/room") - Создание записи с новой комнатой в отеле.
         Функция: create_room_post
 
+post("/hotels/rooms/bulk") - Массовое добавление номеров с удобствами
+        (массив JSON или NDJSON). Добавление реализовано командой COPY (пакетами).
+        Функция: create_rooms_bulk_post
+
 delete("/hotels/rooms/{room_id}") - Удаление выбранной записи по 
         идентификатору номера.
         Реализовано удаление одного объекта, когда объект для удаления получаем 
@@ -186,6 +192,50 @@ async def create_room_post(room_params: Annotated[RoomDescriptionRecURL,
             }
 
 
+@router.post("/rooms/bulk",
+             summary="Массовое добавление номеров с удобствами (массив JSON или NDJSON)",
+             description="Тут будет описание параметров метода",
+             openapi_extra=bulk_openapi_extra(RoomDescriptionRecURL),
+             )
+async def create_rooms_bulk_post(request: Request, db: DBDep):
+    """
+    ## Функция добавляет много номеров (в том числе в разные отели) за один запрос.
+
+    Тело запроса - массив объектов JSON (Content-Type: application/json) или
+    NDJSON (Content-Type: application/x-ndjson), по одному номеру в строке:
+    {"hotel_id": 1, "title": "Название номера", "description": "Описание номера",
+     "price": 11, "quantity": 12, "facilities_ids": [1, 2]}
+
+    Номера и связи номеров с удобствами записываются в базу данных пакетами
+    командой COPY, все пакеты - в одной транзакции.
+
+    Параметры:
+    - ***:param** request:* Запрос (тело читается по мере получения).
+    - ***:param** db:* Контекстный менеджер.
+
+    ***:return:*** Словарь: `dict("added rooms": count, "ids": ids)`, где
+        - *count*: int. Количество добавленных номеров.
+        - *ids*: list[int]. Идентификаторы добавленных номеров в том же порядке,
+          что и в запросе.
+
+    Если какой-либо объект не проходит проверку, возбуждается исключение
+    HTTPException с кодом 422, если отсутствуют отели или удобства - с кодом 404.
+    В этих случаях ничего не добавляется.
+    """
+    ids = []
+    async for batch in read_batches(request, RoomDescriptionRecURL):
+        await db.rooms.check_bulk_references(batch)
+        rooms_ids = await db.rooms.add_copy(batch)
+        # dict.fromkeys - убираем повторы удобств, сохраняя порядок
+        rooms_facilities_data = [RoomsFacilityBase(room_id=room_id, facility_id=f_id)
+                                 for room_id, room in zip(rooms_ids, batch)
+                                 for f_id in dict.fromkeys(room.facilities_ids)]
+        await db.rooms_facilities.add_copy(rooms_facilities_data)
+        ids.extend(rooms_ids)
+    await db.commit()
+    return {"added rooms": len(ids), "ids": ids}
+
+
 @router.get("/{hotel_id}/rooms/all",
             summary="Вывод для конкретного отеля списка ВСЕХ "
                     "номеров - весь список полностью",
@@ -193,17 +243,29 @@ async def create_room_post(room_params: Annotated[RoomDescriptionRecURL,
             )
 # async def show_rooms_in_hotel_get(hotel_id: Path()):
 async def show_rooms_in_hotel_all_get(hotel_path: Annotated[HotelPath, Path()],
-                                      pagination: PaginationAllDep,
+                                      pagination: PaginationAllCursorDep,
+                                      fields: FieldsDep,
+                                      export: StreamDep,
                                       db: DBDep):
+    if export.stream:
+        # Отель проверяем до начала потока: после этого код ответа
+        # (404 при отсутствии отеля) изменить уже нельзя.
+        await db.rooms.check_hotel_id(hotel_id=hotel_path.hotel_id)
+        return ndjson_response(db.stream("rooms",
+                                         hotel_id=hotel_path.hotel_id,
+                                         pydantic_schema=RoomWithRels))
+
     # return await db.rooms.get_all(hotel_id=hotel_path.hotel_id)
-    return await db.rooms.get_limit(hotel_id=hotel_path.hotel_id,
-                                    # Было RoomPydanticSchema, но так как подключаем получение
-                                    # списка удобств, то схема их должна уметь распознавать
-                                    pydantic_schema=RoomWithRels,
-                                    per_page=pagination.per_page,
-                                    page=pagination.page,
-                                    show_all=pagination.all_objects,
-                                    )
+    return ORJSONResponse(await db.rooms.get_limit(hotel_id=hotel_path.hotel_id,
+                                                   # Было RoomPydanticSchema, но так как подключаем получение
+                                                   # списка удобств, то схема их должна уметь распознавать
+                                                   pydantic_schema=RoomWithRels,
+                                                   per_page=pagination.per_page,
+                                                   page=pagination.page,
+                                                   after_id=pagination.after_id,
+                                                   fields=fields.names(RoomPydanticSchema),
+                                                   show_all=pagination.all_objects,
+                                                   ))
 
 
 @router.get("/{hotel_id}/rooms/free",
@@ -213,7 +275,8 @@ async def show_rooms_in_hotel_all_get(hotel_path: Annotated[HotelPath, Path()],
             )
 # async def show_rooms_in_hotel_get(hotel_id: Path()):
 async def show_rooms_in_hotel_free_get(hotel_path: Annotated[HotelPath, Path()],
-                                       pagination: PaginationAllDep,
+                                       pagination: PaginationAllCursorDep,
+                                       fields: FieldsDep,
                                        db: DBDep,
                                        date_from: Annotated[date | None,
                                                             Query(example='2025-01-20',
@@ -232,17 +295,19 @@ async def show_rooms_in_hotel_free_get(hotel_path: Annotated[HotelPath, Path()],
     #                                            show_all=pagination.all_objects,
     #                                            date_from=date_from,
     #                                            date_to=date_to)
-    return await db.rooms.get_limit(hotel_id=hotel_path.hotel_id,
-                                    # Было RoomPydanticSchema, но так как подключаем получение
-                                    # списка удобств, то схема их должна уметь распознавать
-                                    pydantic_schema=RoomWithRels,
-                                    per_page=pagination.per_page,
-                                    page=pagination.page,
-                                    show_all=pagination.all_objects,
-                                    free_rooms=True,
-                                    date_from=date_from,
-                                    date_to=date_to,
-                                    )
+    return ORJSONResponse(await db.rooms.get_limit(hotel_id=hotel_path.hotel_id,
+                                                   # Было RoomPydanticSchema, но так как подключаем получение
+                                                   # списка удобств, то схема их должна уметь распознавать
+                                                   pydantic_schema=RoomWithRels,
+                                                   per_page=pagination.per_page,
+                                                   page=pagination.page,
+                                                   after_id=pagination.after_id,
+                                                   fields=fields.names(RoomPydanticSchema),
+                                                   show_all=pagination.all_objects,
+                                                   free_rooms=True,
+                                                   date_from=date_from,
+                                                   date_to=date_to,
+                                                   ))
 
 
 @router.get("/rooms/find",
@@ -250,7 +315,8 @@ async def show_rooms_in_hotel_free_get(hotel_path: Annotated[HotelPath, Path()],
                     "вывод итогового списка с разбивкой по страницам",
             description="Тут будет описание параметров метода",
             )
-async def find_rooms_get(pagination: PaginationPagesDep,
+async def find_rooms_get(pagination: PaginationCursorDep,
+                         fields: FieldsDep,
                          db: DBDep,
                          title: Annotated[str | None, Query(min_length=3,
                                                             description="Наименование номера"
@@ -258,6 +324,16 @@ async def find_rooms_get(pagination: PaginationPagesDep,
                          description: Annotated[str | None, Query(min_length=3,
                                                                   description="Описание номера",
                                                                   )] = None,
+                         q: Annotated[str | None, Query(min_length=2,
+                                                        description="Полнотекстовый поиск по "
+                                                                    "наименованию и описанию номера, "
+                                                                    "результаты упорядочены по "
+                                                                    "релевантности.<br>"
+                                                                    "Если указан, то параметры "
+                                                                    "title, description, "
+                                                                    "case-sensitivity и starts-with "
+                                                                    "не используются.",
+                                                        )] = None,
                          case_sensitivity: Annotated[bool | None,
                                                      Query(alias="case-sensitivity",
                                                            description="Поиск с учётом регистра "
@@ -311,6 +387,9 @@ async def find_rooms_get(pagination: PaginationPagesDep,
     Параметры (передаются методом Query):
     - ***:param** title:* Наименование номера (может отсутствовать).
     - ***:param** description:* Описание номера (может отсутствовать).
+    - ***:param** q:* Строка полнотекстового поиска по наименованию и
+                описанию номера (может отсутствовать). Поддерживается
+                синтаксис: слова через пробел, "фраза в кавычках", or, -слово.
     - ***:param** case_sensitivity:* Поиск с учётом регистра (True) или
                 регистронезависимый (False или None). Может отсутствовать.
     - ***:param** starts_with:* Поиск строк, начинающихся с заданного
@@ -320,6 +399,10 @@ async def find_rooms_get(pagination: PaginationPagesDep,
                 по умолчанию значение 1).
     - ***:param** per_page:* Количество элементов на странице (должно быть
                 >=1 и <=30, по умолчанию значение 3).
+    - ***:param** fields:* Список выводимых полей через запятую, например
+                id,title,price (поле id выводится всегда). Из базы данных
+                выбираются только эти столбцы. Удобства
+                (facilities) при этом не выводятся. Может отсутствовать.
     - ***:param** price_min:* Минимальная цена номера (должно быть >=0,
                 по умолчанию значение не задано - None). Может отсутствовать.
     - ***:param** price_max:* Максимальная цена номера (должно быть >=0,
@@ -335,7 +418,12 @@ async def find_rooms_get(pagination: PaginationPagesDep,
 
     ***:return:*** Список отелей или строка с уведомлением, если список отель пуст.
 
-    Один из двух параметров `title` или `description` обязан быть задан.
+    Один из параметров `q`, `title` или `description` обязан быть задан.
+
+    Если задан параметр `q`, то номера выводятся по убыванию релевантности
+    (совпадение в наименовании важнее совпадения в описании), параметры
+    `title`, `description`, `case_sensitivity`, `starts_with` и `page` не
+    используются. Следующая страница выводится по курсору `next_cursor`.
 
     Если переданы оба параметра `title` и `description`, то
     выбираться будет номер, соответствующий обоим параметрам одновременно.
@@ -368,6 +456,19 @@ async def find_rooms_get(pagination: PaginationPagesDep,
              Тип возвращаемых элементов преобразован к схеме Pydantic: self.schema
     """
 
+    if q:
+        return ORJSONResponse(await db.rooms.search(q=q,
+                                                    pydantic_schema=RoomWithRels,
+                                                    per_page=pagination.per_page,
+                                                    after=pagination.after,
+                                                    fields=fields.names(RoomPydanticSchema),
+                                                    price_min=price_min,
+                                                    price_max=price_max,
+                                                    free_rooms=free_rooms,
+                                                    date_from=date_from,
+                                                    date_to=date_to,
+                                                    ))
+
     query = await db.rooms.create_stmt_for_selection(sql_func=sa_select,
                                                      title={"search_string": title,
                                                             "case_sensitivity": case_sensitivity,
@@ -391,23 +492,25 @@ async def find_rooms_get(pagination: PaginationPagesDep,
     #     date_from = None,
     #     date_to = None
 
-    return await db.rooms.get_limit(query=query,
-                                    # Было RoomPydanticSchema, но так как подключаем получение
-                                    # списка удобств, то схема их должна уметь распознавать
-                                    pydantic_schema=RoomWithRels,
-                                    per_page=pagination.per_page,
-                                    page=pagination.page,
-                                    free_rooms=free_rooms,
-                                    date_from=date_from,
-                                    date_to=date_to,
-                                    price_min=price_min,
-                                    price_max=price_max,
-                                    )
+    return ORJSONResponse(await db.rooms.get_limit(query=query,
+                                                   # Было RoomPydanticSchema, но так как подключаем получение
+                                                   # списка удобств, то схема их должна уметь распознавать
+                                                   pydantic_schema=RoomWithRels,
+                                                   per_page=pagination.per_page,
+                                                   page=pagination.page,
+                                                   after_id=pagination.after_id,
+                                                   fields=fields.names(RoomPydanticSchema),
+                                                   free_rooms=free_rooms,
+                                                   date_from=date_from,
+                                                   date_to=date_to,
+                                                   price_min=price_min,
+                                                   price_max=price_max,
+                                                   ))
 
 
 @router.get("/rooms/{room_id}/session_get",
             summary="Получение из базы данных выбранной записи по идентификатору "
-                    "номера, используя метод session.get(model, object_id)",
+                    "номера вместе с удобствами одним запросом (LEFT JOIN и json_agg)",
             description="Тут будет описание параметров метода",
             )
 async def get_room_session_get_method_get(room: Annotated[RoomPath, Path()], db: DBDep):
@@ -567,7 +670,6 @@ async def delete_rooms_param_del(db: DBDep,
 
     result = await db.rooms.delete(delete_stmt=stmt)
     await db.commit()  # Подтверждаем изменение
-    print(result)
     return result
 
 
@@ -1,12 +1,43 @@
 # Основной файл для работы с подключением к базе данных.
+import random
+
+from sqlalchemy import Select
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import DeclarativeBase, Session
 
 from src.config import settings
+from src.utils.pool_metrics import MeasuredQueuePool
 
 # Подключение к базе данных
 # engine = create_async_engine(settings.DB_URL)
-engine = create_async_engine(settings.DB_URL)
+# Параметры пула и соединения задаются в .env (см. src/config.py).
+# connect_args передаются в asyncpg.connect:
+# - statement_cache_size - кэш подготовленных запросов asyncpg,
+#   prepared_statement_cache_size - кэш подготовленных запросов SQLAlchemy
+#   (драйвер asyncpg в SQLAlchemy готовит запросы сам);
+# - server_settings - параметры сеанса PostgreSQL (SET jit = off и т.д.).
+engine_options = dict(
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args={
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "server_settings": {
+            "jit": "on" if settings.DB_JIT else "off",
+            "statement_timeout": str(settings.DB_STATEMENT_TIMEOUT),
+        },
+    },
+)
+engine = create_async_engine(settings.DB_URL,
+                             poolclass=MeasuredQueuePool,
+                             **engine_options)
+# Реплики только для чтения (параметр DB_REPLICA_URLS в .env). Время ожидания
+# соединения (MeasuredQueuePool) замеряется только для основной базы данных.
+replica_engines = [create_async_engine(url, **engine_options)
+                   for url in settings.DB_REPLICA_URLS]
 # engine = create_async_engine(settings.DB_URL, echo=True)
 # Строка генерирует такой SQL-запрос (способ хорош для базового понимания):
 # BEGIN (implicit)
@@ -16,10 +47,64 @@ engine = create_async_engine(settings.DB_URL)
 
 # print(f"Строка для подключения:\n{settings.DB_URL=}")
 
+# Ключи в session.info:
+# - READ_PRIMARY_INFO - все запросы сессии выполнять в основной базе данных;
+# - REPLICA_INFO - реплика, выбранная для чтения в этой сессии.
+# Ключ READ_PRIMARY_INFO в bind_arguments (session.execute(...,
+# bind_arguments={READ_PRIMARY_INFO: True})) выполняет в основной базе данных
+# только этот запрос, не закрепляя за ней сессию.
+READ_PRIMARY_INFO = "read_primary"
+REPLICA_INFO = "replica_engine"
+
+
+def pin_primary(session) -> None:
+    """
+    Закрепляет сессию за основной базой данных: все следующие запросы
+    сессии, в том числе чтение, выполняются в основной базе данных.
+    Используется, когда чтение должно видеть только что сделанные
+    изменения или должно выполняться в одной транзакции с изменениями
+    (например, блокировки перед проверкой и добавлением брони).
+
+    :param session: Сессия (AsyncSession или Session).
+    """
+    session.info[READ_PRIMARY_INFO] = True
+
+
+class RoutingSession(Session):
+    """
+    Сессия, которая выбирает базу данных для каждого запроса:
+    - SELECT (без FOR UPDATE) - реплика, выбранная случайно один раз на сессию;
+    - INSERT, UPDATE, DELETE, запросы text() и запись изменений объектов
+      (flush) - основная база данных. После первой записи сессия закрепляется
+      за основной базой данных (pin_primary), чтобы следующие чтения видели
+      сделанные изменения (read your writes).
+    - запрос с bind_arguments={READ_PRIMARY_INFO: True} - основная база
+      данных (сессия не закрепляется).
+    Если реплики не заданы, то все запросы выполняются в основной базе данных.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        read_primary = kwargs.pop(READ_PRIMARY_INFO, False)
+        if not replica_engines or read_primary or self.info.get(READ_PRIMARY_INFO):
+            return super().get_bind(mapper, clause=clause, **kwargs)
+        if (isinstance(clause, Select)
+                and clause._for_update_arg is None
+                and not self._flushing):
+            replica = self.info.get(REPLICA_INFO)
+            if replica is None:
+                replica = self.info[REPLICA_INFO] = random.choice(replica_engines)
+            return replica.sync_engine
+        pin_primary(self)
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+
 # Создаём объект сессии
 # Параметр expire_on_commit будет описан позже
 # async_session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
-async_session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
+# sync_session_class=RoutingSession - чтение из реплик (см. класс RoutingSession)
+async_session_maker = async_sessionmaker(bind=engine,
+                                         expire_on_commit=False,
+                                         sync_session_class=RoutingSession)
 
 
 class Base(DeclarativeBase):
@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 
@@ -16,6 +18,12 @@ from src.api.routers.rooms import router as router_rooms
 from src.api.routers.hotels import router as router_hotels
 from src.api.routers.bookings import router as router_bookings
 from src.api.routers.facilities import router as router_facilities
+from src.api.routers.health import router as router_health
+from src.config import settings
+from src.database import engine, replica_engines
+from src.utils.responses import ORJSONResponse
+from src.utils.revocation import revoked_tokens
+from src.utils.sql_debug import setup_sql_debug
 
 
 """
@@ -157,16 +165,36 @@ openapi_tags = [
                 "url": "https://www.example.com/",
             }
     },
+    {
+        "name": router_health.tags[0],
+        "description": "Проверка состояния приложения и пула соединений с базой данных.",
+    },
 ]
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Отозванные токены доступа: фильтр Блума строится по таблице
+    # revoked_tokens и догружается в фоне (см. src/utils/revocation.py)
+    refresh_task = await revoked_tokens.start(settings.REVOKED_TOKENS_REFRESH_SECONDS)
+    yield
+    refresh_task.cancel()
+
+
+# Ответы JSON по умолчанию сериализуются orjson (см. src/utils/responses.py)
 app = FastAPI(**tags_metadata,
-              openapi_tags=openapi_tags)
+              openapi_tags=openapi_tags,
+              default_response_class=ORJSONResponse,
+              lifespan=lifespan)
 
 app.include_router(router_auth)
 app.include_router(router_rooms)
 app.include_router(router_hotels)
 app.include_router(router_bookings)
 app.include_router(router_facilities)
+app.include_router(router_health)
+
+# Журнал SQL-запросов для отладки (параметры SQL_DEBUG и SQL_DEBUG_HEADER в .env)
+setup_sql_debug(app, [engine, *replica_engines])
 
 
 if __name__ == "__main__":
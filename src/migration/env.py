@@ -10,8 +10,9 @@ from src.database import Base
 from src.models.hotels import HotelsORM
 from src.models.users import UsersORM
 from src.models.rooms import RoomsORM
-from src.models.bookings import BookingsORM
+from src.models.bookings import BookingsORM, RoomInventoryORM
 from src.models.facilities import FacilitiesORM
+from src.models.revoked_tokens import RevokedTokensORM
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,107 @@
+"""007 Add room inventory
+
+Revision ID: 3c9e1f7a2b40
+Revises: d63318ef9cad
+Create Date: 2025-02-10 12:15:31.408126
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3c9e1f7a2b40"
+down_revision: Union[str, None] = "d63318ef9cad"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Функция изменяет занятость номера room_id на delta для всех ночей
+# в промежутке [date_from, date_to). День выезда (date_to) не занят.
+# Ночи, в которые после снятия брони не осталось бронирований, удаляются:
+# свободная ночь и отсутствующая строка означают одно и то же, а таблица
+# не разрастается строками с booked = 0.
+ROOM_INVENTORY_APPLY_FUNCTION = """
+CREATE OR REPLACE FUNCTION room_inventory_apply(p_room_id integer,
+                                                p_date_from date,
+                                                p_date_to date,
+                                                p_delta integer)
+RETURNS void AS $$
+BEGIN
+    IF p_date_to <= p_date_from THEN
+        RETURN;
+    END IF;
+    INSERT INTO room_inventory (room_id, night, booked)
+    SELECT p_room_id, nights.night::date, p_delta
+    FROM generate_series(p_date_from, p_date_to - 1, interval '1 day') AS nights(night)
+    ON CONFLICT (room_id, night)
+    DO UPDATE SET booked = room_inventory.booked + EXCLUDED.booked;
+    IF p_delta < 0 THEN
+        DELETE FROM room_inventory
+        WHERE room_id = p_room_id
+          AND night >= p_date_from
+          AND night < p_date_to
+          AND booked <= 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Триггерная функция: при удалении/изменении брони снимаем старые ночи,
+# при добавлении/изменении брони - добавляем новые.
+BOOKINGS_ROOM_INVENTORY_FUNCTION = """
+CREATE OR REPLACE FUNCTION bookings_room_inventory_trg()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM room_inventory_apply(OLD.room_id, OLD.date_from, OLD.date_to, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM room_inventory_apply(NEW.room_id, NEW.date_from, NEW.date_to, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+BOOKINGS_ROOM_INVENTORY_TRIGGER = """
+CREATE TRIGGER bookings_room_inventory
+AFTER INSERT OR DELETE OR UPDATE OF room_id, date_from, date_to ON bookings
+FOR EACH ROW EXECUTE FUNCTION bookings_room_inventory_trg();
+"""
+
+# Заполняем таблицу по уже существующим бронированиям.
+ROOM_INVENTORY_BACKFILL = """
+INSERT INTO room_inventory (room_id, night, booked)
+SELECT bookings.room_id, nights.night::date, count(*)
+FROM bookings
+CROSS JOIN LATERAL generate_series(bookings.date_from,
+                                   bookings.date_to - 1,
+                                   interval '1 day') AS nights(night)
+GROUP BY bookings.room_id, nights.night::date;
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        "room_inventory",
+        sa.Column("room_id", sa.Integer(), nullable=False),
+        sa.Column("night", sa.Date(), nullable=False),
+        sa.Column("booked", sa.Integer(), server_default="0", nullable=False),
+        sa.ForeignKeyConstraint(["room_id"], ["rooms.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("room_id", "night"),
+    )
+    op.execute(ROOM_INVENTORY_APPLY_FUNCTION)
+    op.execute(BOOKINGS_ROOM_INVENTORY_FUNCTION)
+    op.execute(BOOKINGS_ROOM_INVENTORY_TRIGGER)
+    op.execute(ROOM_INVENTORY_BACKFILL)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS bookings_room_inventory ON bookings;")
+    op.execute("DROP FUNCTION IF EXISTS bookings_room_inventory_trg();")
+    op.execute("DROP FUNCTION IF EXISTS room_inventory_apply(integer, date, date, integer);")
+    op.drop_table("room_inventory")
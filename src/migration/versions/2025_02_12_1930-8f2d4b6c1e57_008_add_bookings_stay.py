@@ -0,0 +1,46 @@
+"""008 Add bookings stay
+
+Revision ID: 8f2d4b6c1e57
+Revises: 3c9e1f7a2b40
+Create Date: 2025-02-12 19:30:07.512384
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8f2d4b6c1e57"
+down_revision: Union[str, None] = "3c9e1f7a2b40"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # btree_gist позволяет включить в GiST-индекс столбец room_id (integer)
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist;")
+    op.add_column(
+        "bookings",
+        sa.Column(
+            "stay",
+            postgresql.DATERANGE(),
+            sa.Computed("daterange(date_from, date_to, '[)')", persisted=True),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "ix_bookings_room_id_stay",
+        "bookings",
+        ["room_id", "stay"],
+        unique=False,
+        postgresql_using="gist",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_bookings_room_id_stay", table_name="bookings", postgresql_using="gist")
+    op.drop_column("bookings", "stay")
@@ -0,0 +1,53 @@
+"""009 Add trigram indexes
+
+Revision ID: 5a7c3e9d2f18
+Revises: 8f2d4b6c1e57
+Create Date: 2025-02-14 10:45:21.736025
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5a7c3e9d2f18"
+down_revision: Union[str, None] = "8f2d4b6c1e57"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (имя индекса, таблица, столбец)
+TRIGRAM_INDEXES = (
+    ("ix_hotels_title_trgm", "hotels", "title"),
+    ("ix_hotels_location_trgm", "hotels", "location"),
+    ("ix_rooms_title_trgm", "rooms", "title"),
+    ("ix_rooms_description_trgm", "rooms", "description"),
+    ("ix_facilities_title_trgm", "facilities", "title"),
+)
+
+
+def upgrade() -> None:
+    # pg_trgm - операторный класс gin_trgm_ops, который позволяет
+    # использовать GIN-индекс для LIKE/ILIKE '%строка%'
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    for index_name, table_name, column_name in TRIGRAM_INDEXES:
+        op.create_index(
+            index_name,
+            table_name,
+            [column_name],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_ops={column_name: "gin_trgm_ops"},
+        )
+
+
+def downgrade() -> None:
+    for index_name, table_name, column_name in reversed(TRIGRAM_INDEXES):
+        op.drop_index(
+            index_name,
+            table_name=table_name,
+            postgresql_using="gin",
+            postgresql_ops={column_name: "gin_trgm_ops"},
+        )
@@ -0,0 +1,70 @@
+"""010 Add search vectors
+
+Revision ID: b41e8c7d3a92
+Revises: 5a7c3e9d2f18
+Create Date: 2025-02-15 16:20:44.108253
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b41e8c7d3a92"
+down_revision: Union[str, None] = "5a7c3e9d2f18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "hotels",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+                "setweight(to_tsvector('russian', coalesce(location, '')), 'B')",
+                persisted=True,
+            ),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "ix_hotels_search_vector",
+        "hotels",
+        ["search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+    op.add_column(
+        "rooms",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+                "setweight(to_tsvector('russian', coalesce(description, '')), 'B')",
+                persisted=True,
+            ),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "ix_rooms_search_vector",
+        "rooms",
+        ["search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_rooms_search_vector", table_name="rooms", postgresql_using="gin")
+    op.drop_column("rooms", "search_vector")
+    op.drop_index("ix_hotels_search_vector", table_name="hotels", postgresql_using="gin")
+    op.drop_column("hotels", "search_vector")
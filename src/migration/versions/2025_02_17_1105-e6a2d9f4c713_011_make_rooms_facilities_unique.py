@@ -0,0 +1,45 @@
+"""011 Make rooms facilities unique
+
+Revision ID: e6a2d9f4c713
+Revises: b41e8c7d3a92
+Create Date: 2025-02-17 11:05:12.640381
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e6a2d9f4c713"
+down_revision: Union[str, None] = "b41e8c7d3a92"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Перед созданием ограничения удаляем повторяющиеся связи номер-удобство,
+# оставляем связь с наименьшим id.
+DELETE_DUPLICATES = """
+DELETE FROM rooms_facilities AS duplicate
+USING rooms_facilities AS original
+WHERE duplicate.room_id = original.room_id
+  AND duplicate.facility_id = original.facility_id
+  AND duplicate.id > original.id
+"""
+
+
+def upgrade() -> None:
+    op.execute(sa.text(DELETE_DUPLICATES))
+    op.create_unique_constraint(
+        "uq_rooms_facilities_room_id_facility_id",
+        "rooms_facilities",
+        ["room_id", "facility_id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint(
+        "uq_rooms_facilities_room_id_facility_id", "rooms_facilities", type_="unique"
+    )
@@ -1,8 +1,9 @@
 from datetime import date
 
+from sqlalchemy.dialects.postgresql import DATERANGE, Range
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import ForeignKey
+from sqlalchemy import Computed, ForeignKey, Index
 from src.database import Base
 
 
@@ -10,6 +11,14 @@ class BookingsORM(Base):
     # Наименование таблицы
     __tablename__ = "bookings"
 
+    # GiST-индекс по (room_id, stay) для поиска пересекающихся бронирований
+    # (оператор &&) по конкретному номеру. Для индексирования room_id
+    # (целое число) в GiST нужно расширение btree_gist - см. миграцию
+    # 008 Add bookings stay.
+    __table_args__ = (Index("ix_bookings_room_id_stay", "room_id", "stay",
+                            postgresql_using="gist"),
+                      )
+
     # Первичный ключ, уникальное значение
     id: Mapped[int] = mapped_column(primary_key=True)
 
@@ -38,9 +47,47 @@ class BookingsORM(Base):
     # Делаем допущение, что цена всегда круглая, нет никаких копеек
     price: Mapped[int]
 
+    # Период проживания [date_from, date_to) - вычисляемый (генерируемый
+    # базой данных) столбец. День выезда в период не входит, поэтому брони,
+    # у которых выезд одной совпадает с заездом другой, не пересекаются.
+    # Используется в условиях пересечения периодов: stay && daterange(...).
+    stay: Mapped[Range[date]] = mapped_column(
+        DATERANGE,
+        Computed("daterange(date_from, date_to, '[)')", persisted=True)
+    )
+
     @hybrid_property
     def total_cost(self) -> int:
         # (self.date_to - self.date_from) - это объект timedelta. Берём дни (days).
         return self.price * (self.date_to - self.date_from).days
 
 
+
+
+class RoomInventoryORM(Base):
+    # Таблица-витрина (read model) занятости номеров по ночам.
+    # Строки таблицы не пишутся из кода приложения: их поддерживают
+    # в актуальном состоянии триггеры на таблице bookings (см. миграцию
+    # 007 Add room inventory). Бронь с date_from по date_to занимает ночи
+    # date_from, date_from + 1, ..., date_to - 1 (день выезда не занят).
+
+    # Наименование таблицы
+    __tablename__ = "room_inventory"
+
+    # Столбцы
+
+    # Внешний ключ привязывающий к номеру
+    # Идентификатор номера. Вместе с night образует первичный ключ,
+    # поэтому выборка по номеру и диапазону дат - это сканирование
+    # диапазона индекса первичного ключа.
+    # ForeignKey("название_таблицы.название_столбца")
+    # Строки занятости удаляются вместе с номером (ondelete="CASCADE"):
+    # удаление номера без бронирований не должно упираться в room_inventory.
+    room_id: Mapped[int] = mapped_column(ForeignKey("rooms.id", ondelete="CASCADE"),
+                                         primary_key=True)
+
+    # Ночь (дата заезда на эту ночь)
+    night: Mapped[date] = mapped_column(primary_key=True)
+
+    # Количество забронированных номеров этого типа на эту ночь
+    booked: Mapped[int] = mapped_column(default=0, server_default="0")
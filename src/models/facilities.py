@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey, String
+from sqlalchemy import ForeignKey, String, Index, UniqueConstraint
 from sqlalchemy.orm import mapped_column, Mapped, relationship
 
 from src.database import Base
@@ -10,6 +10,13 @@ class FacilitiesORM(Base):
     # Наименование таблицы
     __tablename__ = "facilities"
 
+    # Триграммный GIN-индекс (расширение pg_trgm) для поиска подстроки
+    # через LIKE/ILIKE '%строка%' - см. миграцию 009 Add trigram indexes.
+    __table_args__ = (Index("ix_facilities_title_trgm", "title",
+                            postgresql_using="gin",
+                            postgresql_ops={"title": "gin_trgm_ops"}),
+                      )
+
     # Столбцы
 
     # Первичный ключ, уникальное значение
@@ -52,6 +59,13 @@ class RoomsFacilitiesORM(Base):
     # Наименование таблицы - отображаем, что связываем две таблицы: rooms и facilities.
     __tablename__ = "rooms_facilities"
 
+    # Удобство указывается в номере не более одного раза. Ограничение
+    # используется в INSERT ... ON CONFLICT (room_id, facility_id) DO NOTHING
+    # - см. миграцию 011 Make rooms facilities unique.
+    __table_args__ = (UniqueConstraint("room_id", "facility_id",
+                                       name="uq_rooms_facilities_room_id_facility_id"),
+                      )
+
     # Столбцы
 
     # Первичный ключ, уникальное значение
@@ -1,5 +1,6 @@
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import String, INT
+from sqlalchemy import String, INT, Index, Computed
 from src.database import Base
 
 
@@ -7,6 +8,20 @@ class HotelsORM(Base):
     # Наименование таблицы
     __tablename__ = "hotels"
 
+    # Триграммные GIN-индексы (расширение pg_trgm) для поиска подстроки
+    # через LIKE/ILIKE '%строка%' - см. миграцию 009 Add trigram indexes.
+    __table_args__ = (Index("ix_hotels_title_trgm", "title",
+                            postgresql_using="gin",
+                            postgresql_ops={"title": "gin_trgm_ops"}),
+                      Index("ix_hotels_location_trgm", "location",
+                            postgresql_using="gin",
+                            postgresql_ops={"location": "gin_trgm_ops"}),
+                      # GIN-индекс для полнотекстового поиска (search_vector @@ tsquery)
+                      # - см. миграцию 010 Add search vectors.
+                      Index("ix_hotels_search_vector", "search_vector",
+                            postgresql_using="gin"),
+                      )
+
     # Столбцы
 
     # Первичный ключ, уникальное значение
@@ -18,4 +33,16 @@ class HotelsORM(Base):
     # Местонахождение отеля.
     location: Mapped[str]
 
+    # Документ для полнотекстового поиска: наименование (вес A) и адрес
+    # (вес B). Вычисляется базой данных при записи строки (GENERATED ALWAYS
+    # AS ... STORED). deferred=True - столбец не выбирается в обычных
+    # запросах, он нужен только в условиях поиска.
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed("setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+                 "setweight(to_tsvector('russian', coalesce(location, '')), 'B')",
+                 persisted=True),
+        deferred=True,
+    )
+
 
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import DateTime, Index, String, func
+from src.database import Base
+
+
+class RevokedTokensORM(Base):
+    # Наименование таблицы
+    __tablename__ = "revoked_tokens"
+
+    # Индекс по времени отзыва для догрузки новых отозванных токенов
+    # (RevokedTokensRepository.get_revoked_since)
+    __table_args__ = (Index("ix_revoked_tokens_revoked_at", "revoked_at"),
+                      )
+
+    # Столбцы
+
+    # Первичный ключ - идентификатор токена (поле jti токена доступа)
+    jti: Mapped[str] = mapped_column(String(length=64), primary_key=True)
+
+    # Время истечения срока действия токена (поле exp токена доступа).
+    # После него запись больше не нужна: просроченный токен и так не принимается.
+    exp: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    # Время отзыва токена (выход пользователя)
+    revoked_at: Mapped[datetime] = mapped_column(DateTime(timezone=True),
+                                                 server_default=func.now())
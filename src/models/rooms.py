@@ -1,5 +1,6 @@
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, ForeignKey
+from sqlalchemy import String, ForeignKey, Index, Computed
 from src.database import Base
 
 
@@ -7,6 +8,20 @@ class RoomsORM(Base):
     # Наименование таблицы
     __tablename__ = "rooms"
 
+    # Триграммные GIN-индексы (расширение pg_trgm) для поиска подстроки
+    # через LIKE/ILIKE '%строка%' - см. миграцию 009 Add trigram indexes.
+    __table_args__ = (Index("ix_rooms_title_trgm", "title",
+                            postgresql_using="gin",
+                            postgresql_ops={"title": "gin_trgm_ops"}),
+                      Index("ix_rooms_description_trgm", "description",
+                            postgresql_using="gin",
+                            postgresql_ops={"description": "gin_trgm_ops"}),
+                      # GIN-индекс для полнотекстового поиска (search_vector @@ tsquery)
+                      # - см. миграцию 010 Add search vectors.
+                      Index("ix_rooms_search_vector", "search_vector",
+                            postgresql_using="gin"),
+                      )
+
     # Столбцы
     # Из статьи "Асинхронный SQLAlchemy 2: простой пошаговый гайд по
     # настройке, моделям, связям и миграциям с использованием Alembic"
@@ -44,6 +59,18 @@ class RoomsORM(Base):
     # Если не указываем параметры поля, то mapped_column() можно опустить.
     quantity: Mapped[int]
 
+    # Документ для полнотекстового поиска: наименование (вес A) и описание
+    # (вес B). Вычисляется базой данных при записи строки (GENERATED ALWAYS
+    # AS ... STORED). deferred=True - столбец не выбирается в обычных
+    # запросах, он нужен только в условиях поиска.
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed("setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+                 "setweight(to_tsvector('russian', coalesce(description, '')), 'B')",
+                 persisted=True),
+        deferred=True,
+    )
+
     # Связь relationship с таблицей
     # В атрибуте facilities будут все удобства, имеющиеся в этом номере
 
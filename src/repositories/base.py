@@ -1,19 +1,26 @@
 from typing import Union
 
-from sqlalchemy import select, insert, update, delete
+import orjson
+from asyncpg.exceptions import ForeignKeyViolationError
+
+from sqlalchemy import select, insert, update, delete, and_, or_, func
 from sqlalchemy import select as sa_select  # Для реализации SQL команды SELECT
 from sqlalchemy import insert as sa_insert  # Для реализации SQL команды INSERT
 from sqlalchemy import update as sa_update  # Для реализации SQL команды UPDATE
 from sqlalchemy import delete as sa_delete  # Для реализации SQL команды DELETE
 
+from fastapi import HTTPException
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from src.api.dependencies.dependencies_consts import pagination_pages
+from src.config import settings
+from src.repositories.utils import encode_cursor, schema_columns, schema_list_adapter
+from src.utils.cache import MISSING, entity_cache
 
 
-from src.database import engine
+from src.database import READ_PRIMARY_INFO, engine, pin_primary
 from src.schemas.rooms import RoomWithRels
 
 
@@ -101,9 +108,18 @@ from src.schemas.rooms import RoomWithRels
 #     model = HotelsORM
 #     ...
 
+# Ключ в session.info, в котором сохраняются ключи кэша сущностей, изменённых
+# в текущей транзакции (см. BaseRepository.invalidate_cache и DBManager.commit)
+CACHE_KEYS_INFO = "entity_cache_keys"
+
+
 class BaseRepository:
     model = None
     schema: BaseModel = None
+    # Кэшировать выборки по идентификатору (fetch_by_id) в кэше сущностей
+    # src.utils.cache.entity_cache. Включается в репозиториях таблиц, которые
+    # редко меняются (отели, номера, удобства, пользователи).
+    cacheable: bool = False
 
     def __init__(self, session: AsyncSession):
         self.session = session
@@ -117,8 +133,23 @@ class BaseRepository:
     # - get_rows. Выбирает заданное количество строк с заданным смещением.
     #       Возвращает пустой список: [] или список из выбранных строк, тип
     #       возвращаемых элементов преобразован к схеме Pydantic: self.schema.
+    # - get_ranked_rows. Выбирает страницу строк, упорядоченных по убыванию
+    #       релевантности (rank), с выводом по ключу (rank, id).
+    #       Возвращает список строк, преобразованных к схеме Pydantic, и
+    #       курсор следующей страницы.
+    # - stream_rows. Выбирает все строки через серверный курсор и отдаёт их
+    #       пакетами (асинхронный генератор). Используется для потоковой
+    #       выгрузки списков без загрузки всей таблицы в память.
+    # - dump_json. Сериализует список схем Pydantic в JSON одним вызовом
+    #       TypeAdapter.dump_json. Возвращает orjson.Fragment для ответа
+    #       ORJSONResponse.
     # - add. Добавляет один объект в базу, используя метод insert.
     #       Возвращает список, содержащий добавленный объект.
+    # - add_copy. Добавляет пакет объектов командой COPY (asyncpg
+    #       copy_records_to_table). Возвращает список идентификаторов
+    #       добавленных объектов.
+    # - raise_missing_references. Выбирает значения внешних ключей пакета,
+    #       которых нет в связанных таблицах, и поднимает исключение с кодом 404.
     # - edit. Редактирует один объект в базе, используя метод update.
     #       Возвращает пустой список: [] или список из выбранных строк, тип
     #       возвращаемых элементов преобразован к схеме Pydantic: self.schema.
@@ -145,6 +176,9 @@ class BaseRepository:
     #       объект в базе, используя метод get.
     #       Возвращает None или объект, преобразованный к схеме
     #       Pydantic: self.schema.
+    # - fetch_by_id. Выбирает по идентификатору один объект через кэш
+    #       сущностей (если репозиторий cacheable).
+    # - invalidate_cache. Удаляет из кэша сущностей изменённые записи.
     # - get_one_or_none. Выбирает объекты из базы по запросу с фильтрами
     #       filter_by(**filtering). Использует штатный метод one_or_none().
     #       Возвращает первую строку результата или None если результатов нет.
@@ -188,6 +222,8 @@ class BaseRepository:
                        #                 Не используется, если параметр show_all=True.
                        show_all=None,
                        order_by=True,
+                       after_id: int | None = None,
+                       core: bool = False,
                        **filter_by):
         """
         Метод класса. Выбирает заданное количество строк с заданным смещением.
@@ -211,6 +247,17 @@ class BaseRepository:
                 записи, соответствующие запросу (True), или выбирать,
                 основываясь на порядке в базе данных (False или None).
                 Может отсутствовать.
+        :param after_id: Идентификатор последней выведенной записи для вывода
+                по ключу (keyset pagination): выбираются записи с
+                self.model.id > after_id, параметр page не используется.
+                Не используется, если параметр show_all=True.
+                Может отсутствовать.
+        :param core: Выбирать только столбцы схемы pydantic_schema кортежами,
+                без создания сущностей ORM (True), или выбирать сущности
+                модели (False или None). Строки проверяются схемой за один
+                вызов TypeAdapter(list[схема]). Подходит для схем, все поля
+                которых - столбцы таблицы self.model (без связей
+                relationship). Может отсутствовать.
         :param filter_by: Фильтры для запроса - конструкция .filter_by(**filter_by).
 
         :return: Возвращает пустой список: [] или список из выбранных строк:
@@ -233,12 +280,40 @@ class BaseRepository:
 
         if not show_all:
             limit = per_page
-            offset = ((page - 1) * per_page)
-            query = query.limit(limit).offset(offset)
+            if after_id is not None:
+                # Вывод по ключу: WHERE id > :after_id ORDER BY id LIMIT :per_page.
+                # Пропущенные строки не читаются, поэтому любая страница
+                # выбирается так же быстро, как первая.
+                query = query.filter(self.model.id > after_id).limit(limit)
+                order_by = True
+            else:
+                offset = ((page - 1) * per_page)
+                query = query.limit(limit).offset(offset)
 
         if order_by:
             query = query.order_by(self.model.id)
 
+        if core:
+            # Вместо сущности модели выбираются только столбцы схемы.
+            # maintain_column_froms=True сохраняет в FROM таблицы исходного
+            # запроса (в том числе соединения JOIN).
+            query = query.with_only_columns(*schema_columns(self.model, pydantic_schema),
+                                            maintain_column_froms=True)
+            # print(query.compile(compile_kwargs={"literal_binds": True}))
+            # Вывод: SELECT hotels.id, hotels.title, hotels.location
+            #        FROM hotels ORDER BY hotels.id
+            result = await self.session.execute(query)
+            # Кортежи строк преобразуются в словари, и весь список
+            # проверяется схемой одним вызовом validate_python. Это быстрее,
+            # чем создание сущностей ORM (identity map, состояние объектов)
+            # и model_validate для каждой строки, а также быстрее
+            # pydantic_schema.model_construct(**row) для каждой строки
+            # (см. benchmarks/bench_get_rows.py).
+            keys = tuple(result.keys())
+            return schema_list_adapter(pydantic_schema).validate_python(
+                [dict(zip(keys, row)) for row in result.all()]
+            )
+
         result = await self.session.execute(query)
         # HotelPydanticSchema.model_validate() получает на входе словарь, ключи которого
         # будут считаться именами полей в схеме, или сущностью HotelPydanticSchema
@@ -263,6 +338,169 @@ class BaseRepository:
         # return result.scalars().all()
         return result_pydantic_schema
 
+    async def get_ranked_rows(self,
+                              query,
+                              rank,
+                              pydantic_schema=None,
+                              per_page=pagination_pages["per_page"],
+                              after: dict | None = None,
+                              core: bool = False):
+        """
+        Метод класса. Выбирает страницу строк, упорядоченных по убыванию
+        релевантности rank (при равной релевантности - по возрастанию
+        self.model.id). Следующая страница выбирается по ключу (rank, id)
+        последней выведенной строки (keyset pagination):
+        WHERE rank < :rank OR (rank = :rank AND id > :id).
+
+        :param query: SQL-запрос с условиями поиска.
+        :param rank: Выражение релевантности, например ts_rank(...).
+        :param pydantic_schema: Схема pydantic, к которой преобразовываются
+                полученные значения.
+        :param per_page: Количество элементов на странице.
+        :param after: Ключ последней строки предыдущей страницы (из курсора):
+                {"rank": 0.0607927, "id": 198}. Если не указан, то
+                выбирается первая страница.
+        :param core: Выбирать только столбцы схемы pydantic_schema, без
+                создания сущностей ORM (см. параметр core метода get_rows).
+
+        :return: Возвращает кортеж из двух элементов:
+                - список выбранных строк, преобразованных к схеме Pydantic;
+                - курсор следующей страницы или None, если следующей
+                  страницы нет.
+        """
+        if pydantic_schema is None:
+            pydantic_schema = self.schema
+
+        if after is not None:
+            if not isinstance(after.get("rank"), (int, float)):
+                # status_code=422: Запрос сформирован правильно, но его невозможно
+                #                  выполнить из-за семантических ошибок
+                raise HTTPException(status_code=422,
+                                    detail={"description": "Некорректный курсор",
+                                            })
+            query = query.filter(or_(rank < after["rank"],
+                                     and_(rank == after["rank"],
+                                          self.model.id > after["id"])))
+
+        if core:
+            query = query.with_only_columns(*schema_columns(self.model, pydantic_schema),
+                                            maintain_column_froms=True)
+
+        rank_label = rank.label("rank")
+        query = (query
+                 .add_columns(rank_label)
+                 .order_by(rank_label.desc(), self.model.id)
+                 .limit(per_page)
+                 )
+
+        result = await self.session.execute(query)
+        if core:
+            # Последний столбец строки - rank, остальные - столбцы схемы
+            keys = tuple(result.keys())[:-1]
+            rows = result.all()
+            result_pydantic_schema = schema_list_adapter(pydantic_schema).validate_python(
+                [dict(zip(keys, row)) for row in rows]
+            )
+        else:
+            rows = result.all()
+            result_pydantic_schema = [pydantic_schema.model_validate(row_model)
+                                      for row_model, _ in rows]
+
+        next_cursor = None
+        if len(rows) == per_page:
+            next_cursor = encode_cursor(rank=rows[-1][-1], id=result_pydantic_schema[-1].id)
+        return result_pydantic_schema, next_cursor
+
+    async def stream_rows(self, *filter,
+                          query=None,
+                          pydantic_schema=None,
+                          order_by=True,
+                          batch_size: int | None = None,
+                          **filter_by):
+        """
+        Метод класса. Выбирает все строки, соответствующие запросу, через
+        серверный курсор (AsyncSession.stream_scalars) и отдаёт их пакетами.
+        В памяти одновременно находится только один пакет строк, поэтому
+        выгрузка таблицы любого размера идёт с постоянным расходом памяти.
+
+        :param filter: Фильтры для запроса - конструкция .filter(*filter).
+        :param query: SQL-Запрос. Если простой SELECT-запрос на выборку,
+                то он формируется внутри метода.
+        :param pydantic_schema: Схема pydantic, к которой преобразовываются
+                полученные значения.
+        :param order_by: Упорядочивать записи по полю self.model.id (True)
+                или выбирать, основываясь на порядке в базе данных
+                (False или None). Может отсутствовать.
+        :param batch_size: Количество строк в пакете. Если не указано, то
+                используется значение settings.STREAM_BATCH_SIZE.
+        :param filter_by: Фильтры для запроса - конструкция .filter_by(**filter_by).
+
+        :return: Асинхронный генератор, который возвращает списки из строк,
+                преобразованных к схеме Pydantic: self.schema
+                (не более batch_size элементов в списке).
+        """
+        if pydantic_schema is None:
+            pydantic_schema = self.schema
+
+        if batch_size is None:
+            batch_size = settings.STREAM_BATCH_SIZE
+
+        if query is None:
+            query = (sa_select(self.model)
+                     .filter(*filter)
+                     .filter_by(**filter_by)
+                     )
+
+        if order_by:
+            query = query.order_by(self.model.id)
+
+        # yield_per - строки читаются из серверного курсора asyncpg порциями
+        # по batch_size штук, а partitions() отдаёт их такими же порциями.
+        result = await self.session.stream_scalars(query.execution_options(yield_per=batch_size))
+        async for partition in result.partitions():
+            yield [pydantic_schema.model_validate(row_model) for row_model in partition]
+            # Выгруженные объекты больше не нужны, убираем их из сессии,
+            # чтобы identity map не росла вместе с количеством строк.
+            self.session.expunge_all()
+
+    @staticmethod
+    def get_next_cursor(result: list, per_page: int | None, show_all: bool | None):
+        """
+        Метод класса. Формирует курсор для вывода следующей страницы по ключу
+        (см. параметр after_id метода get_rows).
+
+        :param result: Список записей текущей страницы (результат get_rows).
+        :param per_page: Количество элементов на странице.
+        :param show_all: Выводился ли весь список сразу.
+
+        :return: Возвращает строку курсора или None, если следующей
+            страницы нет (страница заполнена не полностью или выводится
+            весь список).
+        """
+        if show_all or not result or len(result) < per_page:
+            return None
+        return encode_cursor(id=result[-1].id)
+
+    def dump_json(self, result: list, pydantic_schema=None) -> orjson.Fragment:
+        """
+        Метод класса. Сериализует список схем Pydantic в JSON одним вызовом
+        TypeAdapter(list[схема]).dump_json (без промежуточных словарей).
+
+        :param result: Список записей, преобразованных к схеме pydantic_schema
+                (результат get_rows).
+        :param pydantic_schema: Схема pydantic записей списка. Если не
+                задано, то принимает значение по умолчанию: self.schema
+
+        :return: Возвращает orjson.Fragment - сериализованный список, который
+                вставляется в ответ ORJSONResponse без изменений, например:
+                {"status": ..., "hotels": self.dump_json(result)}
+                Такой словарь надо возвращать из ручки в ORJSONResponse, а не
+                напрямую (jsonable_encoder не поддерживает orjson.Fragment).
+        """
+        if pydantic_schema is None:
+            pydantic_schema = self.schema
+        return orjson.Fragment(schema_list_adapter(pydantic_schema).dump_json(result))
+
     async def add(self, added_data: BaseModel, **kwargs):
         """
         Метод класса. Добавляет один объект в базу, используя метод insert.
@@ -307,6 +545,7 @@ class BaseRepository:
         # return result_pydantic_schema
         model = result.scalars().one()
         result_pydantic_schema = self.schema.model_validate(model)
+        self.invalidate_cache([result_pydantic_schema.id])
         return result_pydantic_schema
 
     async def add_bulk(self, added_data: list[BaseModel], **kwargs):
@@ -362,6 +601,98 @@ class BaseRepository:
         # return result.scalars().all()
         # return result_pydantic_schema
 
+    async def add_copy(self, added_data: list[BaseModel]) -> list[int]:
+        """
+        Метод класса. Добавляет пакет объектов в базу командой COPY
+        (asyncpg copy_records_to_table) - значительно быстрее, чем INSERT
+        для каждого объекта или один INSERT ... VALUES на много строк.
+
+        COPY не умеет возвращать значения (RETURNING), поэтому идентификаторы
+        заранее выбираются из последовательности таблицы (nextval) и
+        передаются в COPY вместе с данными.
+
+        :param added_data: Добавляемые данные. В таблицу записываются поля
+            схемы, совпадающие с колонками таблицы (остальные поля, например
+            facilities_ids, пропускаются).
+
+        :return: Возвращает список идентификаторов добавленных объектов в том
+            же порядке, что и added_data. Если связанная запись отсутствует
+            (внешний ключ), то поднимается исключение HTTPException с кодом 404
+            (метод raise_missing_references).
+        """
+        if not added_data:
+            return []
+
+        # COPY выполняется в основной базе данных, в транзакции сессии
+        pin_primary(self.session)
+        table = self.model.__table__
+        columns = [name for name in type(added_data[0]).model_fields
+                   if name in table.columns and name != "id"]
+
+        ids_query = (sa_select(func.nextval(func.pg_get_serial_sequence(table.name, "id")))
+                     .select_from(func.generate_series(1, len(added_data)))
+                     )
+        # print(ids_query.compile(engine))
+        # SELECT nextval(pg_get_serial_sequence($1, $2::VARCHAR)) AS nextval_1
+        # FROM generate_series($3::INTEGER, $4::INTEGER)
+        # Параметры: ('hotels', 'id', 1, 3)
+        ids = (await self.session.execute(ids_query)).scalars().all()
+
+        records = [(object_id, *(getattr(item, name) for name in columns))
+                   for object_id, item in zip(ids, added_data)]
+        # Соединение asyncpg, на котором выполняется транзакция сессии
+        connection = await self.session.connection()
+        raw_connection = await connection.get_raw_connection()
+        try:
+            # COPY выполняется в точке сохранения (SAVEPOINT): при ошибке
+            # откатывается только она, и в транзакции сессии можно выбрать
+            # отсутствующие связанные записи
+            async with self.session.begin_nested():
+                await raw_connection.driver_connection.copy_records_to_table(table.name,
+                                                                             records=records,
+                                                                             columns=["id", *columns])
+        except ForeignKeyViolationError:
+            # Связанная запись удалена между проверкой (например,
+            # RoomsRepository.check_bulk_references) и COPY. Ошибка asyncpg
+            # не преобразуется в IntegrityError SQLAlchemy, поэтому
+            # обрабатывается здесь
+            await self.raise_missing_references(added_data)
+            raise
+        return list(ids)
+
+    async def raise_missing_references(self, added_data: list[BaseModel]):  # -> None:
+        """
+        Метод класса. Выбирает значения внешних ключей пакета, которых нет в
+        связанных таблицах (один запрос на каждый внешний ключ таблицы).
+
+        :param added_data: Пакет добавляемых объектов.
+
+        :return: Ничего не возвращает, если отсутствующих записей нет. Иначе
+            поднимается исключение HTTPException с кодом 404 и списками
+            отсутствующих идентификаторов для каждой связанной таблицы:
+            {"description": ..., "hotels_ids": [...]}.
+        """
+        table = self.model.__table__
+        fields = type(added_data[0]).model_fields
+        missing = {}
+        for name in fields:
+            if name not in table.columns:
+                continue
+            for foreign_key in table.c[name].foreign_keys:
+                values = {getattr(item, name) for item in added_data} - {None}
+                result = await self.session.execute(sa_select(foreign_key.column)
+                                                    .filter(foreign_key.column.in_(values)))
+                found = set(result.scalars().all())
+                missing[f"{foreign_key.column.table.name}_ids"] = sorted(values - found)
+
+        if any(missing.values()):
+            # status_code=404: Сервер понял запрос, но не нашёл
+            #                  соответствующего ресурса по указанному URL
+            raise HTTPException(status_code=404,
+                                detail={"description": "Отсутствуют связанные записи",
+                                        **missing,
+                                        })
+
     async def edit(self,
                    edited_data: BaseModel,
                    edit_stmt=None,
@@ -415,6 +746,7 @@ class BaseRepository:
         #  HotelPydanticSchema(title='title_string_2', location='location_string_2', id=17),
         #  ..., HotelPydanticSchema(title='title_string_N', location='location_string_N', id=198)]
         # Тип возвращаемых элементов преобразован к схеме Pydantic: self.schema
+        self.invalidate_cache([row.id for row in result_pydantic_schema])
         # return result
         return result_pydantic_schema
 
@@ -461,6 +793,8 @@ class BaseRepository:
                     # ORM object that correspond to valid table columns
                     setattr(result, key, value)
 
+            self.invalidate_cache([object_id])
+
             # Преобразование объекта SQLAlchemy в Pydantic
             # result_pydantic_schema = self.schema.model_validate(result, from_attributes=True)
             result_pydantic_schema = self.schema.model_validate(result)
@@ -515,6 +849,7 @@ class BaseRepository:
         #  HotelPydanticSchema(title='title_string_2', location='location_string_2', id=17),
         #  ..., HotelPydanticSchema(title='title_string_N', location='location_string_N', id=198)]
         # Тип возвращаемых элементов преобразован к схеме Pydantic: self.schema
+        self.invalidate_cache([row.id for row in result_pydantic_schema])
         # return result
         return result_pydantic_schema
 
@@ -547,6 +882,7 @@ class BaseRepository:
             # Session’s list of objects to be marked as deleted:
             # https://docs.sqlalchemy.org/en/20/orm/session_basics.html#deleting
             await self.session.delete(result)
+            self.invalidate_cache([object_id])
             # print(type(self.session.deleted))
             #       <class 'sqlalchemy.cyextension.collections.IdentitySet'>
             # print(self.session.deleted)
@@ -577,17 +913,56 @@ class BaseRepository:
             return result_pydantic_schema
         return None
 
-    async def get_by_id(self, object_id: int):  # -> None:
+    async def get_by_id(self, object_id: int, use_cache: bool = True):  # -> None:
         """
         Метод класса. Выбирает по идентификатору (поле self.model.id) один
         объект в базе, используя метод get.
+        Использует метод fetch_by_id (кэш сущностей).
 
         :param object_id: Идентификатор выбираемого объекта.
+        :param use_cache: Использовать кэш сущностей (True) или выбрать
+            объект из базы данных (False).
 
         :return: Возвращает None или объект, преобразованный к схеме Pydantic: self.schema.
         """
+        return await self.fetch_by_id(object_id, use_cache=use_cache)
 
-        result = await self.session.get(self.model, object_id)
+    async def fetch_by_id(self, object_id: int, use_cache: bool = True):  # -> None:
+        """
+        Метод класса. Выбирает по идентификатору (поле self.model.id) один
+        объект через кэш сущностей: если объект есть в кэше, то запрос к базе
+        данных не выполняется. Кэш используется, только если репозиторий
+        cacheable и объект не изменялся в текущей транзакции.
+
+        :param object_id: Идентификатор выбираемого объекта.
+        :param use_cache: Использовать кэш сущностей (True) или выбрать
+            объект из базы данных (False).
+
+        :return: Возвращает None или объект, преобразованный к схеме Pydantic: self.schema.
+        """
+        key = (self.model.__tablename__, object_id)
+        # Объект, изменённый в текущей (ещё не подтверждённой) транзакции, берём
+        # из базы и в кэш не кладём: другие запросы не должны его видеть до commit.
+        use_cache = (use_cache
+                     and self.cacheable
+                     and key not in self.session.info.get(CACHE_KEYS_INFO, ()))
+        if use_cache:
+            cached = entity_cache.get(key)
+            if cached is not MISSING:
+                return cached
+            # Объект для кэша читаем из основной базы данных (только этот
+            # запрос, сессия не закрепляется): реплика может отставать, и
+            # сразу после сброса кэша при записи (DBManager.commit) в кэш на
+            # ENTITY_CACHE_TTL секунд попала бы прежняя версия записи.
+            # populate_existing - обновить объект, если он уже есть в сессии.
+            query = (sa_select(self.model)
+                     .filter_by(id=object_id)
+                     .execution_options(populate_existing=True))
+            result = await self.session.execute(query,
+                                                bind_arguments={READ_PRIMARY_INFO: True})
+            result = result.scalars().one_or_none()
+        else:
+            result = await self.session.get(self.model, object_id)
         # result: None или <src.models.hotels.HotelsORM object at 0x0000023FB96EAD90>
         # return result
         # Шаг 4: Преобразование объекта SQLAlchemy в Pydantic
@@ -597,9 +972,27 @@ class BaseRepository:
             result_pydantic_schema = self.schema.model_validate(result)
             # Получаем элемент HotelPydanticSchema(title='title_string_1', location='location_string_1', id=16).
             # Тип возвращаемого элемента преобразован к схеме Pydantic: self.schema
+            if use_cache:
+                entity_cache.set(key, result_pydantic_schema)
             return result_pydantic_schema
         return None
 
+    def invalidate_cache(self, object_ids) -> None:
+        """
+        Метод класса. Удаляет из кэша сущностей записи с указанными
+        идентификаторами и запоминает их в session.info, чтобы удалить
+        ещё раз после подтверждения транзакции (DBManager.commit).
+
+        :param object_ids: Идентификаторы изменённых (добавленных, удалённых) записей.
+
+        :return: Ничего не возвращает.
+        """
+        if not self.cacheable:
+            return
+        keys = {(self.model.__tablename__, object_id) for object_id in object_ids}
+        entity_cache.invalidate(keys)
+        self.session.info.setdefault(CACHE_KEYS_INFO, set()).update(keys)
+
     async def get_one_or_none(self,
                               query=None,
                               pydantic_schema=None,
@@ -1,12 +1,23 @@
 from fastapi import HTTPException
 from pydantic import BaseModel
-from sqlalchemy import select
+from sqlalchemy import select, func as sa_func, literal
+
+from sqlalchemy import insert as sa_insert  # Для реализации SQL команды INSERT
 
 # from src.api.dependencies.dependencies import DBDep
 from src.models.bookings import BookingsORM
+from src.models.rooms import RoomsORM
+from src.database import pin_primary
 from src.repositories.base import BaseRepository
+from src.repositories.utils import check_dates_order, rooms_ids_free_query
+
+from src.schemas.bookings import BookingsPydanticSchema, BookingsInfoRecURL
 
-from src.schemas.bookings import BookingsPydanticSchema
+# Первый ключ для двухключевой рекомендательной блокировки
+# pg_advisory_xact_lock(key1, key2): key1 - "пространство" блокировок
+# бронирования, key2 - идентификатор номера. Так блокировки бронирования
+# не пересекаются с другими рекомендательными блокировками в базе.
+BOOKING_LOCK_NAMESPACE = 1_001
 
 # from src.database import engine
 
@@ -33,6 +44,8 @@ class BookingsRepository(BaseRepository):
     #
     # - get_all. Выбирает все забронированные номера.
     #       Использует родительский метод get_rows.
+    # - add_checked. Добавляет бронирование, если на указанные даты
+    #       имеется свободный номер.
 
     # async def get_all(self, db: DBDep, user_id: int | None = None):
     async def get_all(self, user: BaseModel | None = None):
@@ -85,3 +98,98 @@ class BookingsRepository(BaseRepository):
                                         })
         status = (status, f"Всего выводится {len(result)} элемент(-а/-ов).")
         return {"status": status, "rooms": result}
+
+    async def add_checked(self,
+                          booking_data: BookingsInfoRecURL,
+                          user_id: int):
+        """
+        Метод класса. Добавляет бронирование номера, если на все ночи
+        периода [date_from, date_to) имеется свободный номер. Цена берётся
+        из таблицы номеров в том же запросе.
+
+        Чтобы два одновременных запроса не забронировали последний
+        свободный номер дважды, бронирования одного номера выполняются
+        по очереди: сначала берётся рекомендательная блокировка
+        pg_advisory_xact_lock по идентификатору номера (до конца
+        транзакции), затем выполняется один запрос, который проверяет
+        наличие свободного номера и добавляет бронь:
+            INSERT INTO bookings (...)
+            SELECT ... FROM rooms WHERE rooms.id = ... AND rooms.id IN (<свободные номера>)
+            RETURNING ...
+        Блокировка затрагивает только указанный номер, бронирования других
+        номеров не ждут.
+
+        :param booking_data: Данные о бронировании (номер и даты).
+        :param user_id: Идентификатор пользователя.
+
+        :return: Возвращает добавленное бронирование (схема self.schema).
+            Если дата выезда не позже даты заезда, то поднимается исключение
+            HTTPException с кодом 422, если номер отсутствует - с кодом 404,
+            если свободных номеров на эти даты нет - с кодом 409.
+        """
+        room_id = booking_data.room_id
+        date_from = booking_data.date_from
+        date_to = booking_data.date_to
+
+        # Если date_from >= date_to, то поднимается исключение с кодом 422
+        check_dates_order(date_from, date_to)
+
+        # Блокировка, проверка и добавление брони выполняются в одной
+        # транзакции в основной базе данных (не в реплике)
+        pin_primary(self.session)
+        # Блокировка снимается автоматически при commit/rollback транзакции
+        await self.session.execute(select(sa_func.pg_advisory_xact_lock(BOOKING_LOCK_NAMESPACE,
+                                                                        room_id)))
+
+        free_room = (select(RoomsORM.id,
+                            literal(user_id),
+                            literal(date_from),
+                            literal(date_to),
+                            RoomsORM.price)
+                     .filter(RoomsORM.id == room_id,
+                             RoomsORM.id.in_(rooms_ids_free_query(date_from=date_from,
+                                                                  date_to=date_to,
+                                                                  room_id=room_id)))
+                     )
+        add_stmt = (sa_insert(self.model)
+                    .from_select(["room_id", "user_id", "date_from", "date_to", "price"],
+                                 free_room)
+                    .returning(self.model)
+                    )
+        # Запрос такой (для settings.AVAILABILITY_ENGINE = "inventory"):
+        # INSERT INTO bookings (room_id, user_id, date_from, date_to, price)
+        # SELECT rooms.id, 4, '2025-01-20', '2025-01-23', rooms.price
+        # FROM rooms
+        # WHERE rooms.id = 12 AND
+        #       rooms.id IN (SELECT rooms.id AS room_id
+        #                    FROM rooms
+        #                    WHERE rooms.quantity > 0 AND
+        #                          NOT (EXISTS (SELECT * FROM room_inventory
+        #                                       WHERE room_inventory.room_id = rooms.id AND
+        #                                             room_inventory.night >= '2025-01-20' AND
+        #                                             room_inventory.night < '2025-01-23' AND
+        #                                             room_inventory.booked >= rooms.quantity)) AND
+        #                          rooms.id = 12)
+        # RETURNING bookings.id, bookings.room_id, ...
+
+        result = await self.session.execute(add_stmt)
+        model = result.scalars().one_or_none()
+
+        if model is None:
+            # Бронь не добавлена: либо нет такого номера, либо он занят.
+            # Этот запрос выполняется только при неудачной попытке.
+            if await self.session.get(RoomsORM, room_id) is None:
+                # status_code=404: Сервер понял запрос, но не нашёл
+                #                  соответствующего ресурса по указанному URL
+                raise HTTPException(status_code=404,
+                                    detail={"description": "Нет номера с идентификатором "
+                                                           f"{room_id}",
+                                            })
+            # status_code=409: Запрос конфликтует с текущим состоянием ресурса
+            raise HTTPException(status_code=409,
+                                detail={"description": "Нет свободных номеров с идентификатором "
+                                                       f"{room_id} на даты с {date_from} "
+                                                       f"по {date_to}",
+                                        })
+
+        return self.schema.model_validate(model)
@@ -2,6 +2,8 @@ from fastapi import HTTPException
 
 from pydantic import BaseModel
 from sqlalchemy import func as sa_func
+from sqlalchemy import bindparam as sa_bindparam, exists as sa_exists, Integer
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 
 from sqlalchemy import select as sa_select  # Для реализации SQL команды SELECT
 from sqlalchemy import delete as sa_delete  # Для реализации SQL команды DELETE
@@ -38,6 +40,7 @@ from src.schemas.facilities import FacilityPydanticSchema, RoomsFacilityPydantic
 class FacilitiesRepository(BaseRepository):
     model = FacilitiesORM
     schema = FacilityPydanticSchema
+    cacheable = True
 
     async def get_limit(self,
                         *filter,
@@ -46,6 +49,7 @@ class FacilitiesRepository(BaseRepository):
                         per_page: int | None = None,
                         page: int | None = None,
                         show_all: bool | None = None,
+                        after_id: int | None = None,
                         **filter_by,
                         ):
         """
@@ -64,6 +68,9 @@ class FacilitiesRepository(BaseRepository):
         :param show_all: Выбирать сразу (True) все записи, соответствующие
                 запросу, или выполнить ограниченную выборку (False или None).
                 Может отсутствовать.
+        :param after_id: Идентификатор последней записи предыдущей страницы
+                для вывода по ключу (из курсора next_cursor). Если указан,
+                то параметр page не используется. Может отсутствовать.
         :param filter_by: Фильтры для запроса - конструкция .filter_by(**filter_by).
         :return: Возвращает список:
             [HotelPydanticSchema(title='title_string_1', location='location_string_1', id=16),
@@ -79,14 +86,17 @@ class FacilitiesRepository(BaseRepository):
         if query is None:
             query = sa_select(self.model)
 
+        # ILIKE по самому столбцу, чтобы использовался триграммный индекс
+        # (см. комментарий в HotelsRepository.get_limit)
         if title:
-            query = query.filter(sa_func.lower(self.model.title)
-                                 .contains(title.strip().lower()))
+            query = query.filter(self.model.title
+                                 .icontains(title.strip(), autoescape=True))
         result = await super().get_rows(*filter,
                                         query=query,
                                         per_page=per_page,
                                         page=page,
                                         show_all=show_all,
+                                        after_id=after_id,
                                         **filter_by
                                         )
         # Возвращает пустой список: [] или список:
@@ -102,42 +112,97 @@ class FacilitiesRepository(BaseRepository):
                                         })
         if show_all:
             status = "Полный список удобств в номерах."
+        elif after_id is not None:
+            status = (f'Страница после записи с идентификатором {after_id}, '
+                      f'установлено отображение {per_page} элемент(-а/-ов) на странице.')
         else:
             status = (f'Страница {page}, установлено отображение '
                       f'{per_page} элемент(-а/-ов) на странице.')
 
         status = (status,
                   f"Всего выводится {len(result)} элемент(-а/-ов) на странице.")
-        return {"status": status, "facilities": result}
+        return {"status": status,
+                "facilities": self.dump_json(result),
+                "next_cursor": self.get_next_cursor(result, per_page=per_page, show_all=show_all),
+                }
 
 
 class RoomsFacilitiesRepository(BaseRepository):
     model = RoomsFacilitiesORM
     schema = RoomsFacilityPydanticSchema
 
+    # Сделаны методы:
+    #
+    # - set_facilities_in_rooms_values. Устанавливает список удобств номера
+    #       одним запросом (удаление лишних связей и добавление новых).
+    # - set_facilities_in_rooms_values_bulk. То же для нескольких номеров
+    #       одним запросом.
+
     async def set_facilities_in_rooms_values(self,
                                              room_id: int,
                                              facilities_ids: list[int]):
-        get_facilities_ids_query = (sa_select(self.model.facility_id)
-                                    .filter_by(room_id=room_id)
-                                    )
-        result = await self.session.execute(get_facilities_ids_query)
-        current_facilities_ids = result.scalars().all()
-        items_to_delete = list(set(current_facilities_ids) - set(facilities_ids))
-        items_to_insert = list(set(facilities_ids) - set(current_facilities_ids))
-
-        if items_to_delete:
-            delete_facilities_from_room_stmt = (sa_delete(self.model)
-                                                .filter(self.model.room_id == room_id,
-                                                        self.model.facility_id.in_(items_to_delete),
-                                                        )
-                                                )
-            await self.session.execute(delete_facilities_from_room_stmt)
-
-        if items_to_insert:
-            insert_facilities_in_room_stmt = (sa_insert(self.model)
-                                              .values([{"room_id": room_id, "facility_id": f_id}
-                                                       for f_id in items_to_insert]
-                                                      )
-                                              )
-            await self.session.execute(insert_facilities_in_room_stmt)
+        """
+        Метод класса. Устанавливает для номера room_id список удобств
+        facilities_ids: удаляет связи с удобствами, которых нет в списке,
+        и добавляет отсутствующие связи. Выполняется один запрос: DELETE
+        в подзапросе WITH и INSERT ... ON CONFLICT DO NOTHING (уже
+        существующие связи пропускаются по уникальному ограничению
+        (room_id, facility_id)).
+
+        :param room_id: Идентификатор номера.
+        :param facilities_ids: Список идентификаторов удобств. Пустой список
+            удаляет все удобства номера.
+        :return: None
+        """
+        await self.set_facilities_in_rooms_values_bulk({room_id: facilities_ids})
+
+    async def set_facilities_in_rooms_values_bulk(self,
+                                                  rooms_facilities: dict[int, list[int]]):
+        """
+        Метод класса. Устанавливает списки удобств для нескольких номеров
+        одним запросом.
+
+        :param rooms_facilities: Словарь {идентификатор номера: список
+            идентификаторов удобств}. Для номера с пустым списком удаляются
+            все удобства.
+        :return: None
+        """
+        if not rooms_facilities:
+            return
+        # Пары (номер, удобство) передаются двумя массивами одинаковой длины
+        # и разворачиваются в строки функцией unnest.
+        pairs = [(room_id, facility_id)
+                 for room_id, facilities_ids in rooms_facilities.items()
+                 for facility_id in facilities_ids]
+        rooms_ids = sa_bindparam("rooms_ids", list(rooms_facilities), type_=ARRAY(Integer))
+        pairs_rows = (sa_func.unnest(sa_bindparam("pairs_rooms_ids", [pair[0] for pair in pairs],
+                                                  type_=ARRAY(Integer)),
+                                     sa_bindparam("pairs_facilities_ids", [pair[1] for pair in pairs],
+                                                  type_=ARRAY(Integer)))
+                      .table_valued("room_id", "facility_id")
+                      .render_derived(name="pairs"))
+
+        delete_cte = (sa_delete(self.model)
+                      .filter(self.model.room_id == sa_func.any(rooms_ids),
+                              ~sa_exists()
+                              .where(pairs_rows.c.room_id == self.model.room_id,
+                                     pairs_rows.c.facility_id == self.model.facility_id))
+                      .cte("deleted_facilities"))
+        set_facilities_stmt = (pg_insert(self.model)
+                               .from_select(["room_id", "facility_id"],
+                                            sa_select(pairs_rows.c.room_id, pairs_rows.c.facility_id))
+                               .on_conflict_do_nothing(index_elements=["room_id", "facility_id"])
+                               .add_cte(delete_cte))
+        # print(set_facilities_stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+        # Вывод: WITH deleted_facilities AS
+        #        (DELETE FROM rooms_facilities
+        #         WHERE rooms_facilities.room_id = any(ARRAY[5])
+        #           AND NOT (EXISTS (SELECT *
+        #                            FROM unnest(ARRAY[5, 5], ARRAY[1, 3]) AS pairs(room_id, facility_id)
+        #                            WHERE pairs.room_id = rooms_facilities.room_id
+        #                              AND pairs.facility_id = rooms_facilities.facility_id)))
+        #        INSERT INTO rooms_facilities (room_id, facility_id)
+        #        SELECT pairs.room_id, pairs.facility_id
+        #        FROM unnest(ARRAY[5, 5], ARRAY[1, 3]) AS pairs(room_id, facility_id)
+        #        ON CONFLICT (room_id, facility_id) DO NOTHING
+        await self.session.execute(set_facilities_stmt)
@@ -5,6 +5,10 @@ from fastapi import HTTPException
 from pydantic import BaseModel
 
 from sqlalchemy import func as sa_func
+from sqlalchemy import cast as sa_cast
+from sqlalchemy import literal_column as sa_literal_column
+from sqlalchemy import Text as sa_Text
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 
 from sqlalchemy import select as sa_select  # Для реализации SQL команды SELECT
 from sqlalchemy import delete as sa_delete  # Для реализации SQL команды DELETE
@@ -20,10 +24,11 @@ from sqlalchemy import Insert as sa_Insert  # Тип функции sa_insert
 from sqlalchemy.exc import MultipleResultsFound
 
 from src.repositories.base import BaseRepository
-from src.repositories.utils import rooms_ids_for_booking_query
+from src.repositories.utils import rooms_ids_free_query, search_match, search_rank, partial_schema
 
 from src.models.rooms import RoomsORM
 from src.models.hotels import HotelsORM
+from src.models.facilities import FacilitiesORM, RoomsFacilitiesORM
 
 from src.schemas.hotels import HotelPydanticSchema
 
@@ -47,6 +52,7 @@ from src.schemas.hotels import HotelPydanticSchema
 class HotelsRepository(BaseRepository):
     model = HotelsORM
     schema = HotelPydanticSchema
+    cacheable = True
 
     # Сделаны методы:
     #
@@ -59,6 +65,9 @@ class HotelsRepository(BaseRepository):
     #       выборки строк, в зависимости от переданного метода sa_select, sa_delete
     # - get_limit. Выбирает заданное количество строк с заданным смещением.
     #       Использует родительский метод get_rows.
+    # - search. Полнотекстовый поиск отелей по наименованию и адресу,
+    #       результаты упорядочены по релевантности (ts_rank).
+    #       Использует родительский метод get_ranked_rows.
     # - get_one_or_none_my_err. Возвращает одну строку или None. Если получено
     #       более одной строки, то поднимается исключение MultipleResultsFound.
     #       Использует родительский метод get_rows.
@@ -69,6 +78,9 @@ class HotelsRepository(BaseRepository):
     # - get_by_id. Выбирает по идентификатору (поле self.model.id) один объект
     #       в базе, используя метод get.
     #       Служит обёрткой для родительского метода get_by_id.
+    # - get_full. Выбирает отель вместе со всеми его номерами и удобствами
+    #       номеров одним запросом. Документ JSON собирается в PostgreSQL
+    #       (json_build_object, json_agg) и возвращается строкой.
 
     async def get_all(self):
         """
@@ -83,7 +95,8 @@ class HotelsRepository(BaseRepository):
 
         Если элементы отсутствуют, возбуждается исключение HTTPException с кодом 404.
         """
-        result = await super().get_rows(show_all=True)
+        # Полный список без сущностей ORM (выбираются только столбцы схемы)
+        result = await super().get_rows(show_all=True, core=True)
         # Возвращает пустой список: [] или список:
         # [HotelPydanticSchema(title='title_string_1', location='location_string_1', id=16),
         #  HotelPydanticSchema(title='title_string_2', location='location_string_2', id=17),
@@ -113,8 +126,15 @@ class HotelsRepository(BaseRepository):
         :return: Возвращает SQL-запрос для выборки отелей, имеющих свободные номера.
         """
 
-        rooms_ids_to_get = rooms_ids_for_booking_query(date_from=date_from,
-                                                       date_to=date_to)
+        # Свободные номера выбираются способом, заданным в настройках
+        # (settings.AVAILABILITY_ENGINE): по таблице room_inventory (занятость
+        # по ночам, поддерживается триггерами на таблице bookings) или по
+        # пиковой занятости, посчитанной по таблице bookings - см. функцию
+        # rooms_ids_free_query в src/repositories/utils.py.
+        # Запрос с CTE по всей таблице bookings, описанный в комментариях ниже,
+        # формирует прежняя функция rooms_ids_for_booking_query.
+        rooms_ids_to_get = rooms_ids_free_query(date_from=date_from,
+                                                 date_to=date_to)
         # print(hotels_ids_to_get.compile(compile_kwargs={"literal_binds": True}))
         # Запрос такой (выбирает room_id для свободных номеров,
         # таблица состоит из одного столбца room_id):
@@ -377,9 +397,11 @@ class HotelsRepository(BaseRepository):
                         per_page: int | None = None,
                         page: int | None = None,
                         show_all: bool | None = None,
+                        after_id: int | None = None,
                         hotels_with_free_rooms: bool | None = None,
                         date_from: date | None = None,
                         date_to: date | None = None,
+                        fields: tuple[str, ...] | None = None,
                         **filter_by,
                         ):
         """
@@ -399,6 +421,9 @@ class HotelsRepository(BaseRepository):
         :param show_all: Выбирать сразу (True) все записи, соответствующие
                 запросу, или выполнить ограниченную выборку (False или None).
                 Может отсутствовать.
+        :param after_id: Идентификатор последней записи предыдущей страницы
+                для вывода по ключу (из курсора next_cursor). Если указан,
+                то параметр page не используется. Может отсутствовать.
         :param hotels_with_free_rooms: Выбирать отели со свободными номерами
                 в указанные даты (True) или выбирать полный список отелей,
                 не учитывая указанные даты (False или None).
@@ -407,6 +432,10 @@ class HotelsRepository(BaseRepository):
             Используется, если параметр hotels_with_free_rooms=True.
         :param date_to: Дата, ДО которой бронируется номер.
             Используется, если параметр hotels_with_free_rooms=True.
+        :param fields: Кортеж выводимых полей схемы self.schema (параметр
+                fields= запроса), например ("title", "id"). Из базы данных
+                выбираются только соответствующие столбцы, записи
+                преобразуются к схеме с этими полями. Может отсутствовать.
         :param filter_by: Фильтры для запроса - конструкция .filter_by(**filter_by).
         :return: Возвращает список:
             [HotelPydanticSchema(title='title_string_1', location='location_string_1', id=16),
@@ -435,17 +464,28 @@ class HotelsRepository(BaseRepository):
                                     detail={"description": "Не заданы даты для выбора "
                                                            "отелей со свободными номерами",
                                             })
+        # Поиск подстроки без учёта регистра: hotels.title ILIKE '%' || :title || '%'.
+        # Условие вида lower(hotels.title) LIKE '%...%' не может использовать
+        # триграммный индекс по столбцу (индекс построен по hotels.title, а не по
+        # lower(hotels.title)), а ILIKE по самому столбцу - может (см. миграцию
+        # 009 Add trigram indexes). autoescape=True экранирует символы % и _
+        # в строке поиска.
         if title:
-            query = query.filter(sa_func.lower(self.model.title)
-                                 .contains(title.strip().lower()))
+            query = query.filter(self.model.title
+                                 .icontains(title.strip(), autoescape=True))
         if location:
-            query = query.filter(sa_func.lower(self.model.location)
-                                 .contains(location.strip().lower()))
+            query = query.filter(self.model.location
+                                 .icontains(location.strip(), autoescape=True))
+        # Выборочный вывод полей: только столбцы из fields (get_rows core=True)
+        pydantic_schema = partial_schema(self.schema, fields) if fields else self.schema
         result = await super().get_rows(*filter,
                                         query=query,
+                                        pydantic_schema=pydantic_schema,
                                         per_page=per_page,
                                         page=page,
                                         show_all=show_all,
+                                        after_id=after_id,
+                                        core=bool(fields),
                                         **filter_by
                                         )
         # Возвращает пустой список: [] или список:
@@ -461,13 +501,101 @@ class HotelsRepository(BaseRepository):
                                         })
         if show_all:
             status = "Полный список отелей."
+        elif after_id is not None:
+            status = (f'Страница после записи с идентификатором {after_id}, '
+                      f'установлено отображение {per_page} элемент(-а/-ов) на странице.')
         else:
             status = (f'Страница {page}, установлено отображение '
                       f'{per_page} элемент(-а/-ов) на странице.')
 
         status = (status,
                   f"Всего выводится {len(result)} элемент(-а/-ов) на странице.")
-        return {"status": status, "hotels": result}
+        return {"status": status,
+                "hotels": self.dump_json(result, pydantic_schema),
+                "next_cursor": self.get_next_cursor(result, per_page=per_page, show_all=show_all),
+                }
+
+    async def search(self,
+                     q: str,
+                     per_page: int | None = None,
+                     after: dict | None = None,
+                     hotels_with_free_rooms: bool | None = None,
+                     date_from: date | None = None,
+                     date_to: date | None = None,
+                     fields: tuple[str, ...] | None = None,
+                     ):
+        """
+        Метод класса. Полнотекстовый поиск отелей по наименованию и адресу
+        (столбец search_vector). Результаты упорядочены по убыванию
+        релевантности, следующая страница выбирается по курсору next_cursor.
+        Использует родительский метод get_ranked_rows.
+
+        :param q: Строка поиска (синтаксис websearch_to_tsquery: слова через
+            пробел, "фраза в кавычках", or, -слово).
+        :param per_page: Количество элементов на странице.
+        :param after: Ключ последней записи предыдущей страницы (из курсора).
+            Может отсутствовать.
+        :param hotels_with_free_rooms: Выбирать отели со свободными номерами
+                в указанные даты (True) или выбирать полный список отелей,
+                не учитывая указанные даты (False или None).
+                Может отсутствовать.
+        :param date_from: Дата, С которой бронируется номер.
+            Используется, если параметр hotels_with_free_rooms=True.
+        :param date_to: Дата, ДО которой бронируется номер.
+            Используется, если параметр hotels_with_free_rooms=True.
+        :param fields: Кортеж выводимых полей схемы self.schema (параметр
+                fields= запроса), например ("title", "id"). Из базы данных
+                выбираются только соответствующие столбцы, записи
+                преобразуются к схеме с этими полями. Может отсутствовать.
+
+        :return: Возвращает словарь со статусом, списком отелей и курсором
+            следующей страницы. Если отели не найдены, то поднимается
+            исключение HTTPException с кодом 404.
+        """
+        query = sa_select(self.model).filter(search_match(self.model.search_vector, q))
+        # SELECT hotels.id, hotels.title, hotels.location,
+        #        ts_rank(hotels.search_vector, websearch_to_tsquery('russian', 'сочи море')) AS rank
+        # FROM hotels
+        # WHERE hotels.search_vector @@ websearch_to_tsquery('russian', 'сочи море')
+        # ORDER BY rank DESC, hotels.id
+        # LIMIT 3
+
+        if hotels_with_free_rooms:
+            # Выбирать отели со свободными номерами в указанные даты (True)
+            if date_from and date_to:
+                query = query.filter(await self.get_filtered_by_time(date_from=date_from,
+                                                                     date_to=date_to))
+            else:
+                # status_code=422: Запрос сформирован правильно, но его невозможно
+                #                  выполнить из-за семантических ошибок
+                #                  Unprocessable Content (WebDAV)
+                raise HTTPException(status_code=422,
+                                    detail={"description": "Не заданы даты для выбора "
+                                                           "отелей со свободными номерами",
+                                            })
+
+        pydantic_schema = partial_schema(self.schema, fields) if fields else self.schema
+        result, next_cursor = await super().get_ranked_rows(
+            query=query,
+            rank=search_rank(self.model.search_vector, q),
+            pydantic_schema=pydantic_schema,
+            per_page=per_page,
+            after=after,
+            core=bool(fields),
+        )
+        if len(result) == 0:
+            # status_code=404: Сервер понял запрос, но не нашёл
+            #                  соответствующего ресурса по указанному URL
+            raise HTTPException(status_code=404,
+                                detail={"description": "Данные отсутствуют.",
+                                        })
+        status = (f'Результаты поиска по запросу "{q}" по убыванию релевантности, '
+                  f'установлено отображение {per_page} элемент(-а/-ов) на странице.',
+                  f"Всего выводится {len(result)} элемент(-а/-ов) на странице.")
+        return {"status": status,
+                "hotels": self.dump_json(result, pydantic_schema),
+                "next_cursor": next_cursor,
+                }
 
     async def get_one_or_none_my_err(self,
                                      query=None,
@@ -501,11 +629,11 @@ class HotelsRepository(BaseRepository):
             query = sa_select(self.model)
 
         if title:
-            query = query.filter(sa_func.lower(self.model.title)
-                                 .contains(title.strip().lower()))
+            query = query.filter(self.model.title
+                                 .icontains(title.strip(), autoescape=True))
         if location:
-            query = query.filter(sa_func.lower(self.model.location)
-                                 .contains(location.strip().lower()))
+            query = query.filter(self.model.location
+                                 .icontains(location.strip(), autoescape=True))
 
         query = query.filter_by(**filtering)
 
@@ -626,13 +754,15 @@ class HotelsRepository(BaseRepository):
                                         })
         return {"deleted hotels": result}
 
-    async def get_by_id(self, hotel_id: int):  # -> None:
+    async def get_by_id(self, hotel_id: int, use_cache: bool = True):  # -> None:
         """
         Метод класса. Выбирает по идентификатору (поле self.model.id) один
         объект в базе, используя метод get. Служит обёрткой для родительского
         метода get_by_id.
 
         :param hotel_id: Идентификатор выбираемого объекта.
+        :param use_cache: Использовать кэш сущностей (True) или выбрать
+            объект из базы данных (False).
 
         :return: Возвращает словарь: {"got hotel": dict},
         где:
@@ -646,7 +776,7 @@ class HotelsRepository(BaseRepository):
         """
 
         # result = await self.session.get(self.model, hotel_id)
-        result = await super().get_by_id(hotel_id)
+        result = await super().get_by_id(hotel_id, use_cache=use_cache)
         # result: None или <src.models.hotels.HotelsORM object at 0x0000023FB96EAD90>
         # Возвращает пустой список: [] или объект:
         # HotelPydanticSchema(title='title_string_1', location='location_string_1', id=16)
@@ -659,3 +789,89 @@ class HotelsRepository(BaseRepository):
                                                        f"{hotel_id} ничего не найдено",
                                         })
         return {"got hotel": result}
+
+    async def get_full(self, hotel_id: int) -> str:
+        """
+        Метод класса. Выбирает отель вместе со всеми его номерами и удобствами
+        каждого номера одним SQL-запросом. Документ JSON собирается на стороне
+        PostgreSQL функциями json_build_object и json_agg и возвращается
+        строкой - без создания объектов ORM и без валидации схемами Pydantic.
+
+        :param hotel_id: Идентификатор отеля.
+
+        :return: Возвращает строку JSON вида:
+            {"id": 16, "title": "...", "location": "...",
+             "rooms": [{"id": 5, "hotel_id": 16, "title": "...", "description": "...",
+                        "price": 1000, "quantity": 3,
+                        "facilities": [{"id": 1, "title": "..."}]}]}
+            Номера и удобства упорядочены по идентификатору, если их нет -
+            выводится пустой массив [].
+
+        Если отель, соответствующий hotel_id отсутствует, возбуждается исключение
+        HTTPException с кодом 404.
+        """
+        # Пустой массив для номеров без удобств и отелей без номеров:
+        # json_agg по пустому множеству строк возвращает NULL.
+        empty_json_array = sa_literal_column("'[]'::json")
+
+        # Удобства номера. Подзапрос коррелирован с rooms (внешний подзапрос).
+        facilities_json = (
+            sa_select(sa_func.coalesce(
+                sa_func.json_agg(aggregate_order_by(
+                    sa_func.json_build_object("id", FacilitiesORM.id,
+                                              "title", FacilitiesORM.title),
+                    FacilitiesORM.id)),
+                empty_json_array))
+            .join(RoomsFacilitiesORM, RoomsFacilitiesORM.facility_id == FacilitiesORM.id)
+            .filter(RoomsFacilitiesORM.room_id == RoomsORM.id)
+            .scalar_subquery()
+        )
+        # Номера отеля. Подзапрос коррелирован с hotels (основной запрос).
+        rooms_json = (
+            sa_select(sa_func.coalesce(
+                sa_func.json_agg(aggregate_order_by(
+                    sa_func.json_build_object("id", RoomsORM.id,
+                                              "hotel_id", RoomsORM.hotel_id,
+                                              "title", RoomsORM.title,
+                                              "description", RoomsORM.description,
+                                              "price", RoomsORM.price,
+                                              "quantity", RoomsORM.quantity,
+                                              "facilities", facilities_json),
+                    RoomsORM.id)),
+                empty_json_array))
+            .filter(RoomsORM.hotel_id == self.model.id)
+            .scalar_subquery()
+        )
+        # Приведение к TEXT: драйвер возвращает готовую строку, которую
+        # не надо разбирать (json.loads) и снова сериализовать.
+        query = (sa_select(sa_cast(sa_func.json_build_object("id", self.model.id,
+                                                             "title", self.model.title,
+                                                             "location", self.model.location,
+                                                             "rooms", rooms_json),
+                                   sa_Text))
+                 .filter(self.model.id == hotel_id)
+                 )
+        # print(query.compile(compile_kwargs={"literal_binds": True}))
+        # SELECT CAST(json_build_object('id', hotels.id, 'title', hotels.title,
+        #        'location', hotels.location, 'rooms',
+        #        (SELECT coalesce(json_agg(json_build_object('id', rooms.id, ...,
+        #                'facilities', (SELECT coalesce(json_agg(json_build_object(
+        #                                   'id', facilities.id, 'title', facilities.title)
+        #                                   ORDER BY facilities.id), '[]'::json)
+        #                               FROM facilities JOIN rooms_facilities
+        #                                    ON rooms_facilities.facility_id = facilities.id
+        #                               WHERE rooms_facilities.room_id = rooms.id))
+        #                ORDER BY rooms.id), '[]'::json)
+        #         FROM rooms
+        #         WHERE rooms.hotel_id = hotels.id)) AS TEXT) AS json_build_object_1
+        # FROM hotels
+        # WHERE hotels.id = 16
+        result = await self.session.scalar(query)
+        if result is None:
+            # status_code=404: Сервер понял запрос, но не нашёл
+            #                  соответствующего ресурса по указанному URL
+            raise HTTPException(status_code=404,
+                                detail={"description": "Для отеля с идентификатором "
+                                                       f"{hotel_id} ничего не найдено",
+                                        })
+        return result
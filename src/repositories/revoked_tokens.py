@@ -0,0 +1,87 @@
+from datetime import datetime
+
+from sqlalchemy import func as sa_func
+from sqlalchemy import exists as sa_exists
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from sqlalchemy import select as sa_select  # Для реализации SQL команды SELECT
+from sqlalchemy import delete as sa_delete  # Для реализации SQL команды DELETE
+
+from src.database import READ_PRIMARY_INFO
+from src.repositories.base import BaseRepository
+
+from src.models.revoked_tokens import RevokedTokensORM
+from src.schemas.revoked_tokens import RevokedTokenPydanticSchema
+
+
+class RevokedTokensRepository(BaseRepository):
+    model = RevokedTokensORM
+    schema = RevokedTokenPydanticSchema
+
+    # Сделаны методы:
+    #
+    # - revoke. Отзывает токен доступа (добавляет его jti в таблицу).
+    # - is_revoked. Проверяет, отозван ли токен.
+    # - get_revoked_since. Выбирает действующие отозванные токены, отозванные
+    #       не раньше указанного времени.
+    # - delete_expired. Удаляет записи токенов с истекшим сроком действия.
+
+    async def revoke(self, jti: str, exp: datetime) -> None:
+        """
+        Метод класса. Отзывает токен доступа. Повторный отзыв того же токена
+        ничего не изменяет (ON CONFLICT DO NOTHING).
+
+        :param jti: Идентификатор токена (поле jti токена доступа).
+        :param exp: Время истечения срока действия токена (поле exp).
+
+        :return: Ничего не возвращает.
+        """
+        add_stmt = (pg_insert(self.model)
+                    .values(jti=jti, exp=exp)
+                    .on_conflict_do_nothing(index_elements=[self.model.jti])
+                    )
+        await self.session.execute(add_stmt)
+
+    async def is_revoked(self, jti: str) -> bool:
+        """
+        Метод класса. Проверяет, отозван ли токен.
+
+        :param jti: Идентификатор токена (поле jti токена доступа).
+
+        :return: Возвращает True, если токен отозван, иначе False.
+        """
+        query = sa_select(sa_exists().where(self.model.jti == jti))
+        # Запрос в основной базе данных: ответ сохраняется в точном наборе
+        # RevokedTokens (src/utils/revocation.py), а отставшая реплика могла
+        # бы ответить "не отозван" для только что отозванного токена
+        result = await self.session.execute(query, bind_arguments={READ_PRIMARY_INFO: True})
+        return result.scalar()
+
+    async def get_revoked_since(self, since: datetime | None = None) -> list[tuple[str, datetime]]:
+        """
+        Метод класса. Выбирает отозванные токены, срок действия которых ещё
+        не истёк.
+
+        :param since: Выбираются токены, отозванные не раньше этого времени.
+            Если None, то выбираются все действующие отозванные токены.
+
+        :return: Возвращает список кортежей (jti, revoked_at), упорядоченный
+            по времени отзыва.
+        """
+        query = (sa_select(self.model.jti, self.model.revoked_at)
+                 .where(self.model.exp > sa_func.now())
+                 .order_by(self.model.revoked_at)
+                 )
+        if since is not None:
+            query = query.where(self.model.revoked_at >= since)
+        result = await self.session.execute(query)
+        return [tuple(row) for row in result.all()]
+
+    async def delete_expired(self) -> None:
+        """
+        Метод класса. Удаляет записи токенов с истекшим сроком действия.
+
+        :return: Ничего не возвращает.
+        """
+        delete_stmt = sa_delete(self.model).where(self.model.exp <= sa_func.now())
+        await self.session.execute(delete_stmt)
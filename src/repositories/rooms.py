@@ -5,6 +5,8 @@ from fastapi import HTTPException
 from pydantic import BaseModel
 
 from sqlalchemy import func as sa_func, and_
+from sqlalchemy import literal_column as sa_literal_column
+from sqlalchemy.dialects.postgresql import aggregate_order_by, JSON
 
 from sqlalchemy import select as sa_select  # Для реализации SQL команды SELECT
 from sqlalchemy import delete as sa_delete  # Для реализации SQL команды DELETE
@@ -22,10 +24,12 @@ from sqlalchemy.exc import IntegrityError
 
 from src.models.facilities import RoomsFacilitiesORM, FacilitiesORM
 from src.repositories.base import BaseRepository
+from src.database import pin_primary
 
 from src.models.rooms import RoomsORM
 from src.repositories.hotels import HotelsRepository
-from src.repositories.utils import rooms_ids_for_booking_query
+from src.repositories.utils import rooms_ids_free_query, search_match, search_rank, partial_schema
+from src.repositories.utils import is_foreign_key_violation
 from src.schemas.facilities import RoomsFacilityPydanticSchema, FacilityPydanticSchema
 from src.schemas.rooms import RoomPydanticSchema, RoomWithRels
 
@@ -53,6 +57,7 @@ from src.schemas.rooms import RoomPydanticSchema, RoomWithRels
 class RoomsRepository(BaseRepository):
     model = RoomsORM
     schema = RoomPydanticSchema
+    cacheable = True
 
     # Надо сделать обработку URL:
     # 1. Вывести информацию по всем номерам отеля
@@ -64,33 +69,89 @@ class RoomsRepository(BaseRepository):
 
     # Сделаны методы:
     #
+    # - validate_hotel_id. Проверяем, что идентификатор отеля задан.
+    # - hotel_not_found. Формирует исключение 404 "отель отсутствует".
     # - check_hotel_id. Проверяем, существует ли отель с указанным id=hotel_id.
     # - create_stmt_for_selection. Формирует запрос для удаления или для
     #       выборки строк, в зависимости от переданного метода sa_select, sa_delete
     # - get_all. Выбирает все строки для указанного отеля.
     #       Использует родительский метод get_rows.
+    # - stream_rows. Выбирает все номера указанного отеля через серверный
+    #       курсор и отдаёт их пакетами (вместе со списком удобств, если
+    #       указана схема RoomWithRels).
+    #       Служит обёрткой для родительского метода stream_rows.
     # - get_filtered_by_time. Выбирает все свободные номера в указанный
     #       промежуток времени (от date_from до date_to) для указанного отеля.
     #       Использует родительский метод get_rows.
-    # - get_by_id. Выбирает по идентификатору (поле self.model.id) один объект
-    #       в базе, используя метод get.
-    #       Служит обёрткой для родительского метода get_by_id.
+    # - search. Полнотекстовый поиск номеров по наименованию и описанию,
+    #       результаты упорядочены по релевантности (ts_rank).
+    #       Использует родительский метод get_ranked_rows.
+    # - get_by_id. Выбирает по идентификатору (поле self.model.id) один номер
+    #       вместе со списком удобств одним запросом (LEFT JOIN и json_agg).
     # - delete. Удаляет объект или объекты в базе, используя метод delete.
     #       Служит обёрткой для родительского метода delete.
     # - delete_id. Выбирает по идентификатору (по первичному ключу) - поле
     #       self.model.id один объект в базе, используя метод get, удаляет
     #       методом session.delete.
     #       Служит обёрткой для родительского метода delete_id.
-    # - edit_id. Редактирует один объект в базе, выбирая по идентификатору
-    #       (по первичному ключу) - поле self.model.id один объект в базе,
-    #       используя метод get.
-    #       Редактирует один объект в базе, обновление реализовано через обновление
-    #       атрибутов объекта: setattr(updated_object, key, value).
-    #       Служит обёрткой для родительского метода edit_id.
+    # - edit_id. Редактирует один объект в базе по идентификатору (поле
+    #       self.model.id) одним запросом UPDATE ... RETURNING.
+    #       Использует родительский метод edit.
     # - edit. Редактирует один объект в базе, используя метод update.
     #       Служит обёрткой для родительского метода edit.
     # - add. Добавляет один объект в базе, используя метод insert.
     #       Служит обёрткой для родительского метода add.
+    # - check_bulk_references. Проверяет перед массовым добавлением номеров,
+    #       что все указанные отели и удобства существуют.
+    # - raise_missing_references. Вызывается при ошибке внешнего ключа в COPY
+    #       (add_copy): повторяет проверку check_bulk_references.
+    # Методы add, edit и edit_id не проверяют отель отдельным запросом:
+    # отсутствие отеля определяется по ошибке внешнего ключа rooms.hotel_id.
+
+    def validate_hotel_id(self, hotel_id: int | None):  # -> None:
+        """
+        Метод класса. Проверяем, что идентификатор отеля задан (без обращения
+        к базе данных).
+
+        :param hotel_id: Идентификатор отеля.
+
+        :return: Ничего не возвращает. Если hotel_id не задан, то поднимается
+            исключение HTTPException с кодом 422.
+        """
+        if hotel_id is None:
+            # status_code=422: Запрос сформирован правильно, но его невозможно
+            #                  выполнить из-за семантических ошибок
+            #                  Unprocessable Content (WebDAV)
+            raise HTTPException(status_code=422,
+                                detail={"description": "Не задан идентификатор отеля",
+                                        })
+
+    def hotel_not_found(self,
+                        hotel_id: int,
+                        room_data: BaseModel | None = None) -> HTTPException:
+        """
+        Метод класса. Формирует исключение "отель отсутствует" - одинаковое
+        для проверки check_hotel_id и для ошибки внешнего ключа rooms.hotel_id
+        при добавлении и изменении номера.
+
+        :param hotel_id: Идентификатор отсутствующего отеля.
+        :param room_data: Данные о номере (добавляются в описание ошибки).
+
+        :return: Возвращает исключение HTTPException с кодом 404.
+        """
+        detail = {"description": "Отель с идентификатором "
+                                 f"{hotel_id} отсутствует"}
+        if room_data is not None:
+            detail.update({"room_data": room_data.model_dump()})
+
+        # status_code=404: Сервер понял запрос, но не нашёл
+        #                  соответствующего ресурса по указанному URL
+        # raise HTTPException(status_code=404,
+        #                     detail={"description": "Отель с указанным идентификатором "
+        #                                            f"{hotel_id} отсутствует",
+        #                             "room_data": room_data.model_dump()})
+        return HTTPException(status_code=404,
+                             detail=detail)
 
     async def check_hotel_id(self,
                              hotel_id: int,
@@ -98,6 +159,10 @@ class RoomsRepository(BaseRepository):
         """
         Метод класса. Проверяем, существует ли отель с указанным id=hotel_id.
 
+        Используется перед выборками номеров отеля. При добавлении и изменении
+        номеров отдельная проверка не делается - отсутствие отеля определяется
+        по ошибке внешнего ключа rooms.hotel_id (см. методы add, edit, edit_id).
+
         :param room_data: Донные о номере, в которых имеется связь
             с таблицей отелей.
         :param hotel_id: Идентификатор отеля для проверки - имеется
@@ -106,33 +171,15 @@ class RoomsRepository(BaseRepository):
         :return: Ничего не возвращает. В случае, если по hotel_id отсутствует
             запись в таблице отелей, то поднимается исключение HTTPException.
         """
-
-        if hotel_id is None:
-            # status_code=422: Запрос сформирован правильно, но его невозможно
-            #                  выполнить из-за семантических ошибок
-            #                  Unprocessable Content (WebDAV)
-            raise HTTPException(status_code=422,
-                                detail={"description": "Не задан идентификатор отеля",
-                                        })
+        self.validate_hotel_id(hotel_id)
 
         # Смотрим по id=hotel_id в модели HotelsRepository.model наличие записи.
-        # Возвращает запись или None.
-        result = await self.session.get(HotelsRepository.model, hotel_id)
+        # Возвращает запись или None. Отель берётся из кэша сущностей, если он там есть.
+        # result = await self.session.get(HotelsRepository.model, hotel_id)
+        result = await HotelsRepository(self.session).fetch_by_id(hotel_id)
 
         if result is None:
-            detail = {"description": "Отель с идентификатором "
-                                     f"{hotel_id} отсутствует"}
-            if room_data is not None:
-                detail.update({"room_data": room_data.model_dump()})
-
-            # status_code=404: Сервер понял запрос, но не нашёл
-            #                  соответствующего ресурса по указанному URL
-            # raise HTTPException(status_code=404,
-            #                     detail={"description": "Отель с указанным идентификатором "
-            #                                            f"{hotel_id} отсутствует",
-            #                             "room_data": room_data.model_dump()})
-            raise HTTPException(status_code=404,
-                                detail=detail)
+            raise self.hotel_not_found(hotel_id, room_data)
 
     sql_func_type = Callable[[Union[sa_select, sa_delete, sa_update, sa_insert]
                               ],
@@ -227,8 +274,7 @@ class RoomsRepository(BaseRepository):
                 rooms_stmt = (rooms_stmt
                               .where(self.model.description.like(starts_with + search_string + "%"))
                               )
-                print("111111111111111")
-                print(rooms_stmt.compile(compile_kwargs={"literal_binds": True}))
+                # print(rooms_stmt.compile(compile_kwargs={"literal_binds": True}))
 
                 # Параметр sql_func: sa_select
                 # rooms_stmt: SELECT hotels.id, hotels.title, hotels.location
@@ -242,8 +288,7 @@ class RoomsRepository(BaseRepository):
                 rooms_stmt = (rooms_stmt
                               .where(self.model.description.ilike(starts_with + search_string + "%"))
                               )
-                print("2222222222222222")
-                print(rooms_stmt.compile(compile_kwargs={"literal_binds": True}))
+                # print(rooms_stmt.compile(compile_kwargs={"literal_binds": True}))
                 # Параметр sql_func: sa_select
                 # rooms_stmt: SELECT hotels.id, hotels.title, hotels.location
                 #              FROM hotels
@@ -262,8 +307,7 @@ class RoomsRepository(BaseRepository):
                 rooms_stmt = (rooms_stmt
                               .where(self.model.title.like(starts_with + search_string + "%"))
                               )
-                print("333333333333333")
-                print(rooms_stmt.compile(compile_kwargs={"literal_binds": True}))
+                # print(rooms_stmt.compile(compile_kwargs={"literal_binds": True}))
                 # SELECT hotels.id, hotels.title, hotels.location
                 # FROM hotels
                 # WHERE hotels.title LIKE :title_1
@@ -275,8 +319,7 @@ class RoomsRepository(BaseRepository):
                 rooms_stmt = (rooms_stmt
                               .where(self.model.title.ilike(starts_with + search_string + "%"))
                               )
-                print("44444444444444")
-                print(rooms_stmt.compile(compile_kwargs={"literal_binds": True}))
+                # print(rooms_stmt.compile(compile_kwargs={"literal_binds": True}))
                 # SELECT hotels.id, hotels.title, hotels.location
                 # FROM hotels
                 # WHERE lower(hotels.title) LIKE lower(:title_1)
@@ -287,13 +330,54 @@ class RoomsRepository(BaseRepository):
 
         if order_by:
             rooms_stmt = rooms_stmt.order_by(self.model.id)
-            print("555555555555555")
-            print(rooms_stmt.compile(compile_kwargs={"literal_binds": True}))
+            # print(rooms_stmt.compile(compile_kwargs={"literal_binds": True}))
 
-        print("Итоговый запрос:\n", rooms_stmt.compile(compile_kwargs={"literal_binds": True}))
+        # Итоговый запрос не выводится через print: компиляция запроса с literal_binds
+        # и синхронный вывод в консоль выполнялись бы на каждом запросе. Текст запроса,
+        # параметры и время выполнения можно получить в журнале (логгер src.sql),
+        # см. src/utils/sql_debug.py.
+        # print("Итоговый запрос:\n", rooms_stmt.compile(compile_kwargs={"literal_binds": True}))
 
         return rooms_stmt
 
+    async def stream_rows(self, *filter,
+                          hotel_id: int | None = None,
+                          pydantic_schema=None,
+                          **filter_by):
+        """
+        Метод класса. Выбирает все номера (для указанного отеля) через
+        серверный курсор и отдаёт их пакетами.
+        Использует родительский метод stream_rows.
+
+        Существование отеля не проверяется: к моменту чтения потока ответ
+        уже начал передаваться клиенту, поэтому проверку (check_hotel_id)
+        надо выполнить до формирования потокового ответа.
+
+        :param filter: Фильтры для запроса - конструкция .filter(*filter).
+        :param hotel_id: Идентификатор отеля. Может отсутствовать.
+        :param pydantic_schema: Схема pydantic, к которой преобразовываются
+                полученные значения. Если указана схема RoomWithRels, то
+                удобства номеров выбираются через selectinload - отдельным
+                запросом на каждый пакет номеров.
+        :param filter_by: Фильтры для запроса - конструкция .filter_by(**filter_by).
+
+        :return: Асинхронный генератор, который возвращает списки номеров.
+        """
+        if pydantic_schema is None:
+            pydantic_schema = self.schema
+
+        query = sa_select(self.model).filter(*filter).filter_by(**filter_by)
+        if hotel_id is not None:
+            query = query.filter_by(hotel_id=hotel_id)
+        if pydantic_schema is RoomWithRels:
+            # joinedload для коллекций с yield_per не работает,
+            # а selectinload догружает удобства для каждого пакета.
+            query = query.options(selectinload(self.model.facilities))
+
+        async for batch in super().stream_rows(query=query,
+                                               pydantic_schema=pydantic_schema):
+            yield batch
+
     async def get_filtered_by_time(self,
                                    hotel_id: int,
                                    date_from: date,
@@ -355,9 +439,16 @@ class RoomsRepository(BaseRepository):
         #                                    FROM (SELECT rooms.id AS id
         #                                          FROM rooms
         #                                          WHERE rooms.hotel_id = 176) AS rooms_ids_for_hotel)
-        rooms_ids_to_get = rooms_ids_for_booking_query(date_from=date_from,
-                                                       date_to=date_to,
-                                                       hotel_id=hotel_id)
+        # Свободные номера выбираются способом, заданным в настройках
+        # (settings.AVAILABILITY_ENGINE): по таблице room_inventory (занятость
+        # по ночам, поддерживается триггерами на таблице bookings) или по
+        # пиковой занятости, посчитанной по таблице bookings - см. функцию
+        # rooms_ids_free_query в src/repositories/utils.py.
+        # Запрос с CTE по всей таблице bookings, описанный в комментариях ниже,
+        # формирует прежняя функция rooms_ids_for_booking_query.
+        rooms_ids_to_get = rooms_ids_free_query(date_from=date_from,
+                                                 date_to=date_to,
+                                                 hotel_id=hotel_id)
         # print(rooms_ids_to_get.compile(bind=engine, compile_kwargs={"literal_binds": True}))
         # Итоговый запрос:
         # WITH rooms_count AS (
@@ -419,8 +510,10 @@ class RoomsRepository(BaseRepository):
 
         # query = sa_select(self.model).filter_by(hotel_id=hotel_id)
         query = (sa_select(self.model).filter_by(hotel_id=hotel_id))
+        # Полный список без сущностей ORM (выбираются только столбцы схемы)
         result = await super().get_rows(query=query,
-                                        show_all=True)
+                                        show_all=True,
+                                        core=True)
         # Возвращает пустой список: [] или список:
         # [RoomPydanticSchema(hotel_id=16, title='title_string_1',
         #                     description='description_string_1', price=2, quantity=3, id=3),
@@ -458,9 +551,11 @@ class RoomsRepository(BaseRepository):
                         per_page: int | None = None,
                         page: int | None = None,
                         show_all: bool | None = None,
+                        after_id: int | None = None,
                         free_rooms: bool | None = None,
                         date_from: date | None = None,
                         date_to: date | None = None,
+                        fields: tuple[str, ...] | None = None,
                         **filter_by,
                         ):
         """
@@ -487,12 +582,21 @@ class RoomsRepository(BaseRepository):
         :param show_all: Выбирать сразу (True) все записи, соответствующие
                 запросу, или выполнить ограниченную выборку (False или None).
                 Может отсутствовать.
+        :param after_id: Идентификатор последней записи предыдущей страницы
+                для вывода по ключу (из курсора next_cursor). Если указан,
+                то параметр page не используется. Может отсутствовать.
         :param free_rooms: Выбирать свободные (не забронированные) номера
                 в указанные даты (True) или выбирать полный список номеров,
                 не учитывая указанные даты (False или None).
                 Может отсутствовать.
         :param date_from: Дата, С которой бронируется номер.
         :param date_to: Дата, ДО которой бронируется номер.
+        :param fields: Кортеж выводимых полей схемы self.schema (параметр
+                fields= запроса), например ("title", "price", "id"). Из базы
+                данных выбираются только соответствующие столбцы, записи
+                преобразуются к схеме с этими полями, параметр
+                pydantic_schema не используется (удобства не выводятся).
+                Может отсутствовать.
         :param filter_by: Фильтры для запроса - конструкция .filter_by(**filter_by).
 
         :return: Возвращает список:
@@ -534,6 +638,9 @@ class RoomsRepository(BaseRepository):
 
         if pydantic_schema is None:
             pydantic_schema = self.schema
+        if fields:
+            # Выборочный вывод полей: только столбцы из fields (get_rows core=True)
+            pydantic_schema = partial_schema(self.schema, fields)
 
         if query is None:
             await self.check_hotel_id(hotel_id=hotel_id)
@@ -602,12 +709,14 @@ class RoomsRepository(BaseRepository):
                                     detail={"description": "Не заданы даты для выбора "
                                                            "свободных (не забронированных) номеров",
                                             })
+        # ILIKE по самому столбцу, чтобы использовался триграммный индекс
+        # (см. комментарий в HotelsRepository.get_limit)
         if title:
-            query = query.filter(sa_func.lower(self.model.title)
-                                 .contains(title.strip().lower()))
+            query = query.filter(self.model.title
+                                 .icontains(title.strip(), autoescape=True))
         if description:
-            query = query.filter(sa_func.lower(self.model.description)
-                                 .contains(description.strip().lower()))
+            query = query.filter(self.model.description
+                                 .icontains(description.strip(), autoescape=True))
 
         # According to docs (https://docs.sqlalchemy.org/en/20/tutorial/data_select.html#the-where-clause),
         # Select.where() (https://docs.sqlalchemy.org/en/20/core/selectable.html#sqlalchemy.sql.expression.Select.where)
@@ -710,6 +819,8 @@ class RoomsRepository(BaseRepository):
                                         per_page=per_page,
                                         page=page,
                                         show_all=show_all,
+                                        after_id=after_id,
+                                        core=bool(fields),
                                         **filter_by
                                         )
         # Возвращает пустой список: [] или список:
@@ -725,19 +836,121 @@ class RoomsRepository(BaseRepository):
                                         })
         if show_all:
             status = "Полный список номеров."
+        elif after_id is not None:
+            status = (f'Страница после записи с идентификатором {after_id}, '
+                      f'установлено отображение {per_page} элемент(-а/-ов) на странице.')
         else:
             status = (f'Страница {page}, установлено отображение '
                       f'{per_page} элемент(-а/-ов) на странице.')
 
         status = (status,
                   f"Всего выводится {len(result)} элемент(-а/-ов) на странице.")
-        return {"status": status, "rooms": result}
+        return {"status": status,
+                "rooms": self.dump_json(result, pydantic_schema),
+                "next_cursor": self.get_next_cursor(result, per_page=per_page, show_all=show_all),
+                }
+
+    async def search(self,
+                     q: str,
+                     pydantic_schema=None,
+                     per_page: int | None = None,
+                     after: dict | None = None,
+                     price_min: int | None = None,
+                     price_max: int | None = None,
+                     free_rooms: bool | None = None,
+                     date_from: date | None = None,
+                     date_to: date | None = None,
+                     fields: tuple[str, ...] | None = None,
+                     ):
+        """
+        Метод класса. Полнотекстовый поиск номеров по наименованию и описанию
+        (столбец search_vector). Результаты упорядочены по убыванию
+        релевантности, следующая страница выбирается по курсору next_cursor.
+        Использует родительский метод get_ranked_rows.
+
+        :param q: Строка поиска (синтаксис websearch_to_tsquery: слова через
+            пробел, "фраза в кавычках", or, -слово).
+        :param pydantic_schema: Схема pydantic, к которой преобразовываются
+                полученные значения. Если не задано, то self.schema.
+        :param per_page: Количество элементов на странице.
+        :param after: Ключ последней записи предыдущей страницы (из курсора).
+            Может отсутствовать.
+        :param price_min: Минимальная цена номера
+        :param price_max: Максимальная цена номера
+        :param free_rooms: Выбирать свободные (не забронированные) номера
+                в указанные даты (True) или выбирать полный список номеров,
+                не учитывая указанные даты (False или None).
+                Может отсутствовать.
+        :param date_from: Дата, С которой бронируется номер.
+        :param date_to: Дата, ДО которой бронируется номер.
+        :param fields: Кортеж выводимых полей схемы self.schema (параметр
+                fields= запроса), например ("title", "price", "id"). Из базы
+                данных выбираются только соответствующие столбцы, записи
+                преобразуются к схеме с этими полями, параметр
+                pydantic_schema не используется (удобства не выводятся).
+                Может отсутствовать.
+
+        :return: Возвращает словарь со статусом, списком номеров и курсором
+            следующей страницы. Если номера не найдены, то поднимается
+            исключение HTTPException с кодом 404.
+        """
+        if pydantic_schema is None:
+            pydantic_schema = self.schema
+        if fields:
+            pydantic_schema = partial_schema(self.schema, fields)
+
+        query = sa_select(self.model).filter(search_match(self.model.search_vector, q))
+        if pydantic_schema is RoomWithRels:
+            query = query.options(selectinload(self.model.facilities))
+
+        if free_rooms:
+            # Выбирать свободные (не забронированные) номера в указанные даты (True)
+            if date_from and date_to:
+                query = query.filter(await self.get_filtered_by_time(hotel_id=None,
+                                                                     date_from=date_from,
+                                                                     date_to=date_to))
+            else:
+                # status_code=422: Запрос сформирован правильно, но его невозможно
+                #                  выполнить из-за семантических ошибок
+                #                  Unprocessable Content (WebDAV)
+                raise HTTPException(status_code=422,
+                                    detail={"description": "Не заданы даты для выбора "
+                                                           "свободных (не забронированных) номеров",
+                                            })
+        if price_min:
+            query = query.where(self.model.price >= price_min)
+
+        if price_max:
+            query = query.where(self.model.price <= price_max)
+
+        result, next_cursor = await super().get_ranked_rows(
+            query=query,
+            rank=search_rank(self.model.search_vector, q),
+            pydantic_schema=pydantic_schema,
+            per_page=per_page,
+            after=after,
+            core=bool(fields),
+        )
+        if len(result) == 0:
+            # status_code=404: Сервер понял запрос, но не нашёл
+            #                  соответствующего ресурса по указанному URL
+            raise HTTPException(status_code=404,
+                                detail={"description": "Данные отсутствуют.",
+                                        })
+        status = (f'Результаты поиска по запросу "{q}" по убыванию релевантности, '
+                  f'установлено отображение {per_page} элемент(-а/-ов) на странице.',
+                  f"Всего выводится {len(result)} элемент(-а/-ов) на странице.")
+        return {"status": status,
+                "rooms": self.dump_json(result, pydantic_schema),
+                "next_cursor": next_cursor,
+                }
 
     async def get_by_id(self, room_id: int):  # -> None:
         """
         Метод класса. Выбирает по идентификатору (поле self.model.id) один
-        объект в базе, используя метод get. Служит обёрткой для родительского
-        метода get_by_id.
+        номер вместе со списком его удобств одним SQL-запросом: таблицы
+        rooms_facilities и facilities присоединяются через LEFT JOIN, удобства
+        собираются в массив JSON функцией json_agg.
 
         :param room_id: Идентификатор выбираемого объекта.
 
@@ -748,89 +961,59 @@ class RoomsRepository(BaseRepository):
             Поле facilities содержит список удобств (id, title) или пустой список ([]).
         Если номер не найден, то возбуждается исключение 404.
         """
-        # result = await self.session.get(self.model, object_id)
-        result_room_by_id = await super().get_by_id(room_id)
-        # print(result_room_by_id)
-        # result: None или <class 'src.schemas.rooms.RoomPydanticSchema'>
-        # Возвращает None или объект:
-        #         RoomPydanticSchema(hotel_id=214,
-        #                            title='title_string',
-        #                            description='description_string',
-        #                            price=21,
-        #                            quantity=22,
-        #                            id=61)
-        # Тип возвращаемых элементов преобразован к схеме Pydantic: self.schema
-        if not result_room_by_id:
+        # Ранее выполнялось два запроса: session.get для номера и отдельный
+        # запрос удобств (WHERE facilities.id IN (SELECT rooms_facilities.facility_id ...)),
+        # после чего объект RoomWithRels создавался повторной валидацией:
+        # RoomWithRels.model_validate(result_room_by_id.model_dump() |
+        #                             {"facilities": result_pydantic_schema})
+
+        # Номер без удобств: после LEFT JOIN facilities.id равен NULL, такие строки
+        # отбрасываются условием FILTER, а json_agg по пустому множеству возвращает
+        # NULL, который заменяется на пустой массив.
+        facilities_json = sa_func.coalesce(
+            sa_func.json_agg(aggregate_order_by(
+                sa_func.json_build_object("id", FacilitiesORM.id,
+                                          "title", FacilitiesORM.title),
+                FacilitiesORM.id)).filter(FacilitiesORM.id.is_not(None)),
+            sa_literal_column("'[]'::json"),
+            type_=JSON,
+        ).label("facilities")
+        query = (sa_select(self.model.id,
+                           self.model.hotel_id,
+                           self.model.title,
+                           self.model.description,
+                           self.model.price,
+                           self.model.quantity,
+                           facilities_json)
+                 .outerjoin(RoomsFacilitiesORM, RoomsFacilitiesORM.room_id == self.model.id)
+                 .outerjoin(FacilitiesORM, FacilitiesORM.id == RoomsFacilitiesORM.facility_id)
+                 .filter(self.model.id == room_id)
+                 .group_by(self.model.id)
+                 )
+        # print(query.compile(compile_kwargs={"literal_binds": True}))
+        # SELECT rooms.id, rooms.hotel_id, rooms.title, rooms.description,
+        #        rooms.price, rooms.quantity,
+        #        coalesce(json_agg(json_build_object('id', facilities.id,
+        #                                            'title', facilities.title)
+        #                          ORDER BY facilities.id)
+        #                 FILTER (WHERE facilities.id IS NOT NULL), '[]'::json) AS facilities
+        # FROM rooms
+        # LEFT OUTER JOIN rooms_facilities ON rooms_facilities.room_id = rooms.id
+        # LEFT OUTER JOIN facilities ON facilities.id = rooms_facilities.facility_id
+        # WHERE rooms.id = 61
+        # GROUP BY rooms.id
+
+        result_room = (await self.session.execute(query)).mappings().one_or_none()
+        if result_room is None:
             # status_code=404: Сервер понял запрос, но не нашёл
             #                  соответствующего ресурса по указанному URL
             raise HTTPException(status_code=404,
                                 detail={"description": "Для комнаты с идентификатором "
                                                        f"{room_id} ничего не найдено",
                                         })
-        query = (sa_select(FacilitiesORM)
-                 .select_from(FacilitiesORM)
-                 .where(FacilitiesORM.id.in_(sa_select(RoomsFacilitiesORM.facility_id)
-                                             .select_from(RoomsFacilitiesORM)
-                                             .where(RoomsFacilitiesORM.room_id == room_id)
-                                             # .filter_by(room_id=room_id)
-                                             )
-                        )
-                 )
-        # print(query.compile(compile_kwargs={"literal_binds": True}))
-        # SELECT facilities.id, facilities.title
-        # FROM facilities
-        # WHERE facilities.id IN (SELECT rooms_facilities.facility_id
-        #                         FROM rooms_facilities
-        #                         WHERE rooms_facilities.room_id = 61)
-        # Тот же запрос с параметрами:
-        # SELECT facilities.id, facilities.title
-        # FROM facilities
-        # WHERE facilities.id IN (SELECT rooms_facilities.facility_id
-        #                         FROM rooms_facilities
-        #                         WHERE rooms_facilities.room_id = :room_id_1)
-
-        # query = (sa_select(RoomsFacilitiesORM)
-        #          .select_from(RoomsFacilitiesORM)
-        #          .where(RoomsFacilitiesORM.room_id == room_id)
-        #          # .filter_by(room_id=room_id)
-        #          )
-        # SELECT rooms_facilities.id, rooms_facilities.room_id, rooms_facilities.facility_id
-        # FROM rooms_facilities
-        # WHERE rooms_facilities.room_id = :room_id_1
-
-        result_m2m_room_facilities = await self.session.execute(query)
-        # result_pydantic_schema:
-        #       [<src.models.facilities.FacilitiesORM object at 0x000001EE7F5E2190>,
-        #        <src.models.facilities.FacilitiesORM object at 0x000001EE7F5E22D0>]
-        # FacilityPydanticSchema: поля id и title
-        result_pydantic_schema = [FacilityPydanticSchema.model_validate(row_model)
-                                  for row_model in result_m2m_room_facilities.scalars().all()]
-        # print(result_pydantic_schema)
-        # Возвращает [] или объект:
-        #       [FacilityPydanticSchema(title='title_string_1', id=1),
-        #        FacilityPydanticSchema(title='title_string_2', id=2)]
-        # result = RoomWithRels(**RoomPydanticSchema.model_validate(result_room_by_id))
-        # для рекурсивного преобразования в словари вложенных
-        # моделей в Pydantic есть метод model_dump()
-
-        # Преобразовали в словарь: result_room_by_id.model_dump()
-        # Словарь распаковали (преобразовали в пары ключ=значение): **result_room_by_id.model_dump()
-
-        # Вариант 1
-        # result = RoomWithRels(**result_room_by_id.model_dump(),
-        #                       facilities=result_pydantic_schema)
-
-        # d1 = {'x': 1, 'y': 2}
-        # d2 = {'y': 3, 'z': 4}
-        #
-        # d3 = d1 | d2
-        #   значение d3: {'x': 1, 'y': 3, 'z': 4}
-
-        # Вариант 2
-        result = RoomWithRels.model_validate(result_room_by_id.model_dump() |
-                                             {"facilities": result_pydantic_schema})
-        # Если result_room_by_id было None (не найден элемент по индексу),
-        # то ранее возбуждалось исключение. Значит, тут это какой-то объект.
+        # Схема создаётся из строки результата за одну валидацию, поле facilities
+        # приходит списком словарей [{"id": 1, "title": "..."}, ...].
+        result = RoomWithRels.model_validate(result_room)
         # Возвращает объект, где поле facilities пустой список или список с данными:
         #       RoomWithRels(hotel_id=214,
         #                    title='title_string',
@@ -843,6 +1026,57 @@ class RoomsRepository(BaseRepository):
         #                    )
         return {"room": result}
 
+    async def check_bulk_references(self, rooms_data: list[BaseModel]):  # -> None:
+        """
+        Метод класса. Проверяет перед массовым добавлением номеров (COPY), что
+        все отели (hotel_id) и удобства (facilities_ids) существуют. Выполняется
+        два запроса на весь пакет номеров.
+
+        :param rooms_data: Пакет добавляемых номеров (схема RoomDescriptionRecURL).
+
+        :return: Ничего не возвращает. Если какие-то отели или удобства
+            отсутствуют, то поднимается исключение HTTPException с кодом 404
+            и списками отсутствующих идентификаторов.
+        """
+        # Проверка в основной базе данных: отели могли быть добавлены
+        # предыдущим запросом и ещё не попасть в реплику
+        pin_primary(self.session)
+
+        hotels_ids = {room.hotel_id for room in rooms_data}
+        facilities_ids = {f_id for room in rooms_data for f_id in room.facilities_ids}
+
+        result = await self.session.execute(sa_select(HotelsRepository.model.id)
+                                            .filter(HotelsRepository.model.id.in_(hotels_ids)))
+        missing_hotels = sorted(hotels_ids - set(result.scalars().all()))
+        missing_facilities = []
+        if facilities_ids:
+            result = await self.session.execute(sa_select(FacilitiesORM.id)
+                                                .filter(FacilitiesORM.id.in_(facilities_ids)))
+            missing_facilities = sorted(facilities_ids - set(result.scalars().all()))
+
+        if missing_hotels or missing_facilities:
+            # status_code=404: Сервер понял запрос, но не нашёл
+            #                  соответствующего ресурса по указанному URL
+            raise HTTPException(status_code=404,
+                                detail={"description": "Отсутствуют отели или удобства",
+                                        "hotels_ids": missing_hotels,
+                                        "facilities_ids": missing_facilities,
+                                        })
+
+    async def raise_missing_references(self, rooms_data: list[BaseModel]):  # -> None:
+        """
+        Метод класса. Вызывается методом add_copy, если отель удалён между
+        проверкой check_bulk_references и COPY. Ответ такой же, как у
+        check_bulk_references.
+
+        :param rooms_data: Пакет добавляемых номеров (схема RoomDescriptionRecURL).
+
+        :return: Ничего не возвращает, если отсутствующих записей нет. Иначе
+            поднимается исключение HTTPException с кодом 404.
+        """
+        await self.check_bulk_references(rooms_data)
+        await super().raise_missing_references(rooms_data)
+
     async def get_by_id_one_or_none(self, room_id: int):
         """
 
@@ -996,10 +1230,10 @@ class RoomsRepository(BaseRepository):
                       exclude_unset: bool = False
                       ):  # -> None:
         """
-        Метод класса. Редактирует один объект в базе, выбирая по
-        идентификатору (по первичному ключу) - поле self.model.id
-        один объект в базе, используя метод get.
-        Служит обёрткой для родительского метода edit.
+        Метод класса. Редактирует один объект в базе по идентификатору
+        (по первичному ключу) - поле self.model.id - одним запросом
+        UPDATE rooms SET ... WHERE rooms.id = :room_id RETURNING ...
+        Использует родительский метод edit.
 
         :param edited_data: Новые значения для внесения в выбранную запись.
         :param room_id: Идентификатор выбираемого объекта.
@@ -1007,13 +1241,14 @@ class RoomsRepository(BaseRepository):
             редактировать только те поля, которым явно присвоено значением
             (даже если присвоили None).
 
-        :return: Возвращает None или отредактированный объект, преобразованный к
+        :return: Возвращает отредактированный объект, преобразованный к
             схеме Pydantic: self.schema.
             Возвращает словарь:
                 {"updated rooms": updated_rooms},
                 где:
-                - updated_rooms. Список, содержащий отредактированный объект. Выводится
-                  в виде списка, содержащего элементы объекта HotelsORM.
+                - updated_rooms. Отредактированный объект.
+            Если номер не найден или отсутствует отель hotel_id, то поднимается
+            исключение HTTPException с кодом 404.
         """
         # Если не сделать проверку на правильность hotel_id, то при выполнении оператора
         # await session.commit() возникнет ошибка:
@@ -1029,18 +1264,31 @@ class RoomsRepository(BaseRepository):
 
         # Если же нет каких-либо
 
-        await self.check_hotel_id(room_data=edited_data, hotel_id=edited_data.hotel_id)
+        # Отдельная проверка отеля (check_hotel_id) и выборка номера (session.get)
+        # не делаются: номер изменяется одним запросом
+        # UPDATE rooms SET ... WHERE rooms.id = :room_id RETURNING ...,
+        # а отсутствие отеля определяется по приведённой выше ошибке внешнего ключа.
+        self.validate_hotel_id(edited_data.hotel_id)
 
-        result = await super().edit_id(edited_data=edited_data,
-                                       object_id=room_id,
-                                       exclude_unset=exclude_unset)
-        if result is None:
+        # result = await super().edit_id(edited_data=edited_data,
+        #                                object_id=room_id,
+        #                                exclude_unset=exclude_unset)
+        try:
+            result = await super().edit(edited_data,
+                                        exclude_unset=exclude_unset,
+                                        id=room_id)
+        except IntegrityError as error:
+            if not is_foreign_key_violation(error):
+                raise
+            raise self.hotel_not_found(edited_data.hotel_id, edited_data)
+        if len(result) == 0:
             # status_code=404: Сервер понял запрос, но не нашёл
             #                  соответствующего ресурса по указанному URL
             raise HTTPException(status_code=404,
                                 detail={"description": "Не найден номер с "
                                                        f"идентификатором {room_id}",
                                         })
+        result = result[0]
         # Другой вариант:
         # result = await super().edit(edited_data=edited_data,
         #                             id=room_id,
@@ -1080,8 +1328,9 @@ class RoomsRepository(BaseRepository):
                 - updated_rooms. Список, содержащий отредактированный объект. Выводится
                   в виде списка, содержащего элементы объекта HotelsORM.
         """
-        # Проверяем, имеется ли отель по edited_data.hotel_id
-        await self.check_hotel_id(room_data=edited_data, hotel_id=edited_data.hotel_id)
+        # Отель по edited_data.hotel_id отдельным запросом не проверяем -
+        # его отсутствие определяется по ошибке внешнего ключа (ниже).
+        self.validate_hotel_id(edited_data.hotel_id)
 
         try:
             # Если нет отеля по идентификатору, указанному в hotel_id, то возникает такая ошибка:
@@ -1100,13 +1349,10 @@ class RoomsRepository(BaseRepository):
                                         edit_stmt,
                                         exclude_unset,
                                         **filtering)
-        except IntegrityError:
-            # status_code=404: Сервер понял запрос, но не нашёл
-            #                  соответствующего ресурса по указанному URL
-            raise HTTPException(status_code=404,
-                                detail={"description": "Отель с указанным идентификатором "
-                                                       f"{edited_data.hotel_id} отсутствует",
-                                        "edited_data": edited_data.model_dump()})
+        except IntegrityError as error:
+            if not is_foreign_key_violation(error):
+                raise
+            raise self.hotel_not_found(edited_data.hotel_id, edited_data)
 
         if len(result) == 0:
             # status_code=404: Сервер понял запрос, но не нашёл
@@ -1135,7 +1381,9 @@ class RoomsRepository(BaseRepository):
                 - added_rooms. Список, содержащий отредактированный объект. Выводится
                   в виде списка, содержащего элементы объекта HotelsORM.
         """
-        await self.check_hotel_id(room_data=added_data, hotel_id=added_data.hotel_id)
+        # Отель по added_data.hotel_id отдельным запросом не проверяем -
+        # его отсутствие определяется по ошибке внешнего ключа (ниже).
+        self.validate_hotel_id(added_data.hotel_id)
 
         # Integrity Error - Ошибка целостности
 
@@ -1165,6 +1413,11 @@ class RoomsRepository(BaseRepository):
         # [parameters: (198, None, '198Описание обычного номера', 19811, 19812)]
         # (Background on this error at: https://sqlalche.me/e/20/gkpj)
 
-        result = await super().add(added_data)
+        try:
+            result = await super().add(added_data)
+        except IntegrityError as error:
+            if not is_foreign_key_violation(error):
+                raise
+            raise self.hotel_not_found(added_data.hotel_id, added_data)
         return {"added rooms": result}
 
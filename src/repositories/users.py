@@ -26,6 +26,7 @@ from src.schemas.users import UserPydanticSchema, UserWithHashedPasswordPydSchm
 class UsersRepository(BaseRepository):
     model = UsersORM
     schema = UserPydanticSchema
+    cacheable = True
 
     # Сделаны методы:
     #
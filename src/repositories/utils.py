@@ -1,11 +1,57 @@
+import base64
+import json
 from datetime import date
+from functools import lru_cache
 
-from sqlalchemy import select, func, insert
+from fastapi import HTTPException
+from sqlalchemy import select, func, insert, exists, literal, union_all
+from pydantic import ConfigDict, TypeAdapter, create_model
+from sqlalchemy.dialects.postgresql import DATERANGE, REAL
 
-from src.models.bookings import BookingsORM
+from src.config import settings
+from src.models.bookings import BookingsORM, RoomInventoryORM
 from src.models.rooms import RoomsORM
 
 
+def check_dates_order(date_from: date, date_to: date) -> None:
+    """
+    Проверяет, что дата выезда позже даты заезда. Иначе запрос со
+    столбцом bookings.stay завершился бы ошибкой базы данных:
+    daterange(date_from, date_to) не допускает date_from > date_to.
+
+    :param date_from: Дата, С которой бронируется номер (дата заезда).
+    :param date_to: Дата, ДО которой бронируется номер (дата выезда).
+
+    :return: Ничего не возвращает. Если date_from >= date_to, то
+        возбуждается исключение HTTPException с кодом 422.
+    """
+    if date_from >= date_to:
+        # status_code=422: Запрос сформирован правильно, но его невозможно
+        #                  выполнить из-за семантических ошибок
+        raise HTTPException(status_code=422,
+                            detail={"description": "Дата выезда должна быть позже даты заезда",
+                                    "date_from": date_from.isoformat(),
+                                    "date_to": date_to.isoformat(),
+                                    })
+
+
+def stay_overlaps(date_from: date, date_to: date):
+    """
+    Условие пересечения периода брони (столбец bookings.stay) с периодом
+    [date_from, date_to): bookings.stay && daterange(date_from, date_to).
+    Условие использует GiST-индекс ix_bookings_room_id_stay.
+
+    :param date_from: Дата, С которой бронируется номер (дата заезда).
+    :param date_to: Дата, ДО которой бронируется номер (дата выезда).
+
+    :return: Возвращает условие для filter/where.
+        Если date_from >= date_to, то возбуждается исключение
+        HTTPException с кодом 422.
+    """
+    check_dates_order(date_from=date_from, date_to=date_to)
+    return BookingsORM.stay.overlaps(func.daterange(date_from, date_to, type_=DATERANGE))
+
+
 def rooms_ids_for_booking_query(date_from: date,
                                 date_to: date,
                                 hotel_id: int | None = None):
@@ -50,11 +96,14 @@ def rooms_ids_for_booking_query(date_from: date,
     # 	where date_from <= '2025-01-24' and date_to >= '2025-01-20'
     # 	group by room_id
     # ),
+    # Условие пересечения периодов записываем через столбец stay (период
+    # [date_from, date_to)) и оператор &&, который использует GiST-индекс:
+    # 	where stay && daterange('2025-01-20', '2025-01-24')
     rooms_count = (select(BookingsORM.room_id,
                           func.count("*").label("rooms_booked"))
                    .select_from(BookingsORM)
-                   .filter(BookingsORM.date_from <= date_to,
-                           BookingsORM.date_to >= date_from)
+                   .filter(stay_overlaps(date_from=date_from,
+                                         date_to=date_to))
                    .group_by(BookingsORM.room_id)
                    .cte(name="rooms_count"))
     # cte - это чтоб алхимия могла сформировать большой запрос
@@ -207,4 +256,362 @@ def rooms_ids_for_booking_query(date_from: date,
     # FROM rooms_left_table
     # а теперь только одно: rooms_left_table.room_id
 
-    return rooms_ids_to_get
\ No newline at end of file
+    return rooms_ids_to_get
+
+
+def rooms_ids_free_by_inventory_query(date_from: date,
+                                      date_to: date,
+                                      hotel_id: int | None = None,
+                                      room_id: int | None = None):
+    """
+    Формирует SQL-запрос на выборку идентификаторов свободных номеров
+    в указанный промежуток времени по таблице room_inventory (занятость
+    номеров по ночам, которую поддерживают триггеры на таблице bookings).
+
+    В отличие от rooms_ids_for_booking_query, запрос не строит агрегаты
+    по всей таблице bookings: для каждого номера проверяется диапазон
+    ночей [date_from, date_to) по первичному ключу (room_id, night)
+    таблицы room_inventory. Стоимость запроса зависит от количества
+    номеров и длины запрошенного периода, но не от истории бронирований.
+
+    Номер считается свободным, если ни в одну ночь периода количество
+    бронирований не достигло общего количества номеров (quantity).
+
+    :param date_from: Дата, С которой бронируется номер (дата заезда).
+    :param date_to: Дата, ДО которой бронируется номер (дата выезда).
+    :param hotel_id: Идентификатор отеля. Если None, то выбираются
+        свободные номера по всем отелям.
+    :param room_id: Идентификатор номера. Если указан, то проверяется
+        только этот номер.
+
+    :return: Возвращает SQL-запрос, выбирающий один столбец room_id.
+    """
+    # Делаем такой запрос:
+    # SELECT rooms.id AS room_id
+    # FROM rooms
+    # WHERE rooms.quantity > 0 AND
+    #       rooms.hotel_id = 176 AND  --если указан hotel_id
+    #       NOT (EXISTS (SELECT 1
+    #                    FROM room_inventory
+    #                    WHERE room_inventory.room_id = rooms.id AND
+    #                          room_inventory.night >= '2025-01-20' AND
+    #                          room_inventory.night < '2025-01-23' AND
+    #                          room_inventory.booked >= rooms.quantity))
+
+    # Подзапрос: есть ли в периоде хотя бы одна полностью занятая ночь.
+    # Условие по room_id и night - это сканирование диапазона индекса
+    # первичного ключа таблицы room_inventory.
+    sold_out_night = (exists()
+                      .where(RoomInventoryORM.room_id == RoomsORM.id,
+                             RoomInventoryORM.night >= date_from,
+                             RoomInventoryORM.night < date_to,
+                             RoomInventoryORM.booked >= RoomsORM.quantity)
+                      )
+
+    rooms_ids_to_get = (select(RoomsORM.id.label("room_id"))
+                        .select_from(RoomsORM)
+                        .filter(RoomsORM.quantity > 0,
+                                ~sold_out_night)
+                        )
+
+    if hotel_id is not None:
+        rooms_ids_to_get = rooms_ids_to_get.filter(RoomsORM.hotel_id == hotel_id)
+
+    if room_id is not None:
+        rooms_ids_to_get = rooms_ids_to_get.filter(RoomsORM.id == room_id)
+
+    return rooms_ids_to_get
+
+
+def rooms_ids_free_by_sweep_query(date_from: date,
+                                  date_to: date,
+                                  hotel_id: int | None = None,
+                                  room_id: int | None = None):
+    """
+    Формирует SQL-запрос на выборку идентификаторов свободных номеров
+    в указанный промежуток времени по пиковой занятости номера, которая
+    считается непосредственно по таблице bookings (метод "заметающей
+    прямой" - sweep-line).
+
+    Каждая бронь, пересекающаяся с периодом [date_from, date_to), даёт два
+    события: +1 в день заезда и -1 в день выезда (обрезанные границами
+    периода). Нарастающая сумма событий по номеру, упорядоченных по дате,
+    - это количество занятых номеров на каждую дату, её максимум - пиковая
+    занятость. Номер свободен, если пиковая занятость меньше quantity.
+
+    В отличие от rooms_ids_for_booking_query, не пересекающиеся друг
+    с другом брони не складываются, поэтому номер не считается занятым,
+    если в каждую ночь периода остаётся хотя бы один свободный номер.
+
+    :param date_from: Дата, С которой бронируется номер (дата заезда).
+    :param date_to: Дата, ДО которой бронируется номер (дата выезда).
+    :param hotel_id: Идентификатор отеля. Если None, то выбираются
+        свободные номера по всем отелям.
+    :param room_id: Идентификатор номера. Если указан, то проверяется
+        только этот номер.
+
+    :return: Возвращает SQL-запрос, выбирающий один столбец room_id.
+    """
+    # Делаем такой запрос:
+    # WITH booking_events AS (
+    #     --События заезда (+1) и выезда (-1), обрезанные границами периода
+    #     SELECT bookings.room_id, greatest(bookings.date_from, '2025-01-20') AS day, 1 AS delta
+    #     FROM bookings
+    #     WHERE bookings.stay && daterange('2025-01-20', '2025-01-23')
+    #     UNION ALL
+    #     SELECT bookings.room_id, least(bookings.date_to, '2025-01-23') AS day, -1 AS delta
+    #     FROM bookings
+    #     WHERE bookings.stay && daterange('2025-01-20', '2025-01-23')
+    # ),
+    # rooms_occupancy AS (
+    #     --Занятость номера после каждого события. В один день выезд (-1)
+    #     --учитывается раньше заезда (+1): день выезда не занят.
+    #     SELECT room_id,
+    #            sum(delta) OVER (PARTITION BY room_id
+    #                             ORDER BY day, delta
+    #                             ROWS UNBOUNDED PRECEDING) AS rooms_booked
+    #     FROM booking_events
+    # ),
+    # rooms_peak AS (
+    #     SELECT room_id, max(rooms_booked) AS rooms_booked
+    #     FROM rooms_occupancy
+    #     GROUP BY room_id
+    # )
+    # SELECT rooms.id AS room_id
+    # FROM rooms
+    # LEFT OUTER JOIN rooms_peak ON rooms.id = rooms_peak.room_id
+    # WHERE rooms.quantity - coalesce(rooms_peak.rooms_booked, 0) > 0 AND
+    #       rooms.hotel_id = 176  --если указан hotel_id
+
+    overlapping = (stay_overlaps(date_from=date_from, date_to=date_to),)
+
+    check_in_events = (select(BookingsORM.room_id,
+                              func.greatest(BookingsORM.date_from, date_from).label("day"),
+                              literal(1).label("delta"))
+                       .filter(*overlapping))
+    check_out_events = (select(BookingsORM.room_id,
+                               func.least(BookingsORM.date_to, date_to).label("day"),
+                               literal(-1).label("delta"))
+                        .filter(*overlapping))
+
+    if hotel_id is not None:
+        # Ограничиваем события бронированиями номеров указанного отеля
+        hotel_rooms_ids = select(RoomsORM.id).filter_by(hotel_id=hotel_id)
+        check_in_events = check_in_events.filter(BookingsORM.room_id.in_(hotel_rooms_ids))
+        check_out_events = check_out_events.filter(BookingsORM.room_id.in_(hotel_rooms_ids))
+
+    if room_id is not None:
+        check_in_events = check_in_events.filter(BookingsORM.room_id == room_id)
+        check_out_events = check_out_events.filter(BookingsORM.room_id == room_id)
+
+    booking_events = union_all(check_in_events, check_out_events).cte(name="booking_events")
+
+    rooms_occupancy = (select(booking_events.c.room_id,
+                              func.sum(booking_events.c.delta)
+                              .over(partition_by=booking_events.c.room_id,
+                                    order_by=(booking_events.c.day, booking_events.c.delta),
+                                    rows=(None, 0))
+                              .label("rooms_booked"))
+                       .cte(name="rooms_occupancy"))
+
+    rooms_peak = (select(rooms_occupancy.c.room_id,
+                         func.max(rooms_occupancy.c.rooms_booked).label("rooms_booked"))
+                  .group_by(rooms_occupancy.c.room_id)
+                  .cte(name="rooms_peak"))
+
+    rooms_ids_to_get = (select(RoomsORM.id.label("room_id"))
+                        .select_from(RoomsORM)
+                        .outerjoin(rooms_peak, RoomsORM.id == rooms_peak.c.room_id)
+                        .filter(RoomsORM.quantity -
+                                func.coalesce(rooms_peak.c.rooms_booked, 0) > 0)
+                        )
+
+    if hotel_id is not None:
+        rooms_ids_to_get = rooms_ids_to_get.filter(RoomsORM.hotel_id == hotel_id)
+
+    if room_id is not None:
+        rooms_ids_to_get = rooms_ids_to_get.filter(RoomsORM.id == room_id)
+
+    return rooms_ids_to_get
+
+
+# Способы поиска свободных номеров, выбираются параметром
+# AVAILABILITY_ENGINE в файле .env (см. src/config.py).
+availability_engines = {"inventory": rooms_ids_free_by_inventory_query,
+                        "sweep": rooms_ids_free_by_sweep_query,
+                        }
+
+
+def rooms_ids_free_query(date_from: date,
+                         date_to: date,
+                         hotel_id: int | None = None,
+                         room_id: int | None = None):
+    """
+    Формирует SQL-запрос на выборку идентификаторов свободных номеров
+    в указанный промежуток времени способом, заданным в настройках
+    (settings.AVAILABILITY_ENGINE).
+
+    :param date_from: Дата, С которой бронируется номер (дата заезда).
+    :param date_to: Дата, ДО которой бронируется номер (дата выезда).
+    :param hotel_id: Идентификатор отеля. Если None, то выбираются
+        свободные номера по всем отелям.
+    :param room_id: Идентификатор номера. Если указан, то проверяется
+        только этот номер.
+
+    :return: Возвращает SQL-запрос, выбирающий один столбец room_id.
+        Если date_from >= date_to, то возбуждается исключение
+        HTTPException с кодом 422.
+    """
+    # Проверка нужна для всех способов поиска (в том числе inventory, который
+    # не использует stay_overlaps): одинаковый ответ на перепутанные даты.
+    check_dates_order(date_from=date_from, date_to=date_to)
+    engine_func = availability_engines[settings.AVAILABILITY_ENGINE]
+    return engine_func(date_from=date_from,
+                       date_to=date_to,
+                       hotel_id=hotel_id,
+                       room_id=room_id)
+
+
+def encode_cursor(**values) -> str:
+    """
+    Формирует курсор для постраничного вывода по ключу (keyset pagination).
+    Курсор - это непрозрачная для клиента строка, в которой сохраняются
+    значения ключа последней выведенной записи.
+
+    :param values: Значения ключа последней выведенной записи,
+        например: id=198.
+
+    :return: Возвращает строку курсора (base64 без символов "=" в конце).
+    """
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    Разбирает курсор, сформированный функцией encode_cursor.
+
+    :param cursor: Строка курсора.
+
+    :return: Возвращает словарь со значениями ключа, например: {"id": 198}.
+        Если курсор повреждён, то поднимается исключение ValueError.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError) as err:
+        raise ValueError("Некорректный курсор") from err
+    if not isinstance(values, dict):
+        raise ValueError("Некорректный курсор")
+    return values
+
+
+# Конфигурация полнотекстового поиска. Должна совпадать с конфигурацией, с
+# которой вычисляются столбцы search_vector (см. миграцию 010 Add search vectors).
+# Конфигурация russian приводит русские слова к основе (russian_stem), а
+# латинские - к английской основе (english_stem).
+FTS_CONFIG = "russian"
+
+
+def search_tsquery(q: str):
+    """
+    Запрос полнотекстового поиска из строки, введённой пользователем:
+    websearch_to_tsquery('russian', :q). Поддерживает синтаксис поисковых
+    систем: слова через пробел (И), "фраза в кавычках", or (ИЛИ), -слово (НЕ).
+    В отличие от to_tsquery не выдаёт ошибку на некорректном вводе.
+
+    :param q: Строка поиска.
+
+    :return: Возвращает выражение типа tsquery.
+    """
+    # Первый аргумент SQLAlchemy сам приводит к типу regconfig:
+    # websearch_to_tsquery($1::REGCONFIG, $2::VARCHAR)
+    return func.websearch_to_tsquery(FTS_CONFIG, q)
+
+
+def search_match(search_vector, q: str):
+    """
+    Условие полнотекстового поиска: search_vector @@ websearch_to_tsquery(...).
+    Условие использует GIN-индекс по столбцу search_vector.
+
+    :param search_vector: Столбец типа tsvector, например HotelsORM.search_vector.
+    :param q: Строка поиска.
+
+    :return: Возвращает условие для filter/where.
+    """
+    return search_vector.bool_op("@@")(search_tsquery(q))
+
+
+def search_rank(search_vector, q: str):
+    """
+    Релевантность строки запросу поиска: ts_rank(search_vector, tsquery).
+    Учитывает веса частей документа (совпадение в наименовании важнее, чем
+    в адресе или описании).
+
+    :param search_vector: Столбец типа tsvector, например HotelsORM.search_vector.
+    :param q: Строка поиска.
+
+    :return: Возвращает выражение типа real.
+    """
+    return func.ts_rank(search_vector, search_tsquery(q), type_=REAL)
+
+
+# Код ошибки PostgreSQL foreign_key_violation: значение внешнего ключа
+# отсутствует в связанной таблице (например, rooms.hotel_id нет в hotels).
+FOREIGN_KEY_VIOLATION = "23503"
+
+
+def is_foreign_key_violation(error) -> bool:
+    """
+    Проверяет, что ошибка IntegrityError вызвана нарушением внешнего ключа
+    (а не, например, NOT NULL или уникальности).
+
+    :param error: Исключение sqlalchemy.exc.IntegrityError.
+
+    :return: Возвращает True, если код ошибки PostgreSQL равен 23503.
+    """
+    return getattr(error.orig, "sqlstate", None) == FOREIGN_KEY_VIOLATION
+
+
+@lru_cache
+def schema_columns(model, schema) -> tuple:
+    """
+    Столбцы таблицы модели, соответствующие полям схемы Pydantic (в порядке
+    столбцов таблицы). Поля схемы, которых нет в таблице, пропускаются.
+
+    :param model: Модель SQLAlchemy, например HotelsORM.
+    :param schema: Схема Pydantic, например HotelPydanticSchema.
+
+    :return: Возвращает кортеж столбцов, например:
+        (hotels.id, hotels.title, hotels.location)
+    """
+    return tuple(column for name, column in model.__table__.c.items()
+                 if name in schema.model_fields)
+
+
+@lru_cache
+def schema_list_adapter(schema) -> TypeAdapter:
+    """
+    TypeAdapter(list[schema]) для проверки списка строк за один вызов.
+    Создание TypeAdapter (сборка валидатора) дорогое, поэтому он
+    создаётся один раз для каждой схемы.
+    """
+    return TypeAdapter(list[schema])
+
+
+@lru_cache
+def partial_schema(schema, fields: tuple[str, ...]):
+    """
+    Схема Pydantic только с полями fields схемы schema (для параметра fields=
+    списков). Схема создаётся один раз для каждого набора полей.
+
+    :param schema: Схема Pydantic, например HotelPydanticSchema.
+    :param fields: Кортеж имён полей схемы, например ("id", "title").
+
+    :return: Возвращает класс схемы, например HotelPydanticSchemaFields с
+        полями id и title (описания полей берутся из схемы schema).
+    """
+    return create_model(f"{schema.__name__}Fields",
+                        __config__=ConfigDict(from_attributes=True),
+                        **{name: (schema.model_fields[name].annotation, schema.model_fields[name])
+                           for name in fields})
@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field, ConfigDict
 
+from src.schemas.rooms import RoomWithRels
+
 # Pydantic 2: Полное руководство для Python-разработчиков — от основ до продвинутых техник
 # https://fastapi.qubitpi.org/reference/fastapi/?h=tags_metadata#fastapi.FastAPI--example
 
@@ -104,3 +106,10 @@ class HotelPydanticSchema(HotelBase):
     id: int = Field()
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class HotelWithRooms(HotelPydanticSchema):
+    # Отель со всеми номерами и удобствами номеров (ручка /hotels/{hotel_id}/full).
+    # Документ JSON собирается в PostgreSQL и отдаётся клиенту как есть,
+    # поэтому схема используется только для описания ответа в документации.
+    rooms: list[RoomWithRels]
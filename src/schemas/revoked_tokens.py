@@ -0,0 +1,11 @@
+from datetime import datetime
+
+from pydantic import BaseModel, ConfigDict
+
+
+class RevokedTokenPydanticSchema(BaseModel):
+    jti: str
+    exp: datetime
+    revoked_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
@@ -1,10 +1,12 @@
 from datetime import datetime, timezone, timedelta
+from uuid import uuid4
 
 import jwt
 from fastapi import HTTPException
 from passlib.context import CryptContext
 
 from src.config import settings
+from src.utils.password_pool import password_pool
 
 
 class AuthService:
@@ -55,7 +57,9 @@ class AuthService:
             validity_period = {"minutes": settings.ACCESS_TOKEN_EXPIRE_MINUTES}
         expires_delta = timedelta(**validity_period)
         expire = datetime.now(timezone.utc) + expires_delta
-        to_encode.update({"exp": expire})
+        # jti - идентификатор токена, по нему токен отзывается при выходе
+        # пользователя (таблица revoked_tokens, src/utils/revocation.py)
+        to_encode.update({"exp": expire, "jti": uuid4().hex})
         encoded_jwt = jwt.encode(to_encode,
                                  settings.JWT_SECRET_KEY,
                                  algorithm=settings.JWT_ALGORITHM)
@@ -71,6 +75,15 @@ class AuthService:
     def verify_password(self, plain_password, hashed_password):
         return self.pwd_context.verify(plain_password, hashed_password)
 
+    # Методы hashed_password и verify_password выполняются десятки миллисекунд
+    # и останавливают цикл событий. В асинхронных ручках используются их
+    # варианты, которые выполняются в пуле потоков (src/utils/password_pool.py).
+    async def hashed_password_async(self, password: str) -> str:
+        return await password_pool.run(self.pwd_context.hash, password)
+
+    async def verify_password_async(self, plain_password, hashed_password) -> bool:
+        return await password_pool.run(self.pwd_context.verify, plain_password, hashed_password)
+
     # def decode_token(self, token: str) -> dict:  # dict(str, Any)
     #     return jwt.decode(token,
     #                       settings.JWT_SECRET_KEY,
@@ -0,0 +1,43 @@
+"""
+Загрузка файлов CSV и JSONL в таблицы базы данных (см. src/tools/importer.py).
+
+Запуск:
+    python -m src.tools.import hotels data/hotels.csv
+    python -m src.tools.import rooms data/rooms.jsonl --chunk-size 20000
+    python -m src.tools.import rooms_facilities data/links.csv --restart
+
+Если загрузка прервалась, то повторный запуск той же команды продолжает её
+с последнего записанного пакета (файл <файл>.checkpoint.json). Параметр
+--restart начинает загрузку сначала.
+"""
+import argparse
+import asyncio
+
+from src.database import engine
+from src.tools.importer import CHUNK_SIZE, TABLES, import_file
+
+
+async def main(args: argparse.Namespace) -> None:
+    try:
+        checkpoint = await import_file(table_name=args.table,
+                                       path=args.path,
+                                       file_format=args.format,
+                                       chunk_size=args.chunk_size,
+                                       checkpoint_path=args.checkpoint,
+                                       restart=args.restart)
+    finally:
+        await engine.dispose()
+    print(f"Готово: строк {checkpoint['rows']}, загружено {checkpoint['loaded']}, "
+          f"отклонено {checkpoint['rejected']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("table", choices=list(TABLES))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--checkpoint", default=None)
+    parser.add_argument("--restart", action="store_true")
+    asyncio.run(main(parser.parse_args()))
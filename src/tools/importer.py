@@ -0,0 +1,325 @@
+# Загрузка больших файлов CSV и JSONL в таблицы hotels, rooms, facilities
+# и rooms_facilities. Запуск - см. src/tools/import.py:
+#     python -m src.tools.import hotels data/hotels.csv
+#
+# Файл обрабатывается потоком (цепочкой генераторов), в памяти хранится
+# только текущий пакет строк:
+#   чтение строк файла -> пакеты по chunk_size строк -> проверка схемой
+#   Pydantic -> COPY во временную таблицу (staging) -> INSERT ... SELECT
+#   из временной таблицы с ON CONFLICT (id) DO UPDATE.
+#
+# Каждый пакет записывается в отдельной транзакции. После подтверждения
+# транзакции в файл контрольной точки (checkpoint) записывается позиция в
+# файле (смещение в байтах), с которой начинается следующий пакет. Если
+# загрузка прервалась, то повторный запуск продолжает её с этой позиции.
+# Повторная запись пакета (сбой между commit и записью контрольной точки)
+# безопасна: строки с теми же id обновляются, а не добавляются повторно.
+#
+# Строки, которые не прошли проверку схемой, не заполняют обязательные
+# столбцы или ссылаются на отсутствующие записи (внешний ключ), не
+# загружаются и записываются в файл <файл>.rejects.jsonl. Туда же
+# записываются повторы id внутри пакета: загружается последняя строка с
+# этим id (ON CONFLICT DO UPDATE не может изменить одну запись дважды).
+import csv
+import json
+import os
+import time
+from typing import Iterator
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import Column, MetaData, Table, and_, exists, func, not_, or_, select
+from sqlalchemy.dialects.postgresql import insert
+
+from src.database import engine
+from src.models.facilities import FacilitiesORM, RoomsFacilitiesORM
+from src.models.hotels import HotelsORM
+from src.models.rooms import RoomsORM
+from src.schemas.facilities import FacilityPydanticSchema, RoomsFacilityBase
+from src.schemas.hotels import HotelPydanticSchema
+from src.schemas.rooms import RoomPydanticSchema
+
+# Таблица: (модель, схема для проверки строк, ключ для ON CONFLICT).
+# Схемы *PydanticSchema - это схемы HotelBase, RoomBase, FacilityBase с
+# полем id: идентификаторы берутся из файла, чтобы повторная загрузка
+# обновляла те же записи. У rooms_facilities ключа нет - связь добавляется
+# с ON CONFLICT DO NOTHING, если такой же связи (room_id, facility_id) ещё нет.
+TABLES = {"hotels": (HotelsORM, HotelPydanticSchema, "id"),
+          "rooms": (RoomsORM, RoomPydanticSchema, "id"),
+          "facilities": (FacilitiesORM, FacilityPydanticSchema, "id"),
+          "rooms_facilities": (RoomsFacilitiesORM, RoomsFacilityBase, None),
+          }
+
+CHUNK_SIZE = 10_000
+
+
+def read_csv(file, offset: int = 0) -> Iterator[tuple[int, dict]]:
+    """
+    Читает строки файла CSV (первая строка - заголовок с именами столбцов).
+
+    :param file: Файл, открытый в двоичном режиме.
+    :param offset: Смещение в байтах, с которого продолжить чтение (из
+        контрольной точки). 0 - читать с первой строки после заголовка.
+
+    :return: Генератор пар (смещение после строки, словарь столбец: значение).
+        Пустые значения заменяются на None.
+    """
+    header = next(csv.reader([file.readline().decode("utf-8-sig")]))
+    position = max(offset, file.tell())
+    file.seek(position)
+
+    def lines():
+        nonlocal position
+        for line in file:
+            position += len(line)
+            yield line.decode("utf-8")
+
+    # Запись CSV может занимать несколько строк файла (значение в кавычках
+    # с переводом строки), поэтому смещение берётся после чтения записи.
+    for values in csv.reader(lines()):
+        if values:
+            yield position, {key: (value if value != "" else None)
+                             for key, value in zip(header, values)}
+
+
+def read_jsonl(file, offset: int = 0) -> Iterator[tuple[int, dict | str]]:
+    """
+    Читает строки файла JSONL (по одному объекту JSON в строке).
+
+    :param file: Файл, открытый в двоичном режиме.
+    :param offset: Смещение в байтах, с которого продолжить чтение.
+
+    :return: Генератор пар (смещение после строки, словарь). Если строка не
+        является объектом JSON, то вместо словаря возвращается строка.
+    """
+    position = offset
+    file.seek(position)
+    for line in file:
+        position += len(line)
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        if not isinstance(row, dict):
+            row = line.decode("utf-8", errors="replace").rstrip("\r\n")
+        yield position, row
+
+
+def chunked(rows: Iterator, size: int) -> Iterator[list]:
+    """
+    Группирует строки в пакеты по size строк.
+    """
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def validate(chunks: Iterator[list[tuple[int, dict | str]]],
+             schema: type[BaseModel],
+             table: Table,
+             columns: list[str],
+             conflict_key: str | None = None) -> Iterator[tuple[int, int, list[tuple], list[dict]]]:
+    """
+    Проверяет строки пакета схемой Pydantic и обязательные столбцы таблицы.
+    Если указан conflict_key, то из строк пакета с одинаковым значением
+    ключа остаётся последняя, а предыдущие отклоняются.
+
+    :return: Генератор четвёрок (смещение после пакета, количество строк
+        в пакете, записи для COPY, отклонённые строки с описанием ошибок).
+    """
+    required = [name for name in columns
+                if not table.c[name].nullable and table.c[name].server_default is None]
+    for chunk in chunks:
+        records, rejects = [], []
+        # Значение ключа -> (индекс записи в records, строка файла)
+        by_key = {}
+        for _, row in chunk:
+            if not isinstance(row, dict):
+                rejects.append({"row": row, "errors": "Строка не является объектом JSON"})
+                continue
+            try:
+                item = schema.model_validate(row)
+            except ValidationError as error:
+                rejects.append({"row": row,
+                                "errors": error.errors(include_url=False, include_context=False)})
+                continue
+            missing = [name for name in required if getattr(item, name) is None]
+            if missing:
+                rejects.append({"row": row, "errors": f"Не заполнены столбцы: {missing}"})
+                continue
+            record = tuple(getattr(item, name) for name in columns)
+            key = getattr(item, conflict_key) if conflict_key is not None else None
+            if key is not None and key in by_key:
+                index, previous_row = by_key[key]
+                rejects.append({"row": previous_row,
+                                "errors": f"Повтор {conflict_key}={key} в пакете, загружена последняя строка"})
+                records[index] = None
+            if key is not None:
+                by_key[key] = (len(records), row)
+            records.append(record)
+        records = [record for record in records if record is not None]
+        yield chunk[-1][0], len(chunk), records, rejects
+
+
+def staging_table(table: Table, columns: list[str]) -> Table:
+    """
+    Временная таблица для COPY с теми же столбцами (без ограничений).
+    Строки удаляются при каждом commit (ON COMMIT DELETE ROWS).
+    """
+    return Table(f"staging_{table.name}", MetaData(),
+                 *(Column(name, table.c[name].type) for name in columns),
+                 prefixes=["TEMPORARY"],
+                 postgresql_on_commit="DELETE ROWS")
+
+
+def merge_statements(table: Table, staging: Table, columns: list[str], conflict_key: str | None):
+    """
+    Формирует запросы переноса строк из временной таблицы в таблицу:
+    выборку строк с отсутствующими связанными записями (внешний ключ) и
+    INSERT ... SELECT ... ON CONFLICT.
+
+    :return: Возвращает пару (запрос отклонённых строк или None, запрос INSERT).
+    """
+    # Внешний ключ не заполнен или связанная запись существует
+    foreign_keys_ok = [
+        or_(staging.c[name].is_(None),
+            exists().where(foreign_key.column == staging.c[name]))
+        for name in columns
+        for foreign_key in table.c[name].foreign_keys
+    ]
+    rows = select(*(staging.c[name] for name in columns))
+    rejected = None
+    if foreign_keys_ok:
+        rows = rows.filter(*foreign_keys_ok)
+        rejected = select(staging).filter(not_(and_(*foreign_keys_ok)))
+
+    if conflict_key is None:
+        # Связь без id: существующая связь пропускается по уникальному
+        # ограничению (room_id, facility_id)
+        return rejected, insert(table).from_select(columns, rows).on_conflict_do_nothing()
+
+    insert_stmt = insert(table).from_select(columns, rows)
+    insert_stmt = insert_stmt.on_conflict_do_update(
+        index_elements=[conflict_key],
+        set_={name: insert_stmt.excluded[name] for name in columns if name != conflict_key},
+    )
+    # INSERT INTO hotels (title, location, id)
+    # SELECT staging_hotels.title, staging_hotels.location, staging_hotels.id
+    # FROM staging_hotels
+    # ON CONFLICT (id) DO UPDATE SET title = excluded.title, location = excluded.location
+    return rejected, insert_stmt
+
+
+def load_checkpoint(path: str) -> dict | None:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_checkpoint(path: str, checkpoint: dict) -> None:
+    # Запись через временный файл: при сбое во время записи остаётся
+    # предыдущая контрольная точка, а не испорченный файл
+    with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+        json.dump(checkpoint, file, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
+
+
+async def import_file(table_name: str,
+                      path: str,
+                      file_format: str | None = None,
+                      chunk_size: int = CHUNK_SIZE,
+                      checkpoint_path: str | None = None,
+                      restart: bool = False) -> dict:
+    """
+    Загружает файл CSV или JSONL в таблицу.
+
+    :param table_name: Таблица: hotels, rooms, facilities или rooms_facilities.
+    :param path: Путь к файлу.
+    :param file_format: csv или jsonl. Если не указан, то определяется по
+        расширению файла.
+    :param chunk_size: Количество строк в пакете (одна транзакция).
+    :param checkpoint_path: Файл контрольной точки. По умолчанию
+        <файл>.checkpoint.json.
+    :param restart: Начать загрузку сначала, не используя контрольную точку.
+
+    :return: Возвращает контрольную точку: {"table", "path", "offset", "rows",
+        "loaded", "rejected", "done"}.
+    """
+    model, schema, conflict_key = TABLES[table_name]
+    table = model.__table__
+    columns = [name for name in schema.model_fields if name in table.c]
+    file_format = file_format or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    reader = read_csv if file_format == "csv" else read_jsonl
+    checkpoint_path = checkpoint_path or f"{path}.checkpoint.json"
+    rejects_path = f"{path}.rejects.jsonl"
+
+    checkpoint = None if restart else load_checkpoint(checkpoint_path)
+    if checkpoint is not None and checkpoint["table"] != table_name:
+        raise ValueError(f"Контрольная точка {checkpoint_path} относится к таблице "
+                         f"{checkpoint['table']}")
+    if checkpoint is None:
+        checkpoint = {"table": table_name, "path": path, "offset": 0,
+                      "rows": 0, "loaded": 0, "rejected": 0, "done": False}
+        if os.path.exists(rejects_path):
+            os.remove(rejects_path)
+    if checkpoint["done"]:
+        return checkpoint
+
+    staging = staging_table(table, columns)
+    rejected_query, merge_stmt = merge_statements(table, staging, columns, conflict_key)
+    start = time.perf_counter()
+
+    async with engine.connect() as conn:
+        await conn.run_sync(staging.create)
+        await conn.commit()
+        raw_connection = (await conn.get_raw_connection()).driver_connection
+
+        with open(path, "rb") as file, open(rejects_path, "a", encoding="utf-8") as rejects_file:
+            rows = reader(file, checkpoint["offset"])
+            for offset, count, records, rejects in validate(chunked(rows, chunk_size), schema, table, columns, conflict_key):
+                missing_references = []
+                async with conn.begin():
+                    if records:
+                        await raw_connection.copy_records_to_table(staging.name,
+                                                                   records=records,
+                                                                   columns=columns)
+                        if rejected_query is not None:
+                            missing_references = [
+                                {"row": dict(row._mapping),
+                                 "errors": "Нет связанной записи (внешний ключ)"}
+                                for row in await conn.execute(rejected_query)
+                            ]
+                        await conn.execute(merge_stmt)
+                for reject in rejects + missing_references:
+                    rejects_file.write(json.dumps(reject, ensure_ascii=False, default=str) + "\n")
+                rejects_file.flush()
+
+                checkpoint["offset"] = offset
+                checkpoint["rows"] += count
+                checkpoint["loaded"] += len(records) - len(missing_references)
+                checkpoint["rejected"] += len(rejects) + len(missing_references)
+                save_checkpoint(checkpoint_path, checkpoint)
+                elapsed = time.perf_counter() - start
+                print(f"{table_name}: строк {checkpoint['rows']}, загружено {checkpoint['loaded']}, "
+                      f"отклонено {checkpoint['rejected']}, {count / elapsed:.0f} строк/с")
+                start = time.perf_counter()
+
+        if conflict_key is not None:
+            # Идентификаторы взяты из файла - последовательность таблицы
+            # переводится на максимальный id, чтобы следующие INSERT не
+            # получили уже занятый идентификатор.
+            async with conn.begin():
+                await conn.execute(select(func.setval(func.pg_get_serial_sequence(table.name, conflict_key),
+                                                      func.coalesce(func.max(table.c[conflict_key]), 1)))
+                                   .select_from(table))
+
+    checkpoint["done"] = True
+    save_checkpoint(checkpoint_path, checkpoint)
+    return checkpoint
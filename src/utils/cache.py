@@ -0,0 +1,101 @@
+# Кэш сущностей (entity cache) в памяти процесса для выборок по
+# идентификатору (BaseRepository.fetch_by_id).
+#
+# Ключ - (имя таблицы, идентификатор), значение - объект схемы Pydantic.
+# Кэш ограничен по количеству записей (при переполнении удаляется запись,
+# к которой дольше всего не обращались - LRU) и по времени жизни записи (TTL).
+#
+# Кэш сбрасывается при записи: методы add, edit, edit_id, delete и delete_id
+# репозитория удаляют из кэша затронутые записи сразу и ещё раз после
+# подтверждения транзакции (DBManager.commit) - иначе параллельный запрос мог
+# бы между изменением и commit снова положить в кэш старое значение.
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable
+
+from src.config import settings
+
+# Значение, которое возвращает EntityCache.get, если записи в кэше нет
+# (None - допустимое значение для "записи в базе нет", но None не кэшируется)
+MISSING = object()
+
+
+class EntityCache:
+    """
+    LRU-кэш с ограничением времени жизни записей и счётчиками обращений.
+
+    :param maxsize: Максимальное количество записей. Если 0, то кэш
+        выключен (ничего не сохраняет).
+    :param ttl: Время жизни записи в секундах.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Возвращает значение из кэша или MISSING, если записи нет или
+        время её жизни истекло.
+        """
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return MISSING
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Сохраняет значение в кэше. Если кэш переполнен, то удаляется
+        запись, к которой дольше всего не обращались.
+        """
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, keys: Iterable[Hashable]) -> None:
+        """
+        Удаляет записи из кэша.
+        """
+        for key in keys:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        """
+        Возвращает счётчики кэша: количество записей, попаданий, промахов,
+        вытеснений по LRU и сбросов при записи.
+        """
+        return {"size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                }
+
+
+# Общий кэш сущностей для всех репозиториев (параметры ENTITY_CACHE_SIZE и
+# ENTITY_CACHE_TTL в .env)
+entity_cache = EntityCache(maxsize=settings.ENTITY_CACHE_SIZE,
+                           ttl=settings.ENTITY_CACHE_TTL)
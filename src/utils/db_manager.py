@@ -3,6 +3,11 @@ from src.repositories.facilities import FacilitiesRepository, RoomsFacilitiesRep
 from src.repositories.hotels import HotelsRepository
 from src.repositories.rooms import RoomsRepository
 from src.repositories.users import UsersRepository
+from src.repositories.revoked_tokens import RevokedTokensRepository
+from src.repositories.base import CACHE_KEYS_INFO
+from src.database import pin_primary
+from src.utils.cache import entity_cache
+from src.utils.token_cache import token_cache
 
 # Контекстный менеджер в Python — это объект, который определяет
 # методы __enter__() и __exit__() и используется с инструкцией with.
@@ -40,27 +45,104 @@ from src.repositories.users import UsersRepository
 
 
 class DBManager:
-    def __init__(self, session_factory):
-        self.session_factory = session_factory
+    # Репозитории создаются при первом обращении к атрибуту (db.hotels,
+    # db.rooms и т.д.) - см. метод __getattr__. Запросу, которому нужен
+    # только один репозиторий, не приходится создавать остальные.
+    repositories = {"hotels": HotelsRepository,
+                    "rooms": RoomsRepository,
+                    "users": UsersRepository,
+                    "bookings": BookingsRepository,
+                    "facilities": FacilitiesRepository,
+                    "rooms_facilities": RoomsFacilitiesRepository,
+                    "revoked_tokens": RevokedTokensRepository,
+                    }
 
-    async def __aenter__(self):
+    # Аннотации для подсказок в IDE (значения создаются в __getattr__)
+    hotels: HotelsRepository
+    rooms: RoomsRepository
+    users: UsersRepository
+    bookings: BookingsRepository
+    facilities: FacilitiesRepository
+    rooms_facilities: RoomsFacilitiesRepository
+    revoked_tokens: RevokedTokensRepository
+
+    def __init__(self, session_factory, read_primary: bool = False):
         # session_factory - фабрика сессий
-        self.session = self.session_factory()
+        # read_primary - выполнять все запросы в основной базе данных, не
+        #       используя реплики (заголовок X-DB-Read-Primary, см. get_db
+        #       в src/api/dependencies/dependencies.py)
+        self.session_factory = session_factory
+        self.read_primary = read_primary
+        self._session = None
+
+    @property
+    def session(self):
+        # Сессия создаётся при первом обращении. Соединение из пула сессия
+        # берёт только при первом запросе к базе данных (autobegin).
+        if self._session is None:
+            self._session = self.session_factory()
+            if self.read_primary:
+                pin_primary(self._session)
+        return self._session
 
-        self.hotels = HotelsRepository(self.session)
-        self.rooms = RoomsRepository(self.session)
-        self.users = UsersRepository(self.session)
-        self.bookings = BookingsRepository(self.session)
-        self.facilities = FacilitiesRepository(self.session)
-        self.rooms_facilities = RoomsFacilitiesRepository(self.session)
+    def __getattr__(self, name):
+        # Вызывается, только если атрибут не найден обычным способом, то есть
+        # при первом обращении к репозиторию. Созданный репозиторий сохраняется
+        # в атрибуте объекта, следующие обращения до __getattr__ не доходят.
+        repository = self.repositories.get(name)
+        if repository is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        value = repository(self.session)
+        setattr(self, name, value)
+        return value
 
+    async def __aenter__(self):
         return self
 
     # async def __aexit__(self, exc_type, exc_val, exc_tb):
     async def __aexit__(self, *args):
-        await self.session.rollback()
-        await self.session.close()
+        if self._session is None:
+            # К базе данных не обращались - закрывать нечего
+            return
+        # Откат нужен, только если транзакция начата и не подтверждена
+        # (после commit или без запросов к базе транзакции нет).
+        if self._session.in_transaction():
+            await self._session.rollback()
+        await self._session.close()
+        # Изменения не подтверждены - кэш сущностей уже очищен при записи,
+        # ключи изменённых записей больше не нужны.
+        self._session.info.pop(CACHE_KEYS_INFO, None)
 
     async def commit(self):
         await self.session.commit()
+        # Повторно удаляем из кэша сущностей записи, изменённые в транзакции:
+        # пока транзакция не была подтверждена, параллельный запрос мог снова
+        # положить в кэш старые значения.
+        keys = self.session.info.pop(CACHE_KEYS_INFO, ())
+        entity_cache.invalidate(keys)
+        # Записи пользователей хранятся и в кэше проверенных токенов
+        token_cache.invalidate_users(object_id for table, object_id in keys
+                                     if table == UsersRepository.model.__tablename__)
+
+    async def stream(self, repository: str, *args, **kwargs):
+        """
+        Потоковая выборка строк из репозитория (метод stream_rows) в
+        отдельной сессии.
+
+        Тело StreamingResponse читается уже после того, как FastAPI закрыл
+        зависимости (в том числе DBDep и его сессию), поэтому для чтения
+        потока открывается собственный DBManager с той же фабрикой сессий.
+        Сессия закрывается, когда поток прочитан до конца или клиент
+        разорвал соединение.
+
+        :param repository: Имя репозитория: "hotels", "rooms", "bookings" и т.д.
+        :param args: Аргументы метода stream_rows репозитория.
+        :param kwargs: Именованные аргументы метода stream_rows репозитория.
+
+        :return: Асинхронный генератор, который возвращает списки строк.
+        """
+        async with DBManager(session_factory=self.session_factory,
+                             read_primary=self.read_primary) as db:
+            async for batch in getattr(db, repository).stream_rows(*args, **kwargs):
+                yield batch
 
@@ -0,0 +1,168 @@
+# Пул потоков для хеширования и проверки паролей (bcrypt).
+#
+# Хеширование пароля bcrypt занимает десятки миллисекунд процессорного
+# времени. Если вызывать его прямо в асинхронной функции ручки, то на это
+# время останавливается цикл событий (event loop), и все остальные запросы
+# этого процесса ждут. Поэтому хеширование выполняется в отдельном пуле
+# потоков (библиотека bcrypt отпускает GIL на время вычисления хеша).
+#
+# Размер пула ограничен (PASSWORD_HASH_WORKERS потоков), чтобы поток
+# запросов на вход не занял все ядра процессора. Задачи сверх этого ждут в
+# очереди пула; если в очереди уже PASSWORD_HASH_QUEUE_SIZE задач, то
+# запрос сразу получает ответ 503, а не ждёт неограниченно долго.
+#
+# Объект password_pool_metrics хранит глубину очереди и последние замеры
+# времени ожидания в очереди и времени хеширования (выводятся в
+# /health/ready).
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from src.config import settings
+
+# Количество последних замеров, по которым считаются процентили
+TIME_SAMPLES = 1000
+
+
+def _percentiles(samples: deque) -> dict:
+    values = sorted(samples)
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    last = len(values) - 1
+    return {"p50": round(values[round(last * 0.50)] * 1000, 3),
+            "p95": round(values[round(last * 0.95)] * 1000, 3),
+            "p99": round(values[round(last * 0.99)] * 1000, 3),
+            "max": round(values[last] * 1000, 3),
+            }
+
+
+class PasswordPoolMetrics:
+    """
+    Счётчики задач пула хеширования паролей и последние замеры времени.
+
+    :param samples: Количество последних замеров, которые хранятся для
+        расчёта процентилей.
+    """
+
+    def __init__(self, samples: int = TIME_SAMPLES):
+        self.waits: deque[float] = deque(maxlen=samples)
+        self.durations: deque[float] = deque(maxlen=samples)
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_queued = 0
+
+    @property
+    def in_flight(self) -> int:
+        # Задачи, которые выполняются или ждут в очереди. Счётчики
+        # изменяются только в цикле событий, поэтому блокировки не нужны.
+        return self.submitted - self.completed
+
+
+password_pool_metrics = PasswordPoolMetrics()
+
+
+class PasswordPool:
+    """
+    Ограниченный пул потоков для хеширования и проверки паролей.
+
+    :param workers: Количество потоков.
+    :param queue_size: Максимальное количество задач, ожидающих свободного
+        потока.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix="password-hash")
+
+    @property
+    def running(self) -> int:
+        return min(password_pool_metrics.in_flight, self.workers)
+
+    @property
+    def queued(self) -> int:
+        # Задачи сверх количества потоков ждут в очереди пула
+        return max(password_pool_metrics.in_flight - self.workers, 0)
+
+    @staticmethod
+    def _measured(func, args, submitted_at: float):
+        # Выполняется в потоке пула (deque.append потокобезопасен)
+        started_at = time.perf_counter()
+        password_pool_metrics.waits.append(started_at - submitted_at)
+        try:
+            return func(*args)
+        finally:
+            password_pool_metrics.durations.append(time.perf_counter() - started_at)
+
+    async def run(self, func, *args):
+        """
+        Выполняет func(*args) в потоке пула и ждёт результат, не останавливая
+        цикл событий.
+
+        :param func: Функция, например CryptContext.verify.
+        :param args: Аргументы функции.
+
+        :return: Возвращает результат func(*args).
+            Если очередь пула заполнена, то возбуждается исключение
+            HTTPException с кодом 503.
+        """
+        if self.queued >= self.queue_size:
+            password_pool_metrics.rejected += 1
+            # status_code=503: Сервер временно не готов обрабатывать запросы
+            raise HTTPException(status_code=503,
+                                detail="Сервер перегружен, повторите запрос позже")
+        loop = asyncio.get_running_loop()
+        password_pool_metrics.submitted += 1
+        password_pool_metrics.max_queued = max(password_pool_metrics.max_queued, self.queued)
+        future = self.executor.submit(self._measured, func, args, time.perf_counter())
+        # Задача считается завершённой, когда её закончил поток пула, а не
+        # когда перестал ждать запрос: если запрос отменён (клиент отключился),
+        # то поток продолжает хешировать, и задача должна оставаться в очереди
+        # (in_flight). Колбэк вызывается в потоке пула, счётчик изменяется в
+        # цикле событий.
+        future.add_done_callback(lambda _: self._call_in_loop(loop, self._completed))
+        return await asyncio.wrap_future(future)
+
+    @staticmethod
+    def _completed() -> None:
+        password_pool_metrics.completed += 1
+
+    @staticmethod
+    def _call_in_loop(loop: asyncio.AbstractEventLoop, callback) -> None:
+        try:
+            loop.call_soon_threadsafe(callback)
+        except RuntimeError:
+            # Цикл событий уже закрыт (остановка приложения) - считать нечего
+            pass
+
+
+password_pool = PasswordPool(workers=settings.PASSWORD_HASH_WORKERS,
+                             queue_size=settings.PASSWORD_HASH_QUEUE_SIZE)
+
+
+def password_pool_status() -> dict:
+    """
+    Состояние пула хеширования паролей.
+
+    :return: Возвращает словарь, например:
+        {"workers": 2, "queue_size": 64, "running": 2, "queued": 5,
+         "max_queued": 17, "submitted": 310, "completed": 303, "rejected": 0,
+         "wait_ms": {"p50": 0.05, "p95": 180.2, "p99": 240.7, "max": 251.3},
+         "duration_ms": {"p50": 61.2, "p95": 66.0, "p99": 70.4, "max": 75.9}}
+    """
+    return {"workers": password_pool.workers,
+            "queue_size": password_pool.queue_size,
+            "running": password_pool.running,
+            "queued": password_pool.queued,
+            "max_queued": password_pool_metrics.max_queued,
+            "submitted": password_pool_metrics.submitted,
+            "completed": password_pool_metrics.completed,
+            "rejected": password_pool_metrics.rejected,
+            "wait_ms": _percentiles(password_pool_metrics.waits),
+            "duration_ms": _percentiles(password_pool_metrics.durations),
+            }
@@ -0,0 +1,102 @@
+# Метрики пула соединений с базой данных для ручки /health/ready.
+#
+# Пул соединений (QueuePool) выдаёт не более DB_POOL_SIZE + DB_MAX_OVERFLOW
+# соединений одновременно. Если все соединения заняты, то запрос ждёт
+# освобождения соединения не дольше DB_POOL_TIMEOUT секунд, после чего
+# поднимается исключение sqlalchemy.exc.TimeoutError.
+#
+# Класс MeasuredQueuePool замеряет, сколько времени запрос ждал соединения
+# (метод _do_get пула), и сохраняет последние замеры в объекте pool_metrics.
+# По ним считаются процентили времени ожидания (p50, p95, p99): если они
+# растут, то пул насыщен - соединений не хватает.
+import time
+from collections import deque
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Количество последних замеров, по которым считаются процентили
+WAIT_SAMPLES = 1000
+
+
+class PoolMetrics:
+    """
+    Счётчики выдачи соединений из пула и последние замеры времени ожидания.
+
+    :param samples: Количество последних замеров времени ожидания, которые
+        хранятся для расчёта процентилей.
+    """
+
+    def __init__(self, samples: int = WAIT_SAMPLES):
+        self.waits: deque[float] = deque(maxlen=samples)
+        self.checkouts = 0
+        self.timeouts = 0
+
+    def percentiles(self) -> dict:
+        """
+        Процентили времени ожидания соединения по последним замерам.
+
+        :return: Возвращает словарь со значениями в миллисекундах, например:
+            {"p50": 0.012, "p95": 0.031, "p99": 12.4, "max": 15.1}
+            Если замеров нет, то значения равны None.
+        """
+        waits = sorted(self.waits)
+        if not waits:
+            return {"p50": None, "p95": None, "p99": None, "max": None}
+        last = len(waits) - 1
+        return {"p50": round(waits[round(last * 0.50)] * 1000, 3),
+                "p95": round(waits[round(last * 0.95)] * 1000, 3),
+                "p99": round(waits[round(last * 0.99)] * 1000, 3),
+                "max": round(waits[last] * 1000, 3),
+                }
+
+
+pool_metrics = PoolMetrics()
+
+
+class MeasuredQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений для асинхронного движка, который замеряет время ожидания
+    соединения. Используется в create_async_engine(..., poolclass=MeasuredQueuePool).
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        pool_metrics.waits.append(time.perf_counter() - start)
+        pool_metrics.checkouts += 1
+        return connection
+
+
+def pool_status(pool, metrics: PoolMetrics | None = pool_metrics) -> dict:
+    """
+    Текущее состояние пула соединений и метрики времени ожидания.
+
+    :param pool: Пул соединений движка (engine.pool).
+    :param metrics: Метрики времени ожидания соединения. None - пул без
+        замеров (реплики, см. src/database.py): checkouts, timeouts и wait_ms
+        не выводятся.
+
+    :return: Возвращает словарь, например:
+        {"size": 5, "checked_in": 3, "checked_out": 2, "overflow": -3,
+         "max_overflow": 10, "timeout": 30.0, "checkouts": 1520, "timeouts": 0,
+         "wait_ms": {"p50": 0.012, "p95": 0.031, "p99": 12.4, "max": 15.1}}
+        Значение overflow отрицательное, пока пул не заполнен до size.
+    """
+    status = {"size": pool.size(),
+              "checked_in": pool.checkedin(),
+              "checked_out": pool.checkedout(),
+              "overflow": pool.overflow(),
+              "max_overflow": getattr(pool, "_max_overflow", None),
+              "timeout": pool.timeout() if hasattr(pool, "timeout") else None,
+              }
+    if metrics is not None:
+        status.update({"checkouts": metrics.checkouts,
+                       "timeouts": metrics.timeouts,
+                       "wait_ms": metrics.percentiles(),
+                       })
+    return status
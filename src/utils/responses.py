@@ -0,0 +1,44 @@
+# Ответы JSON, сериализуемые библиотекой orjson.
+#
+# По умолчанию FastAPI сначала преобразует результат функции ручки в
+# словари и списки (jsonable_encoder обходит все вложенные объекты, в том
+# числе схемы Pydantic), а затем сериализует их модулем json. Класс
+# ORJSONResponse указан в src/main.py как класс ответа по умолчанию
+# (default_response_class) и сериализует данные orjson.
+#
+# Если ручка возвращает ORJSONResponse(данные) сама, то jsonable_encoder
+# не вызывается: схемы Pydantic сериализуются методом model_dump_json
+# (функция orjson_default), а списки, подготовленные репозиторием методом
+# BaseRepository.dump_json (orjson.Fragment - уже сериализованные байты),
+# вставляются в ответ без изменений.
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+def orjson_default(obj):
+    """
+    Сериализация объектов, которые orjson не поддерживает сам (параметр
+    default функции orjson.dumps).
+
+    :param obj: Объект, например схема Pydantic.
+
+    :return: Возвращает orjson.Fragment с сериализованной схемой Pydantic.
+        Для других объектов возбуждается исключение TypeError.
+    """
+    if isinstance(obj, BaseModel):
+        return orjson.Fragment(obj.model_dump_json())
+    raise TypeError(f"Объект типа {type(obj).__name__} не сериализуется в JSON")
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    Ответ JSON, сериализуемый orjson. Помимо типов, которые поддерживает
+    orjson (dict, list, tuple, str, int, date, datetime и т.д.), принимает
+    схемы Pydantic и orjson.Fragment.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content,
+                            default=orjson_default,
+                            option=orjson.OPT_NON_STR_KEYS)
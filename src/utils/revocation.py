@@ -0,0 +1,261 @@
+# Отозванные токены доступа (выход пользователя, ручка /auth/logout).
+#
+# Отозванные токены хранятся в таблице revoked_tokens (jti и exp токена).
+# Проверять таблицу при каждом запросе авторизованного пользователя дорого,
+# поэтому в памяти процесса хранятся:
+# - фильтр Блума (BloomFilter) по jti всех действующих отозванных токенов.
+#   Если jti в фильтре нет, то токен точно не отозван - это обычный случай,
+#   он не требует запросов к базе данных;
+# - точный LRU-набор последних проверенных jti (отозван / не отозван). Если
+#   фильтр Блума говорит "возможно отозван", то ответ берётся из набора, и
+#   только если jti в наборе нет - из базы данных (ложное срабатывание
+#   фильтра или jti вытеснен из набора).
+#
+# При запуске приложения (lifespan в src/main.py) фильтр строится по
+# таблице, затем каждые REVOKED_TOKENS_REFRESH_SECONDS секунд догружаются
+# токены, отозванные другими процессами (по времени отзыва revoked_at).
+# Пока фильтр не построен (например, база данных была недоступна при
+# запуске), каждый токен проверяется по базе данных.
+#
+# Структуры используются только из цикла событий, поэтому блокировки не нужны.
+import asyncio
+import logging
+import math
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from src.config import settings
+from src.database import async_session_maker
+from src.utils.db_manager import DBManager
+
+logger = logging.getLogger("src.revocation")
+
+# Токены, отозванные другими процессами, догружаются с запасом по времени:
+# транзакция, начатая раньше, может быть подтверждена позже (её revoked_at
+# меньше времени последнего загруженного токена).
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+HASH_MASK = (1 << 64) - 1
+
+
+class BloomFilter:
+    """
+    Фильтр Блума для строк.
+
+    :param capacity: Ожидаемое количество элементов.
+    :param error_rate: Допустимая доля ложных срабатываний при capacity элементах.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        # Двойное хеширование: позиции h1 + i * h2. Используется встроенный
+        # hash строки - он вычисляется один раз и сохраняется в объекте
+        # строки, а фильтр живёт только в памяти процесса (соль хеша
+        # PYTHONHASHSEED в разных процессах разная, но это не важно).
+        value = hash(key) & HASH_MASK
+        h1 = value & 0xFFFFFFFF
+        h2 = (value >> 32) | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str) -> None:
+        # count - количество добавленных элементов; повторное добавление
+        # (догрузка с запасом по времени) новых битов не устанавливает и
+        # count не увеличивает.
+        bits = self.bits
+        added = False
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        # Проверка выполняется при каждом запросе авторизованного
+        # пользователя, поэтому позиции вычисляются без генератора _positions
+        value = hash(key) & HASH_MASK
+        h1 = value & 0xFFFFFFFF
+        h2 = (value >> 32) | 1
+        bits = self.bits
+        size = self.size
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class RevokedTokens:
+    """
+    Отозванные токены в памяти процесса: фильтр Блума и точный LRU-набор.
+
+    :param capacity: Ожидаемое количество действующих отозванных токенов
+        (размер фильтра Блума).
+    :param error_rate: Допустимая доля ложных срабатываний фильтра Блума.
+    :param exact_size: Размер точного LRU-набора.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, exact_size: int):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.exact_size = exact_size
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.exact: OrderedDict[str, bool] = OrderedDict()
+        # Фильтр построен по таблице revoked_tokens
+        self.loaded = False
+        # Время отзыва последнего загруженного токена
+        self.last_revoked_at: datetime | None = None
+        self.bloom_negatives = 0
+        self.exact_hits = 0
+        self.db_checks = 0
+
+    def check(self, jti: str) -> bool | None:
+        """
+        Проверяет токен без обращения к базе данных.
+
+        :param jti: Идентификатор токена (поле jti токена доступа).
+
+        :return: Возвращает False - токен не отозван, True - токен отозван,
+            None - неизвестно (нужна проверка по базе данных).
+        """
+        if self.loaded and jti not in self.bloom:
+            self.bloom_negatives += 1
+            return False
+        revoked = self.exact.get(jti)
+        if revoked is None:
+            self.db_checks += 1
+            return None
+        self.exact.move_to_end(jti)
+        self.exact_hits += 1
+        return revoked
+
+    def remember(self, jti: str, revoked: bool) -> None:
+        """
+        Сохраняет результат проверки токена в точном LRU-наборе.
+        """
+        if self.exact_size <= 0:
+            return
+        self.exact[jti] = revoked
+        self.exact.move_to_end(jti)
+        while len(self.exact) > self.exact_size:
+            self.exact.popitem(last=False)
+
+    def add(self, jti: str) -> None:
+        """
+        Добавляет отозванный токен в фильтр Блума и в точный набор.
+        """
+        self.bloom.add(jti)
+        self.remember(jti, True)
+
+    def rebuild(self, rows: list[tuple[str, datetime]]) -> None:
+        """
+        Строит фильтр Блума и точный набор заново.
+
+        :param rows: Все действующие отозванные токены: список (jti,
+            revoked_at), упорядоченный по времени отзыва.
+        """
+        # Размер фильтра - с запасом, если отозванных токенов больше ожидаемого
+        self.bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+        self.exact = OrderedDict()
+        for jti, revoked_at in rows:
+            self.add(jti)
+        self.last_revoked_at = rows[-1][1] if rows else None
+        self.loaded = True
+
+    def extend(self, rows: list[tuple[str, datetime]]) -> None:
+        """
+        Добавляет токены, отозванные после последней загрузки.
+
+        :param rows: Список (jti, revoked_at), упорядоченный по времени отзыва.
+        """
+        for jti, revoked_at in rows:
+            self.add(jti)
+        if rows:
+            self.last_revoked_at = max(self.last_revoked_at or rows[-1][1], rows[-1][1])
+
+    @property
+    def overfilled(self) -> bool:
+        # Элементы из фильтра Блума не удаляются: когда в нём больше элементов,
+        # чем он рассчитан, доля ложных срабатываний растёт - фильтр
+        # строится заново только по действующим токенам.
+        return self.bloom.count > self.bloom.capacity
+
+    async def load(self) -> None:
+        """
+        Строит фильтр по таблице revoked_tokens (основная база данных) и
+        удаляет из неё записи токенов с истекшим сроком действия.
+        """
+        async with DBManager(session_factory=async_session_maker, read_primary=True) as db:
+            await db.revoked_tokens.delete_expired()
+            await db.commit()
+            self.rebuild(await db.revoked_tokens.get_revoked_since())
+
+    async def refresh(self) -> None:
+        """
+        Догружает токены, отозванные после последней загрузки (в том числе
+        другими процессами). Если фильтр ещё не построен или переполнен, то
+        строит его заново.
+        """
+        if not self.loaded or self.overfilled:
+            await self.load()
+            return
+        since = self.last_revoked_at - REFRESH_OVERLAP if self.last_revoked_at else None
+        async with DBManager(session_factory=async_session_maker, read_primary=True) as db:
+            self.extend(await db.revoked_tokens.get_revoked_since(since))
+
+    async def try_refresh(self) -> None:
+        # Ошибка загрузки не останавливает приложение: пока фильтр не
+        # построен, токены проверяются по базе данных.
+        try:
+            await self.refresh()
+        except Exception:
+            logger.exception("Не удалось загрузить отозванные токены")
+
+    async def refresh_forever(self, interval: float) -> None:
+        """
+        Догружает отозванные токены каждые interval секунд.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            await self.try_refresh()
+
+    async def start(self, interval: float) -> asyncio.Task:
+        """
+        Строит фильтр при запуске приложения (lifespan в src/main.py) и
+        запускает задачу догрузки отозванных токенов.
+
+        :param interval: Период догрузки в секундах.
+
+        :return: Возвращает задачу догрузки (отменяется при остановке приложения).
+        """
+        await self.try_refresh()
+        return asyncio.create_task(self.refresh_forever(interval))
+
+    def stats(self) -> dict:
+        """
+        Возвращает состояние: количество элементов фильтра Блума, размер
+        точного набора и счётчики проверок.
+        """
+        return {"loaded": self.loaded,
+                "bloom_count": self.bloom.count,
+                "bloom_capacity": self.bloom.capacity,
+                "exact_size": len(self.exact),
+                "bloom_negatives": self.bloom_negatives,
+                "exact_hits": self.exact_hits,
+                "db_checks": self.db_checks,
+                }
+
+
+# Отозванные токены процесса (параметры REVOKED_TOKENS_* в .env)
+revoked_tokens = RevokedTokens(capacity=settings.REVOKED_TOKENS_CAPACITY,
+                               error_rate=settings.REVOKED_TOKENS_ERROR_RATE,
+                               exact_size=settings.REVOKED_TOKENS_EXACT_SIZE)
@@ -0,0 +1,122 @@
+# Журнал SQL-запросов для отладки: текст запроса, параметры и время выполнения.
+#
+# Запросы перехватываются событиями SQLAlchemy before_cursor_execute и
+# after_cursor_execute и записываются в логгер src.sql (модуль logging).
+# В отличие от print(stmt.compile(compile_kwargs={"literal_binds": True})):
+# - запрос не компилируется повторно - записывается тот текст, который
+#   реально отправлен в базу данных, и параметры отдельно;
+# - если журнал выключен, то ничего не выполняется.
+#
+# Включение (параметры в .env):
+# - SQL_DEBUG=True - записываются все запросы (логгер src.sql получает уровень
+#   DEBUG). Также запросы записываются, если уровень DEBUG логгеру src.sql
+#   задан внешней настройкой logging;
+# - SQL_DEBUG_HEADER=True - записываются запросы только тех HTTP-запросов,
+#   в которых передан заголовок X-SQL-Debug: 1 (уровень INFO).
+# Если оба параметра False, то обработчики событий не подключаются вообще.
+# Обработчики подключаются к основной базе данных и ко всем репликам
+# (DB_REPLICA_URLS): запросы, отправленные в реплику, тоже записываются.
+#
+# Пример записи в журнале:
+# SQL 0.412 мс: SELECT rooms.id, rooms.hotel_id, ... FROM rooms WHERE rooms.title ILIKE $1::VARCHAR
+# параметры: ('%люкс%',)
+import logging
+import time
+from contextvars import ContextVar
+
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.config import settings
+
+logger = logging.getLogger("src.sql")
+
+SQL_DEBUG_HEADER_NAME = "x-sql-debug"
+
+# Максимальная длина строки с параметрами в журнале (для executemany и
+# массовых вставок параметров может быть очень много)
+PARAMS_MAX_LENGTH = 1000
+
+# Признак "записывать запросы текущего HTTP-запроса" (заголовок X-SQL-Debug)
+sql_debug_request: ContextVar[bool] = ContextVar("sql_debug_request", default=False)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if sql_debug_request.get() or logger.isEnabledFor(logging.DEBUG):
+        conn.info.setdefault("sql_debug_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("sql_debug_start")
+    if not starts:
+        return
+    duration = (time.perf_counter() - starts.pop()) * 1000
+    params = repr(parameters)
+    if len(params) > PARAMS_MAX_LENGTH:
+        params = params[:PARAMS_MAX_LENGTH] + "..."
+    logger.log(logging.DEBUG if logger.isEnabledFor(logging.DEBUG) else logging.INFO,
+               "SQL %.3f мс%s: %s\nпараметры: %s",
+               duration, " (executemany)" if executemany else "", statement, params)
+
+
+def _handle_error(exception_context):
+    # Запрос завершился ошибкой - after_cursor_execute не вызывается,
+    # убираем время начала, чтобы не сбить следующие замеры.
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("sql_debug_start"):
+        connection.info["sql_debug_start"].pop()
+
+
+class SQLDebugMiddleware:
+    """
+    ASGI-middleware: включает журнал SQL-запросов для HTTP-запроса, в котором
+    передан заголовок X-SQL-Debug: 1 (или true).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        header = dict(scope["headers"]).get(SQL_DEBUG_HEADER_NAME.encode(), b"")
+        if header.lower() not in (b"1", b"true"):
+            await self.app(scope, receive, send)
+            return
+        token = sql_debug_request.set(True)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            sql_debug_request.reset(token)
+
+
+def setup_sql_debug(app: FastAPI, engines: list[AsyncEngine]) -> None:
+    """
+    Подключает журнал SQL-запросов в соответствии с настройками
+    SQL_DEBUG и SQL_DEBUG_HEADER.
+
+    :param app: Приложение FastAPI (для подключения SQLDebugMiddleware).
+    :param engines: Асинхронные движки SQLAlchemy: основная база данных и
+        реплики.
+
+    :return: Ничего не возвращает.
+    """
+    if not (settings.SQL_DEBUG or settings.SQL_DEBUG_HEADER):
+        return
+
+    logger.setLevel(logging.DEBUG if settings.SQL_DEBUG else logging.INFO)
+    if not logger.handlers and not logging.getLogger().handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(levelname)s %(message)s"))
+        logger.addHandler(handler)
+
+    # События вешаются на синхронный движок, который находится внутри AsyncEngine
+    for engine in engines:
+        event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine.sync_engine, "handle_error", _handle_error)
+
+    if settings.SQL_DEBUG_HEADER:
+        app.add_middleware(SQLDebugMiddleware)
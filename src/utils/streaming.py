@@ -0,0 +1,152 @@
+# Потоковая выгрузка списков в формате NDJSON (newline delimited JSON):
+# каждая строка ответа - отдельный JSON-объект, строки разделены символом "\n".
+#
+# Пример ответа:
+# {"title":"title Сочи","location":"location Сочи","id":16}
+# {"title":"title Дубай","location":"location Дубай","id":17}
+#
+# Ответ формируется по мере чтения пакетов строк из базы данных
+# (см. BaseRepository.stream_rows и DBManager.stream), поэтому выгрузка
+# таблицы любого размера идёт с постоянным расходом памяти.
+#
+# В обратную сторону (массовое добавление, ручки /hotels/bulk и
+# /hotels/rooms/bulk) тело запроса в формате NDJSON читается по частям
+# функцией read_batches и передаётся в базу данных пакетами.
+from typing import AsyncIterator
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+
+from src.config import settings
+from src.repositories.utils import schema_list_adapter
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def ndjson_lines(batches: AsyncIterator[list[BaseModel]]) -> AsyncIterator[bytes]:
+    """
+    Преобразует пакеты объектов Pydantic в строки NDJSON.
+
+    :param batches: Асинхронный генератор, который возвращает списки
+        объектов Pydantic.
+
+    :return: Асинхронный генератор, который возвращает для каждого пакета
+        одну порцию байтов (строки JSON, разделённые символом "\\n").
+    """
+    async for batch in batches:
+        if batch:
+            yield "".join(f"{item.model_dump_json()}\n" for item in batch).encode()
+
+
+def ndjson_response(batches: AsyncIterator[list[BaseModel]]) -> StreamingResponse:
+    """
+    Формирует потоковый ответ в формате NDJSON.
+
+    :param batches: Асинхронный генератор, который возвращает списки
+        объектов Pydantic (например, DBManager.stream).
+
+    :return: Возвращает StreamingResponse с типом application/x-ndjson.
+    """
+    return StreamingResponse(ndjson_lines(batches), media_type=NDJSON_MEDIA_TYPE)
+
+
+def _validation_error(error: ValidationError, line: int | None = None) -> HTTPException:
+    description = "Ошибка в данных" if line is None else f"Ошибка в строке {line}"
+    # status_code=422: Запрос сформирован правильно, но его невозможно
+    #                  выполнить из-за семантических ошибок
+    # Входные данные (input) в ошибки не включаются: для неправильного JSON
+    # это байты тела запроса или строки, которые не сериализуются в JSON
+    return HTTPException(status_code=422,
+                         detail={"description": description,
+                                 "errors": error.errors(include_url=False,
+                                                        include_context=False,
+                                                        include_input=False),
+                                 })
+
+
+async def read_batches(request: Request,
+                       schema: type[BaseModel],
+                       batch_size: int | None = None) -> AsyncIterator[list[BaseModel]]:
+    """
+    Читает из тела запроса список объектов и возвращает их пакетами.
+
+    Тело запроса может быть:
+    - массивом JSON (Content-Type: application/json) - читается целиком;
+    - NDJSON (Content-Type: application/x-ndjson) - по одному объекту JSON
+      в строке, читается по мере получения, в памяти хранится только
+      текущий пакет.
+
+    :param request: Запрос FastAPI.
+    :param schema: Схема Pydantic одного объекта.
+    :param batch_size: Количество объектов в пакете. Если не указано, то
+        используется settings.BULK_BATCH_SIZE.
+
+    :return: Асинхронный генератор, который возвращает списки объектов схемы
+        schema. Если объект не проходит проверку схемы, то поднимается
+        исключение HTTPException с кодом 422 (с номером строки для NDJSON).
+    """
+    batch_size = batch_size or settings.BULK_BATCH_SIZE
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+
+    if content_type != NDJSON_MEDIA_TYPE:
+        try:
+            # TypeAdapter(list[схема]) кэшируется для каждой схемы: валидатор
+            # не строится заново на каждый запрос
+            items = schema_list_adapter(schema).validate_json(await request.body())
+        except ValidationError as error:
+            raise _validation_error(error)
+        for start in range(0, len(items), batch_size):
+            yield items[start:start + batch_size]
+        return
+
+    batch = []
+    line_number = 0
+    tail = b""
+    async for chunk in request.stream():
+        lines = (tail + chunk).split(b"\n")
+        # Последняя часть может быть неполной строкой - ждём следующую порцию
+        tail = lines.pop()
+        for line in lines:
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                batch.append(schema.model_validate_json(line))
+            except ValidationError as error:
+                raise _validation_error(error, line_number)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if tail.strip():
+        line_number += 1
+        try:
+            batch.append(schema.model_validate_json(tail))
+        except ValidationError as error:
+            raise _validation_error(error, line_number)
+    if batch:
+        yield batch
+
+
+def bulk_openapi_extra(schema: type[BaseModel]) -> dict:
+    """
+    Описание тела запроса для документации ручек массового добавления
+    (тело читается функцией read_batches, а не параметром Body).
+
+    :param schema: Схема Pydantic одного объекта.
+
+    :return: Возвращает словарь для параметра openapi_extra декоратора ручки.
+    """
+    return {"requestBody": {"required": True,
+                            "content": {
+                                "application/json": {
+                                    "schema": {"type": "array",
+                                               "items": schema.model_json_schema()},
+                                },
+                                NDJSON_MEDIA_TYPE: {
+                                    "schema": {"type": "string",
+                                               "description": "По одному объекту JSON в строке"},
+                                },
+                            },
+                            },
+            }
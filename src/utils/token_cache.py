@@ -0,0 +1,159 @@
+# Кэш проверенных токенов доступа в памяти процесса.
+#
+# Каждый запрос авторизованного пользователя проверяет подпись токена
+# (jwt.decode), а ручки /auth/get_me и /bookings/me ещё и выбирают
+# пользователя по идентификатору. Повторные запросы с тем же токеном берут
+# результат проверки (и запись пользователя) из кэша.
+#
+# Ключ - хеш sha256 токена (сам токен в памяти не хранится), значение -
+# TokenEntry. Запись действительна до истечения срока действия токена
+# (поле exp), поэтому просроченный токен из кэша не принимается. Кэш ограничен
+# по количеству записей (LRU).
+#
+# Запись пользователя в TokenEntry хранится не дольше ENTITY_CACHE_TTL секунд
+# и удаляется, когда пользователь изменяется (DBManager.commit, как и записи
+# кэша сущностей src/utils/cache.py).
+#
+# Кэш используется только из цикла событий (зависимости асинхронные),
+# поэтому блокировки не нужны.
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Iterable
+
+from src.config import settings
+from src.utils.cache import MISSING
+
+
+class TokenEntry:
+    """
+    Проверенный токен доступа.
+
+    :param user_id: Идентификатор пользователя из токена.
+    :param jti: Идентификатор токена (None - токен выдан до появления jti).
+    :param expires_at: Время истечения срока действия токена (exp), секунды
+        от начала эпохи.
+    """
+    __slots__ = ("user_id", "jti", "expires_at", "user", "user_expires_at")
+
+    def __init__(self, user_id: int | None, jti: str | None, expires_at: float):
+        self.user_id = user_id
+        self.jti = jti
+        self.expires_at = expires_at
+        # Запись пользователя (схема Pydantic) или MISSING, если не выбиралась
+        self.user: Any = MISSING
+        self.user_expires_at = 0.0
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+class TokenCache:
+    """
+    LRU-кэш проверенных токенов доступа.
+
+    :param maxsize: Максимальное количество записей. Если 0, то кэш
+        выключен (ничего не сохраняет).
+    :param user_ttl: Время жизни записи пользователя в секундах.
+    """
+
+    def __init__(self, maxsize: int, user_ttl: float):
+        self.maxsize = maxsize
+        self.user_ttl = user_ttl
+        self._data: OrderedDict[bytes, TokenEntry] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str) -> TokenEntry | None:
+        """
+        Возвращает проверенный токен или None, если токена в кэше нет или
+        срок его действия истёк.
+        """
+        key = token_digest(token)
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= time.time():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(self, token: str, payload: dict) -> TokenEntry:
+        """
+        Сохраняет проверенный токен. Если кэш переполнен, то удаляется
+        запись, к которой дольше всего не обращались.
+
+        :param token: Токен доступа.
+        :param payload: Данные токена после проверки подписи (AuthService.decode_token).
+
+        :return: Возвращает TokenEntry (в том числе, если кэш выключен или
+            в токене нет срока действия - тогда запись в кэше не сохраняется).
+        """
+        entry = TokenEntry(user_id=payload.get("user_id", None),
+                           jti=payload.get("jti", None),
+                           expires_at=payload.get("exp", 0))
+        if self.maxsize <= 0 or entry.expires_at <= time.time():
+            return entry
+        key = token_digest(token)
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def get_user(self, entry: TokenEntry) -> Any:
+        """
+        Возвращает запись пользователя из TokenEntry или MISSING, если её
+        нет или время её жизни истекло.
+        """
+        if entry.user is not MISSING and entry.user_expires_at < time.monotonic():
+            entry.user = MISSING
+        return entry.user
+
+    def set_user(self, entry: TokenEntry, user: Any) -> None:
+        """
+        Сохраняет запись пользователя в TokenEntry (None не сохраняется).
+        """
+        if user is None:
+            return
+        entry.user = user
+        entry.user_expires_at = time.monotonic() + self.user_ttl
+
+    def invalidate_users(self, user_ids: Iterable[int]) -> None:
+        """
+        Удаляет записи пользователей с указанными идентификаторами (сами
+        проверенные токены остаются в кэше).
+        """
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+        for entry in self._data.values():
+            if entry.user_id in user_ids:
+                entry.user = MISSING
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        """
+        Возвращает счётчики кэша: количество записей, попаданий, промахов и
+        вытеснений по LRU.
+        """
+        return {"size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                }
+
+
+# Общий кэш проверенных токенов (параметр TOKEN_CACHE_SIZE в .env)
+token_cache = TokenCache(maxsize=settings.TOKEN_CACHE_SIZE,
+                         user_ttl=settings.ENTITY_CACHE_TTL)
@@ -0,0 +1,55 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from src.utils.streaming import NDJSON_MEDIA_TYPE, read_batches
+
+
+class Item(BaseModel):
+    title: str
+
+
+app = FastAPI()
+
+
+@app.post("/bulk")
+async def bulk_post(request: Request):
+    count = 0
+    async for batch in read_batches(request, Item, batch_size=2):
+        count += len(batch)
+    return {"count": count}
+
+
+client = TestClient(app)
+
+
+def test_read_batches_json_array():
+    response = client.post("/bulk", json=[{"title": "a"}, {"title": "b"}, {"title": "c"}])
+    assert response.status_code == 200
+    assert response.json() == {"count": 3}
+
+
+def test_read_batches_ndjson():
+    response = client.post("/bulk", content=b'{"title": "a"}\n{"title": "b"}\n{"title": "c"}',
+                           headers={"Content-Type": NDJSON_MEDIA_TYPE})
+    assert response.status_code == 200
+    assert response.json() == {"count": 3}
+
+
+def test_read_batches_invalid_json_array():
+    # Обрезанный массив JSON: ошибка json_invalid (input - байты тела запроса)
+    response = client.post("/bulk", content=b'[{"title": "a"}, {"title": ',
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
+    detail = response.json()["detail"]
+    assert detail["description"] == "Ошибка в данных"
+    assert detail["errors"][0]["type"] == "json_invalid"
+
+
+def test_read_batches_invalid_ndjson_line():
+    response = client.post("/bulk", content=b'{"title": "a"}\n{bad\n{"title": "c"}\n',
+                           headers={"Content-Type": NDJSON_MEDIA_TYPE})
+    assert response.status_code == 422
+    detail = response.json()["detail"]
+    assert detail["description"] == "Ошибка в строке 2"
+    assert detail["errors"][0]["type"] == "json_invalid"